@@ -1,8 +1,24 @@
+import time
+
+# Awal run script: dasar pengukuran anggaran startup (import + render pertama)
+_RUN_STARTED = time.perf_counter()
+
 import streamlit as st
-import pandas as pd
-import google.generativeai as genai
-import numpy as np
 from datetime import datetime
+import math
+import os
+import re
+import threading
+
+from dose_index import DoseIndex, format_dose_calculation, parse_population, parse_weight
+from interaction_index import InteractionIndex, asks_about_pair, format_interactions, is_direct_answer
+from context_builder import ContextBuilder
+from drug_record import DrugRecord
+from conversation_context import ConversationContext
+from startup_budget import STARTUP_TRACKER
+
+startup_run = STARTUP_TRACKER.begin(_RUN_STARTED)
+startup_run.mark('imports')
 
 # Konfigurasi halaman
 st.set_page_config(
@@ -11,19 +27,167 @@ st.set_page_config(
     layout="wide"
 )
 
-# Setup Gemini API
+# Setup Gemini API (library baru diimpor saat jawaban pertama dibuat)
 try:
     GEMINI_API_KEY = st.secrets["GEMINI_API_KEY"]
-    genai.configure(api_key=GEMINI_API_KEY)
     gemini_available = True
 except Exception as e:
     st.error(f"❌ Error konfigurasi Gemini API: {str(e)}")
     gemini_available = False
 
+@st.cache_resource
+def load_genai():
+    """Import dan configure google.generativeai sekali per proses"""
+    import google.generativeai as genai
+    genai.configure(api_key=GEMINI_API_KEY)
+    return genai
+
+class DrugSearchIndex:
+    """Inverted index dengan skor BM25 per field untuk drugs_db.
+
+    Dibangun sekali; pencarian hanya menyentuh obat yang berbagi term dengan query.
+    Bobot field mempertahankan prioritas lama: nama > merek > gejala > indikasi > kategori.
+    """
+
+    FIELD_WEIGHTS = {
+        'nama': 10,
+        'merek_dagang': 8,
+        'gejala': 5,
+        'indikasi': 3,
+        'kategori': 2
+    }
+
+    STOPWORDS = {
+        'apa', 'yang', 'dan', 'atau', 'untuk', 'dengan', 'di', 'ke', 'dari', 'obat',
+        'adalah', 'ini', 'itu', 'saya', 'berapa', 'bagaimana', 'boleh', 'bisa',
+        'minum', 'pada', 'karena', 'hingga', 'sedang', 'ringan', 'tidak', 'kalau'
+    }
+
+    def __init__(self, drugs_db: dict, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.doc_ids = list(drugs_db.keys())
+        self.doc_order = {drug_id: i for i, drug_id in enumerate(self.doc_ids)}
+        # postings[term] = {drug_id: {field: term_frequency}}
+        self.postings = {}
+        self.field_lengths = {field: {} for field in self.FIELD_WEIGHTS}
+
+        for drug_id, drug_info in drugs_db.items():
+            for field in self.FIELD_WEIGHTS:
+                tokens = self.tokenize(drug_info.get(field, ''))
+                self.field_lengths[field][drug_id] = len(tokens)
+                for token in tokens:
+                    field_tf = self.postings.setdefault(token, {}).setdefault(drug_id, {})
+                    field_tf[field] = field_tf.get(field, 0) + 1
+
+        self.avg_field_lengths = {
+            field: (sum(lengths.values()) / len(lengths)) if lengths else 0
+            for field, lengths in self.field_lengths.items()
+        }
+
+        total_docs = len(self.doc_ids)
+        self.idf = {
+            term: math.log(1 + (total_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+            for term, docs in self.postings.items()
+        }
+
+    @classmethod
+    def tokenize(cls, text: str):
+        """Lowercase, pecah per kata, buang stopword dan akhiran -nya"""
+        tokens = []
+        for token in re.findall(r'[a-z0-9]+', text.lower()):
+            if len(token) > 5 and token.endswith('nya'):
+                token = token[:-3]
+            if len(token) >= 2 and token not in cls.STOPWORDS:
+                tokens.append(token)
+        return tokens
+
+    def search(self, query: str):
+        """Skor BM25 berbobot field untuk setiap obat yang berbagi term dengan query"""
+        scores = {}
+
+        for term in set(self.tokenize(query)):
+            docs = self.postings.get(term)
+            if not docs:
+                continue
+
+            idf = self.idf[term]
+            for drug_id, field_tf in docs.items():
+                score = 0.0
+                for field, tf in field_tf.items():
+                    avg_length = self.avg_field_lengths[field] or 1
+                    norm = 1 - self.b + self.b * self.field_lengths[field][drug_id] / avg_length
+                    score += self.FIELD_WEIGHTS[field] * idf * tf * (self.k1 + 1) / (tf + self.k1 * norm)
+                scores[drug_id] = scores.get(drug_id, 0.0) + score
+
+        return scores
+
 class SimpleRAGPharmaAssistant:
+    # Intent pertanyaan dan keyword pemicunya
+    FOLLOW_UP_KEYWORDS = {
+        'dosis': ['dosis', 'berapa', 'takaran', 'aturan pakai', 'dosis untuk'],
+        'efek': ['efek samping', 'side effect', 'bahaya', 'efeknya'],
+        'kontraindikasi': ['kontra', 'tidak boleh', 'hindari', 'larangan', 'kontraindikasi'],
+        'interaksi': ['interaksi', 'bereaksi dengan', 'makanan', 'minuman', 'interaksinya'],
+        'indikasi': ['untuk apa', 'kegunaan', 'manfaat', 'indikasi', 'guna']
+    }
+    
+    # Intent -> (judul, field drug_info) untuk jawaban template tanpa Gemini
+    FAST_PATH_FIELDS = {
+        'dosis': ('Dosis', [('Dosis Dewasa', 'dosis_dewasa'), ('Dosis Anak', 'dosis_anak')]),
+        'efek': ('Efek Samping', [('Efek Samping', 'efek_samping')]),
+        'kontraindikasi': ('Kontraindikasi', [('Kontraindikasi', 'kontraindikasi')]),
+        'interaksi': ('Interaksi Obat', [('Interaksi', 'interaksi')]),
+        'indikasi': ('Indikasi', [('Indikasi', 'indikasi')])
+    }
+    
+    # Pertanyaan terbuka/kondisional tetap dijawab Gemini
+    OPEN_ENDED_MARKERS = [
+        'kenapa', 'mengapa', 'bagaimana', 'jelaskan', 'bandingkan', 'dibanding',
+        'lebih baik', 'bolehkah', 'apakah aman', 'sebaiknya', 'hamil', 'menyusui'
+    ]
+    
+    # Urutan field di konteks RAG
+    CONTEXT_FIELDS = [
+        ('Golongan', 'golongan'),
+        ('Indikasi', 'indikasi'),
+        ('Dosis Dewasa', 'dosis_dewasa'),
+        ('Dosis Anak', 'dosis_anak'),
+        ('Efek Samping', 'efek_samping'),
+        ('Kontraindikasi', 'kontraindikasi'),
+        ('Interaksi', 'interaksi'),
+        ('Peringatan', 'peringatan')
+    ]
+    
+    # Penanda pertanyaan penggunaan beberapa obat bersamaan
+    INTERACTION_MARKERS = [
+        'interaksi', 'bersamaan', 'barengan', 'bareng', 'dicampur', 'digabung',
+        'dikombinasikan', 'kombinasi', 'sekaligus'
+    ]
+    
+    DISCLAIMER = "\n\n⚠️ **HARAP KONSULTASIKAN DENGAN DOKTER ATAU APOTEKER SEBELUM MENGGUNAKAN OBAT INI**"
+    
     def __init__(self):
         self.drugs_db = self._initialize_drug_database()
-        self.current_context = {}
+        self.search_index = DrugSearchIndex(self.drugs_db)
+        self.dose_index = DoseIndex.from_drug_records(self.drugs_db)
+        self.interaction_index = self._build_interaction_index()
+        self.context_builder = ContextBuilder(
+            fields=self.CONTEXT_FIELDS,
+            intent_fields={
+                intent: [field for _, field in fields]
+                for intent, (_, fields) in self.FAST_PATH_FIELDS.items()
+            },
+            core_fields=['golongan', 'peringatan'],
+            header="🔍 **INFORMASI OBAT YANG RELEVAN:**\n\n",
+            drug_heading="**OBAT {index}: {nama}**\n"
+        )
+        # Database statis: fragmen konteks semua obat dirender sekali saat start
+        for drug_id, drug_info in self.drugs_db.items():
+            self.context_builder.prime(drug_id, drug_info)
+        self.fast_path_stats = {'questions': 0, 'fast_path': 0, 'dose_calculations': 0, 'interaction_answers': 0}
+        # Assistant dipakai bersama semua sesi: counter diubah di bawah lock
+        self._stats_lock = threading.Lock()
         
     def _initialize_drug_database(self):
         """Initialize comprehensive drug database"""
@@ -123,64 +287,35 @@ class SimpleRAGPharmaAssistant:
                 "gejala": "kolesterol tinggi, lemak darah tinggi, risiko jantung"
             }
         }
-        return drugs_db
+        return {drug_id: DrugRecord.from_dict(info, record_id=drug_id) for drug_id, info in drugs_db.items()}
+    
+    def get_record(self, record_id):
+        """Resolve id record yang disimpan di pesan chat"""
+        return self.drugs_db.get(record_id)
     
     def _rag_retrieve(self, query, top_k=3):
-        """Retrieve relevant information menggunakan semantic search sederhana"""
+        """Retrieve relevant information menggunakan inverted index BM25"""
         query_lower = query.lower()
-        results = []
         
-        for drug_id, drug_info in self.drugs_db.items():
-            score = 0
-            
-            # Drug name matching (high priority)
-            if drug_info['nama'].lower() in query_lower:
-                score += 10
-            
-            # Brand name matching
-            for merek in drug_info['merek_dagang'].lower().split(','):
-                merek_clean = merek.strip()
-                if merek_clean and merek_clean in query_lower:
-                    score += 8
-            
-            # Symptom matching
-            if 'gejala' in drug_info and drug_info['gejala']:
-                symptoms = drug_info['gejala'].lower().split(',')
-                for symptom in symptoms:
-                    symptom_clean = symptom.strip()
-                    if symptom_clean and symptom_clean in query_lower:
-                        score += 5
-            
-            # Indication keyword matching
-            indication_lower = drug_info['indikasi'].lower()
-            indication_keywords = [kw.strip() for kw in indication_lower.split(',')]
-            for keyword in indication_keywords:
-                if keyword and keyword in query_lower:
-                    score += 3
-            
-            # Category matching
-            if 'kategori' in drug_info and drug_info['kategori']:
-                categories = drug_info['kategori'].lower().split(',')
-                for category in categories:
-                    category_clean = category.strip()
-                    if category_clean and category_clean in query_lower:
-                        score += 2
-            
-            # Question type matching
-            follow_up_keywords = {
-                'dosis': ['dosis', 'berapa', 'takaran', 'aturan pakai', 'dosis untuk'],
-                'efek': ['efek samping', 'side effect', 'bahaya', 'efeknya'],
-                'kontraindikasi': ['kontra', 'tidak boleh', 'hindari', 'larangan', 'kontraindikasi'],
-                'interaksi': ['interaksi', 'bereaksi dengan', 'makanan', 'minuman', 'interaksinya'],
-                'indikasi': ['untuk apa', 'kegunaan', 'manfaat', 'indikasi', 'guna']
-            }
+        # Hanya obat yang berbagi term dengan query yang dinilai
+        scores = self.search_index.search(query)
+        
+        # Question type matching
+        asked_keys = self._asked_intents(query_lower)
+        
+        if not scores and asked_keys:
+            # Pertanyaan lanjutan tanpa nama obat: perilaku lama mengambil obat pertama di database
+            scores = {drug_id: 0.0 for drug_id in self.search_index.doc_ids[:top_k]}
+        
+        results = []
+        for drug_id, score in scores.items():
+            drug_info = self.drugs_db[drug_id]
             
-            for key, keywords in follow_up_keywords.items():
-                if any(kw in query_lower for kw in keywords):
-                    if key == 'dosis' and drug_info.get('dosis_dewasa'):
-                        score += 4
-                    elif key in drug_info and drug_info[key]:
-                        score += 4
+            for key in asked_keys:
+                if key == 'dosis' and drug_info.get('dosis_dewasa'):
+                    score += 4
+                elif key in drug_info and drug_info[key]:
+                    score += 4
             
             if score > 0:
                 results.append({
@@ -189,36 +324,119 @@ class SimpleRAGPharmaAssistant:
                     'drug_id': drug_id
                 })
         
-        # Sort by score dan ambil top_k
-        results.sort(key=lambda x: x['score'], reverse=True)
+        # Sort by score (seri: urutan database) dan ambil top_k
+        results.sort(key=lambda x: (-x['score'], self.search_index.doc_order[x['drug_id']]))
         return results[:top_k]
     
-    def _build_rag_context(self, retrieved_results):
-        """Build context untuk RAG generator"""
-        if not retrieved_results:
-            return "Tidak ada informasi yang relevan ditemukan dalam database."
+    def _asked_intents(self, query_lower):
+        return [key for key, keywords in self.FOLLOW_UP_KEYWORDS.items()
+                if any(kw in query_lower for kw in keywords)]
+    
+    def _mentions_drug(self, query_lower, drug_info):
+        """True jika nama obat atau salah satu merek dagangnya disebut di query"""
+        names = [drug_info['nama']] + drug_info.get('merek_dagang', '').split(',')
+        return any(
+            re.search(r'\b' + re.escape(name.strip().lower()) + r'\b', query_lower)
+            for name in names if name.strip()
+        )
+    
+    def _try_fast_path(self, question, retrieved_results):
+        """Jawaban template untuk pertanyaan satu obat + satu field, None jika tidak cocok"""
+        query_lower = question.lower()
+        
+        if any(marker in query_lower for marker in self.OPEN_ENDED_MARKERS):
+            return None
+        
+        intents = self._asked_intents(query_lower)
+        if len(intents) != 1:
+            return None
+        
+        # Harus tepat satu obat yang disebut eksplisit (nama atau merek)
+        named = [r for r in retrieved_results if self._mentions_drug(query_lower, r['drug_info'])]
+        if len(named) != 1:
+            return None
+        
+        drug_info = named[0]['drug_info']
+        
+        # Pertanyaan dosis dengan berat badan dihitung langsung dari index dosis
+        weight = parse_weight(question) if intents[0] == 'dosis' else None
+        if weight:
+            calc = self.dose_index.calculate(named[0]['drug_id'], weight, parse_population(question))
+            if calc:
+                with self._stats_lock:
+                    self.fast_path_stats['fast_path'] += 1
+                    self.fast_path_stats['dose_calculations'] += 1
+                return format_dose_calculation(drug_info['nama'], calc) + self.DISCLAIMER
         
-        context = "🔍 **INFORMASI OBAT YANG RELEVAN:**\n\n"
+        title, fields = self.FAST_PATH_FIELDS[intents[0]]
+        lines = [f"- **{label}:** {drug_info[field]}" for label, field in fields if drug_info.get(field)]
+        if not lines:
+            return None
         
-        for i, result in enumerate(retrieved_results, 1):
-            drug_info = result['drug_info']
-            context += f"**OBAT {i}: {drug_info['nama']}**\n"
-            context += f"- Golongan: {drug_info['golongan']}\n"
-            context += f"- Indikasi: {drug_info['indikasi']}\n"
-            context += f"- Dosis Dewasa: {drug_info['dosis_dewasa']}\n"
-            context += f"- Dosis Anak: {drug_info['dosis_anak']}\n"
-            context += f"- Efek Samping: {drug_info['efek_samping']}\n"
-            context += f"- Kontraindikasi: {drug_info['kontraindikasi']}\n"
-            context += f"- Interaksi: {drug_info['interaksi']}\n"
-            if 'peringatan' in drug_info:
-                context += f"- Peringatan: {drug_info['peringatan']}\n"
-            context += "\n"
+        with self._stats_lock:
+            self.fast_path_stats['fast_path'] += 1
+        return f"### {title} {drug_info['nama']}\n\n" + "\n".join(lines) + self.DISCLAIMER
+    
+    def _build_interaction_index(self):
+        """Index pasangan interaksi dari field interaksi semua obat di database"""
+        aliases = {
+            drug_id: [info['nama']] + [brand.strip() for brand in info.get('merek_dagang', '').split(',')]
+            for drug_id, info in self.drugs_db.items()
+        }
+        index = InteractionIndex(aliases)
+        for drug_id, info in self.drugs_db.items():
+            index.add_text(drug_id, info.get('interaksi'))
+        return index
+    
+    def _answer_interactions(self, question, interactions, drug_keys):
+        """Jawab langsung 'interaksi A dan B?' / 'boleh minum A dengan B?' jika ada interaksi tercatat"""
+        query_lower = question.lower()
+        if not (any(marker in query_lower for marker in self.INTERACTION_MARKERS) or
+                asks_about_pair(question, drug_keys)):
+            return None
+        
+        # Pertanyaan terbuka dan interaksi yang hanya ada di label mentah dijawab Gemini
+        if any(marker in query_lower for marker in self.OPEN_ENDED_MARKERS) or not is_direct_answer(interactions):
+            return None
         
-        return context
+        with self._stats_lock:
+            self.fast_path_stats['fast_path'] += 1
+            self.fast_path_stats['interaction_answers'] += 1
+        return (
+            format_interactions(interactions) +
+            "\nℹ️ Hanya interaksi yang tercatat di database yang ditampilkan; "
+            "kombinasi lain belum tentu aman." + self.DISCLAIMER
+        )
+    
+    def get_stats(self):
+        """Statistik runtime untuk monitoring"""
+        with self._stats_lock:
+            stats = dict(self.fast_path_stats)
+        stats['hit_rate'] = round(stats['fast_path'] / stats['questions'], 3) if stats['questions'] else 0.0
+        return {
+            'fast_path': stats,
+            'dose_index': self.dose_index.get_stats(),
+            'interaction_index': self.interaction_index.get_stats(),
+            'context': self.context_builder.get_stats()
+        }
     
-    def ask_question(self, question):
-        """Main RAG interface - FIXED VERSION"""
+    def _build_rag_context(self, retrieved_results, intents=()):
+        """Build context untuk RAG generator, field diprioritaskan sesuai intent"""
+        if not retrieved_results:
+            return "Tidak ada informasi yang relevan ditemukan dalam database."
+        
+        return self.context_builder.build(retrieved_results, intents)
+    
+    def ask_question(self, question, on_token=None, context: ConversationContext = None):
+        """Main RAG interface - FIXED VERSION
+
+        on_token (opsional) menerima teks jawaban sementara selama streaming.
+        context (opsional) adalah ConversationContext milik sesi yang bertanya.
+        """
         try:
+            with self._stats_lock:
+                self.fast_path_stats['questions'] += 1
+            
             # Step 1: Retrieve relevant information
             retrieved_results = self._rag_retrieve(question)
             
@@ -226,11 +444,24 @@ class SimpleRAGPharmaAssistant:
                 available_drugs = ", ".join([drug['nama'] for drug in self.drugs_db.values()])
                 return f"❌ Tidak ditemukan informasi yang relevan. Coba tanyakan tentang: {available_drugs}", []
             
-            # Step 2: Build context
-            rag_context = self._build_rag_context(retrieved_results)
+            # Interaksi antar obat yang disebut di pertanyaan (semua pasangan)
+            interaction_drugs = self.interaction_index.find_drugs(question)
+            interactions = self.interaction_index.check(interaction_drugs)
+            
+            if interactions:
+                answer = self._answer_interactions(question, interactions, interaction_drugs)
+            else:
+                # Fast path: satu obat + satu field dijawab langsung tanpa Gemini
+                answer = self._try_fast_path(question, retrieved_results)
             
-            # Step 3: Generate response dengan RAG
-            answer = self._generate_rag_response(question, rag_context)
+            if answer is None:
+                # Step 2: Build context
+                rag_context = self._build_rag_context(retrieved_results, self._asked_intents(question.lower()))
+                if interactions:
+                    rag_context = format_interactions(interactions, "⚠️ **INTERAKSI TERDETEKSI:**") + "\n" + rag_context
+                
+                # Step 3: Generate response dengan RAG
+                answer = self._generate_rag_response(question, rag_context, on_token=on_token)
             
             # Step 4: Get sources - SIMPLE AND SAFE APPROACH
             sources = []
@@ -243,7 +474,7 @@ class SimpleRAGPharmaAssistant:
                     seen_drug_names.add(drug_name)
             
             # Update context
-            self._update_conversation_context(question, answer, sources)
+            self._update_conversation_context(context, sources)
             
             return answer, sources
             
@@ -251,14 +482,14 @@ class SimpleRAGPharmaAssistant:
             st.error(f"Error dalam RAG system: {e}")
             return "Maaf, terjadi error dalam sistem. Silakan coba lagi.", []
     
-    def _generate_rag_response(self, question, context):
-        """Generate response menggunakan RAG pattern"""
+    def _generate_rag_response(self, question, context, on_token=None):
+        """Generate response menggunakan RAG pattern, streaming jika on_token diberikan"""
         if not gemini_available:
             # Fallback ke response sederhana
             return f"Sistem RAG menemukan informasi berikut:\n\n{context}"
         
         try:
-            model = genai.GenerativeModel('gemini-2.0-flash')
+            model = load_genai().GenerativeModel('gemini-2.0-flash')
             
             prompt = f"""
             # PERAN: Asisten Farmasi Profesional
@@ -281,21 +512,34 @@ class SimpleRAGPharmaAssistant:
 
             ## JAWABAN:
             """
+            self.context_builder.record_prompt(prompt)
             
-            response = model.generate_content(prompt)
-            return response.text
+            if not on_token:
+                response = model.generate_content(prompt)
+                return response.text
+            
+            answer = ""
+            for chunk in model.generate_content(prompt, stream=True):
+                try:
+                    text = chunk.text
+                except ValueError:
+                    # Chunk tanpa teks (mis. hanya metadata safety)
+                    continue
+                
+                if text:
+                    answer += text
+                    on_token(answer)
+            
+            return answer
             
         except Exception as e:
             st.error(f"⚠️ Error AI: {e}")
             return f"Sistem RAG menemukan informasi berikut:\n\n{context}"
     
-    def _update_conversation_context(self, question, answer, sources):
-        """Update conversation context"""
-        if sources:
-            self.current_context = {
-                'current_drug': sources[0]['nama'],
-                'timestamp': datetime.now()
-            }
+    def _update_conversation_context(self, context, sources):
+        """Update konteks milik sesi pemanggil; assistant bersama tidak menyimpan state sesi"""
+        if context is not None:
+            context.update(sources)
 
 # Initialize RAG assistant
 @st.cache_resource
@@ -303,6 +547,19 @@ def load_rag_assistant():
     return SimpleRAGPharmaAssistant()
 
 assistant = load_rag_assistant()
+startup_run.mark('assistant')
+
+# get_stats() menjalankan COUNT(*) di SQLite; default tanpa polling per sesi
+STATUS_REFRESH_SECONDS = float(os.environ.get("CHATOBAT_STATUS_REFRESH", 0))
+
+@st.fragment(run_every=STATUS_REFRESH_SECONDS or None)
+def system_status():
+    """Status sistem sebagai fragmen: diperbarui saat rerun, berkala jika STATUS_REFRESH_SECONDS > 0"""
+    with st.expander("🩺 Status Sistem"):
+        st.json({**assistant.get_stats(), 'startup': STARTUP_TRACKER.get_stats()})
+
+# Slot sidebar diisi setelah startup_run.finish() agar status memuat run ini
+status_slot = st.sidebar.container()
 
 # Initialize session state
 if 'messages' not in st.session_state:
@@ -311,6 +568,9 @@ if 'messages' not in st.session_state:
 if 'conversation_history' not in st.session_state:
     st.session_state.conversation_history = []
 
+if 'conversation_context' not in st.session_state:
+    st.session_state.conversation_context = ConversationContext()
+
 # Custom CSS
 st.markdown("""
 <style>
@@ -388,73 +648,120 @@ st.markdown('<p class="centered-subtitle">Implementasi RAG untuk Sistem Tanya Ja
 # st.markdown("### 💬 Percakapan")
 # st.markdown('<div class="chat-container">', unsafe_allow_html=True)
 
-if not st.session_state.messages:
-    st.markdown("""
-    <div class="welcome-message">
-        <h3>👋 Selamat Datang di Asisten Obat AI</h3>
-        <p>Silahkan tanyakan terkait informasi Obat-obatan</p>
-        <p><strong>Contoh pertanyaan:</strong></p>
-        <p>"Dosis paracetamol untuk dewasa?" | "Efek samping amoxicillin?" | "Interaksi obat omeprazole?"</p>
+CHAT_WINDOW_MESSAGES = int(os.environ.get("CHATOBAT_CHAT_WINDOW", 20))
+
+def _message_html(message):
+    """HTML satu pesan; dibuat saat render, tidak disimpan di session state"""
+    css_class = "user-message" if message["role"] == "user" else "bot-message"
+    return f"""
+    <div class="{css_class}">
+        <div>{message["content"]}</div>
+        <div class="message-time">{message["timestamp"]}</div>
     </div>
-    """, unsafe_allow_html=True)
-else:
-    for i, message in enumerate(st.session_state.messages):
-        if message["role"] == "user":
-            st.markdown(f"""
-            <div class="user-message">
-                <div>{message["content"]}</div>
-                <div class="message-time">{message["timestamp"]}</div>
-            </div>
-            """, unsafe_allow_html=True)
-        else:
-            st.markdown(f"""
-            <div class="bot-message">
-                <div>{message["content"]}</div>
-                <div class="message-time">{message["timestamp"]}</div>
-            </div>
-            """, unsafe_allow_html=True)
-            
-            # Tampilkan sources jika ada
-            if "sources" in message and message["sources"]:
-                with st.expander("📚 Informasi Obat"):
-                    for drug in message["sources"]:
-                        st.write(f"• **{drug['nama']}** - {drug['golongan']}")
-
-st.markdown('</div>', unsafe_allow_html=True)
-
-# Input area
-with st.form("chat_form", clear_on_submit=True):
-    user_input = st.text_input(
-        "Tulis pertanyaan Anda tentang obat:",
-        placeholder="Contoh: Apa dosis paracetamol? Efek samping amoxicillin? Interaksi obat?",
-        key="user_input"
-    )
+    """
+
+def _sources_markdown(message):
+    """Daftar obat sumber jawaban dari drugs_db (hanya pesan di jendela chat)"""
+    drugs = filter(None, map(assistant.get_record, message.get("source_ids", [])))
+    return "  \n".join(f"• **{drug['nama']}** - {drug['golongan']}" for drug in drugs)
+
+def _render_message(message):
+    st.markdown(_message_html(message), unsafe_allow_html=True)
     
-    col_btn1, col_btn2 = st.columns([3, 1])
+    # Tampilkan sources jika ada
+    if message["role"] != "user" and message.get("source_ids"):
+        with st.expander("📚 Informasi Obat"):
+            st.markdown(_sources_markdown(message))
+
+def _show_older_messages():
+    st.session_state.chat_window += CHAT_WINDOW_MESSAGES
+
+def _clear_chat():
+    st.session_state.messages = []
+    st.session_state.conversation_history = []
+    st.session_state.conversation_context.clear()
+    st.session_state.chat_window = CHAT_WINDOW_MESSAGES
+
+@st.fragment
+def chat_panel():
+    """Panel chat sebagai fragmen: bertanya hanya menjalankan ulang bagian ini
+
+    Hanya CHAT_WINDOW_MESSAGES pesan terakhir yang dirender; pesan lama dimuat
+    lewat tombol. Pesan hanya menyimpan teks dan id record, HTML dibuat saat render.
+    """
+    if 'chat_window' not in st.session_state:
+        st.session_state.chat_window = CHAT_WINDOW_MESSAGES
     
-    with col_btn1:
-        submit_btn = st.form_submit_button(
-            "🚀 Tanya", 
-            use_container_width=True
-        )
+    messages = st.session_state.messages
+    if not messages:
+        st.markdown("""
+        <div class="welcome-message">
+            <h3>👋 Selamat Datang di Asisten Obat AI</h3>
+            <p>Silahkan tanyakan terkait informasi Obat-obatan</p>
+            <p><strong>Contoh pertanyaan:</strong></p>
+            <p>"Dosis paracetamol untuk dewasa?" | "Efek samping amoxicillin?" | "Interaksi obat omeprazole?"</p>
+        </div>
+        """, unsafe_allow_html=True)
+    else:
+        hidden = max(0, len(messages) - st.session_state.chat_window)
+        if hidden:
+            st.button(f"⬆️ Tampilkan pesan sebelumnya ({hidden})", on_click=_show_older_messages)
+        
+        for message in messages[hidden:]:
+            _render_message(message)
     
-    with col_btn2:
-        clear_btn = st.form_submit_button(
-            "🗑️ Hapus Chat", 
-            use_container_width=True
+    # Slot untuk giliran yang sedang berjalan, di atas form input
+    live_turn = st.container()
+    
+    # Input area
+    with st.form("chat_form", clear_on_submit=True):
+        user_input = st.text_input(
+            "Tulis pertanyaan Anda tentang obat:",
+            placeholder="Contoh: Apa dosis paracetamol? Efek samping amoxicillin? Interaksi obat?",
+            key="user_input"
         )
-
-if submit_btn and user_input:
-    # Add user message
-    st.session_state.messages.append({
-        "role": "user", 
-        "content": user_input,
-        "timestamp": datetime.now().strftime("%H:%M")
-    })
+        
+        col_btn1, col_btn2 = st.columns([3, 1])
+        
+        with col_btn1:
+            submit_btn = st.form_submit_button(
+                "🚀 Tanya", 
+                use_container_width=True
+            )
+        
+        with col_btn2:
+            st.form_submit_button(
+                "🗑️ Hapus Chat", 
+                use_container_width=True,
+                on_click=_clear_chat
+            )
     
-    # Get RAG response
-    with st.spinner("🔍 Mencari Jawaban: Retrieving information..."):
-        answer, sources = assistant.ask_question(user_input)
+    if submit_btn and user_input:
+        # Add user message
+        user_message = {
+            "role": "user", 
+            "content": user_input,
+            "timestamp": datetime.now().strftime("%H:%M")
+        }
+        messages.append(user_message)
+        
+        with live_turn:
+            _render_message(user_message)
+            bot_slot = st.empty()
+        
+        def render_partial_answer(partial_answer):
+            bot_slot.markdown(f"""
+            <div class="bot-message">
+                <div>{partial_answer} ▌</div>
+            </div>
+            """, unsafe_allow_html=True)
+        
+        # Get RAG response (jawaban di-stream ke bot_slot)
+        with st.spinner("🔍 Mencari Jawaban: Retrieving information..."):
+            answer, sources = assistant.ask_question(
+                user_input, on_token=render_partial_answer,
+                context=st.session_state.conversation_context
+            )
         
         # Add to conversation history
         st.session_state.conversation_history.append({
@@ -466,20 +773,26 @@ if submit_btn and user_input:
         })
         
         # Add bot message
-        st.session_state.messages.append({
+        bot_message = {
             "role": "bot", 
             "content": answer,
-            "sources": sources,
+            # Pesan hanya menyimpan id record, bukan salinan data obat
+            "source_ids": [drug.record_id for drug in sources],
             "timestamp": datetime.now().strftime("%H:%M")
-        })
-    
-    st.rerun()
+        }
+        messages.append(bot_message)
+        
+        # Giliran baru digambar di tempat tanpa st.rerun(); rerun berikutnya
+        # menampilkannya sebagai bagian dari riwayat
+        bot_slot.empty()
+        with live_turn:
+            _render_message(bot_message)
 
-if clear_btn:
-    st.session_state.messages = []
-    st.session_state.conversation_history = []
-    assistant.current_context = {}
-    st.rerun()
+chat_panel()
+startup_run.finish()
+
+with status_slot:
+    system_status()
 
 # Footer dengan penjelasan RAG
 st.markdown("---")
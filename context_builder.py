@@ -0,0 +1,183 @@
+"""Penyusun konteks RAG dengan prioritas field per intent dan batas token
+
+Dipakai bersama oleh app.py dan testchat.py. Field yang ditanyakan (mis. dosis)
+masuk lebih dulu; field lain hanya ditambahkan untuk pertanyaan tanpa intent
+jelas, selama anggaran token masih cukup. Baris tiap obat dirender sekali per
+record dan dipakai ulang sampai record tersebut diganti.
+"""
+import os
+import threading
+
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("CHATOBAT_CONTEXT_TOKEN_BUDGET", "1500"))
+
+# Sisa anggaran di bawah ini tidak dipakai untuk potongan field yang terpotong
+MIN_TRUNCATED_TOKENS = 24
+
+EMPTY_VALUES = (None, "", "Tidak tersedia")
+
+
+def estimate_tokens(text: str):
+    """Perkiraan kasar jumlah token (~4 karakter per token)"""
+    return max(1, (len(text) + 3) // 4)
+
+
+class ContextBuilder:
+    """Menyusun konteks dari hasil retrieval sesuai intent pertanyaan dan anggaran token"""
+
+    def __init__(self, fields, intent_fields: dict, core_fields=(),
+                 header: str = "", drug_heading: str = "OBAT {index}: {nama}\n",
+                 line_format: str = "- {label}: {text}\n",
+                 token_budget: int = CONTEXT_TOKEN_BUDGET, max_field_chars: int = 300):
+        """
+        fields: urutan tampil [(label, field), ...]
+        intent_fields: {intent: [field, ...]} yang menjawab intent tersebut
+        core_fields: field identitas yang selalu ikut (mis. golongan)
+        """
+        self.fields = list(fields)
+        self.intent_fields = intent_fields
+        self.core_fields = set(core_fields)
+        self.header = header
+        self.drug_heading = drug_heading
+        self.line_format = line_format
+        self.token_budget = token_budget
+        self.max_field_chars = max_field_chars
+
+        self._lock = threading.Lock()
+        self._fragments = {}
+        self._stats = {
+            'builds': 0, 'context_tokens_total': 0, 'fields_dropped_total': 0,
+            'fragment_hits': 0, 'fragment_renders': 0
+        }
+        self._last = {}
+
+    def _priority(self, field, asked_fields):
+        if field in asked_fields:
+            return 0
+        if field in self.core_fields:
+            return 1
+        # Field lain hanya untuk pertanyaan terbuka tanpa intent
+        return None if asked_fields else 2
+
+    def render_fragment(self, drug_info: dict):
+        """Render semua baris field satu obat: (urutan, field, label, teks, baris, token)"""
+        fragment = []
+        for order, (label, field) in enumerate(self.fields):
+            value = drug_info.get(field)
+            if value in EMPTY_VALUES:
+                continue
+
+            text = str(value)
+            if len(text) > self.max_field_chars:
+                text = text[:self.max_field_chars] + "..."
+            line = self.line_format.format(label=label, text=text)
+            fragment.append((order, field, label, text, line, estimate_tokens(line)))
+        return tuple(fragment)
+
+    def prime(self, drug_key: str, drug_info: dict):
+        """Render ulang fragmen saat record obat disimpan atau di-refresh"""
+        fragment = self.render_fragment(drug_info)
+        with self._lock:
+            self._fragments[drug_key] = (drug_info, fragment)
+            self._stats['fragment_renders'] += 1
+        return fragment
+
+    def invalidate(self, drug_key: str):
+        with self._lock:
+            self._fragments.pop(drug_key, None)
+
+    def _fragment_for(self, result):
+        drug_key = result.get('drug_id') or result['drug_info']['nama']
+        with self._lock:
+            entry = self._fragments.get(drug_key)
+            # Record yang sudah diganti (refresh) punya objek baru: fragmen lama tidak dipakai
+            if entry and entry[0] is result['drug_info']:
+                self._stats['fragment_hits'] += 1
+                return entry[1]
+        return self.prime(drug_key, result['drug_info'])
+
+    def _candidates(self, fragments, asked_fields):
+        candidates = []
+        for rank, fragment in enumerate(fragments):
+            for order, field, label, text, line, tokens in fragment:
+                priority = self._priority(field, asked_fields)
+                if priority is not None:
+                    candidates.append((priority, rank, order, label, text, line, tokens))
+        return candidates
+
+    def build(self, retrieved_results, intents=()):
+        """Return teks konteks; ukuran yang dihasilkan dicatat di get_stats()"""
+        asked_fields = {field for intent in intents for field in self.intent_fields.get(intent, [])}
+        fragments = [self._fragment_for(result) for result in retrieved_results]
+        candidates = self._candidates(fragments, asked_fields)
+
+        if asked_fields and not any(candidate[0] == 0 for candidate in candidates):
+            # Field yang ditanyakan tidak tersedia: perlakukan sebagai pertanyaan terbuka
+            candidates = self._candidates(fragments, set())
+
+        used = estimate_tokens(self.header)
+        headings = {
+            rank: self.drug_heading.format(index=rank + 1, nama=result['drug_info']['nama'])
+            for rank, result in enumerate(retrieved_results)
+        }
+
+        # Greedy per prioritas: intent dulu, lalu identitas, lalu sisanya (obat teratas lebih dulu)
+        selected = {}
+        dropped = 0
+        for priority, rank, order, label, text, line, tokens in sorted(candidates):
+            cost = tokens
+            if rank not in selected:
+                cost += estimate_tokens(headings[rank])
+
+            remaining = self.token_budget - used
+            if cost > remaining:
+                # Potong field prioritas tertinggi daripada membuangnya sama sekali
+                room = (remaining - (cost - estimate_tokens(text))) * 4
+                if priority == 0 and room >= MIN_TRUNCATED_TOKENS * 4:
+                    line = self.line_format.format(label=label, text=text[:room - 3] + "...")
+                    cost = remaining
+                else:
+                    dropped += 1
+                    continue
+
+            selected.setdefault(rank, []).append((order, line))
+            used += cost
+
+        # Konteks = gabungan string yang sudah dirender
+        parts = [self.header]
+        for rank in sorted(selected):
+            parts.append(headings[rank])
+            parts.extend(line for _, line in sorted(selected[rank]))
+            parts.append("\n")
+        context = "".join(parts)
+
+        report = {
+            'context_tokens': estimate_tokens(context),
+            'context_chars': len(context),
+            'fields_included': sum(len(lines) for lines in selected.values()),
+            'fields_dropped': dropped,
+            'drugs': len(selected),
+            'intents': list(intents),
+            'budget': self.token_budget
+        }
+        with self._lock:
+            self._stats['builds'] += 1
+            self._stats['context_tokens_total'] += report['context_tokens']
+            self._stats['fields_dropped_total'] += dropped
+            self._last = report
+
+        return context
+
+    def record_prompt(self, prompt: str):
+        """Catat ukuran prompt lengkap (template + konteks + pertanyaan) yang dikirim ke LLM"""
+        with self._lock:
+            self._last = dict(self._last, prompt_tokens=estimate_tokens(prompt))
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['last'] = dict(self._last)
+            stats['fragments_cached'] = len(self._fragments)
+        stats['avg_context_tokens'] = (
+            round(stats['context_tokens_total'] / stats['builds'], 1) if stats['builds'] else 0.0
+        )
+        return stats
@@ -0,0 +1,32 @@
+"""State percakapan per sesi untuk app.py dan testchat.py
+
+Assistant di-cache dengan st.cache_resource sehingga dipakai bersama semua
+user. Semua yang milik satu percakapan (obat terakhir yang dibahas, jumlah
+giliran) disimpan di objek ini, di st.session_state, dan diberikan ke
+ask_question sehingga assistant sendiri tidak menyimpan state per user.
+"""
+from datetime import datetime
+
+
+class ConversationContext:
+    """Konteks satu sesi chat; hanya diubah oleh thread sesi pemiliknya"""
+
+    __slots__ = ('current_drug', 'timestamp', 'turns')
+
+    def __init__(self):
+        self.clear()
+
+    def update(self, sources):
+        """Catat satu giliran tanya jawab; obat sumber pertama menjadi obat aktif"""
+        self.turns += 1
+        if sources:
+            self.current_drug = sources[0]['nama']
+            self.timestamp = datetime.now()
+
+    def clear(self):
+        self.current_drug = None
+        self.timestamp = None
+        self.turns = 0
+
+    def to_dict(self):
+        return {'current_drug': self.current_drug, 'timestamp': self.timestamp, 'turns': self.turns}
@@ -0,0 +1,330 @@
+"""Index dosis terstruktur dan kalkulator dosis berbasis berat badan
+
+Dipakai bersama oleh app.py dan testchat.py. String dosis seperti
+"10-15 mg/kgBB setiap 4-6 jam" atau "Maksimal 4000 mg per hari" diparse sekali
+saat load menjadi angka, sehingga pertanyaan dosis dengan berat badan bisa
+dijawab tanpa LLM.
+"""
+import math
+import re
+from array import array
+
+NUMBER = r'(\d+(?:[.,]\d+)?)'
+UNITS = ['mg', 'mcg', 'g', 'ml', 'iu', 'tablet', 'kapsul', 'inhalasi']
+
+AMOUNT_RE = re.compile(
+    NUMBER + r'(?:\s*-\s*' + NUMBER + r')?\s*(' + '|'.join(UNITS) + r')\b'
+    r'(\s*/\s*kg(?:bb)?)?'
+    r'(\s*(?:/|per)\s*hari)?'
+)
+MAX_RE = re.compile(
+    r'maks(?:imal|imum)?\s+' + NUMBER + r'\s*(' + '|'.join(UNITS) + r')\b'
+    r'(\s*/\s*kg(?:bb)?)?\s*(?:/|per)\s*hari'
+)
+INTERVAL_RE = re.compile(r'setiap\s+' + NUMBER + r'(?:\s*-\s*' + NUMBER + r')?\s*jam')
+TIMES_A_DAY_RE = re.compile(r'(\d+)\s*(?:x|kali)\s*sehari')
+DIVIDED_RE = re.compile(r'dibagi\s+(\d+)\s*dosis')
+WEIGHT_RE = re.compile(r'(?<![/\w.,])' + NUMBER + r'\s*(?:kg|kilo(?:gram)?)\b(?!\s*bb)')
+
+CHILD_WORDS = ['anak', 'bayi', 'balita', 'batita']
+ADULT_WORDS = ['dewasa', 'remaja']
+# Tanpa keterangan populasi, berat >= batas ini dihitung dengan dosis dewasa
+ADULT_WEIGHT_KG = 40
+
+FLAG_PER_KG = 1
+FLAG_PER_DAY = 2
+
+
+def _to_float(text):
+    return float(text.replace(',', '.'))
+
+
+def parse_daily_max(text: str):
+    """Dosis maksimal harian dalam satuan absolut, None jika tidak ada"""
+    match = MAX_RE.search(text.lower())
+    if not match or match.group(3):
+        return None
+    return _to_float(match.group(1))
+
+
+def parse_dose(text: str):
+    """Parse satu string dosis menjadi dict terstruktur, None jika tidak ada angka dosis
+
+    Hanya alternatif pertama yang dipakai ("250-500 mg setiap 8 jam atau 875 mg
+    setiap 12 jam" -> 250-500 mg setiap 8 jam).
+    """
+    if not text:
+        return None
+
+    text = text.lower()
+    daily_max = parse_daily_max(text)
+
+    # Buang klausa maksimal agar angkanya tidak terbaca sebagai dosis
+    body = MAX_RE.sub('', text).split(' atau ')[0]
+    amount = AMOUNT_RE.search(body)
+
+    if not amount:
+        if daily_max is None:
+            return None
+        return {
+            'amount_min': math.nan, 'amount_max': math.nan, 'unit': 'mg',
+            'per_kg': False, 'per_day': False,
+            'interval_min': math.nan, 'interval_max': math.nan,
+            'daily_max': daily_max
+        }
+
+    amount_min = _to_float(amount.group(1))
+    amount_max = _to_float(amount.group(2)) if amount.group(2) else amount_min
+    per_day = bool(amount.group(5))
+
+    interval_min = interval_max = math.nan
+    rest = body[amount.end():]
+    interval = INTERVAL_RE.search(rest)
+    times = TIMES_A_DAY_RE.search(rest)
+    divided = DIVIDED_RE.search(rest)
+
+    if interval:
+        interval_min = _to_float(interval.group(1))
+        interval_max = _to_float(interval.group(2)) if interval.group(2) else interval_min
+    elif times:
+        interval_min = interval_max = 24 / int(times.group(1))
+    elif divided:
+        interval_min = interval_max = 24 / int(divided.group(1))
+    elif 'sekali sehari' in rest:
+        interval_min = interval_max = 24.0
+
+    return {
+        'amount_min': amount_min,
+        'amount_max': amount_max,
+        'unit': amount.group(3),
+        'per_kg': bool(amount.group(4)),
+        'per_day': per_day,
+        'interval_min': interval_min,
+        'interval_max': interval_max,
+        'daily_max': daily_max if daily_max is not None else math.nan
+    }
+
+
+def parse_weight(question: str):
+    """Berat badan (kg) yang disebut di pertanyaan, None jika tidak ada"""
+    match = WEIGHT_RE.search(question.lower())
+    if not match:
+        return None
+    weight = _to_float(match.group(1))
+    return weight if 0 < weight < 300 else None
+
+
+def parse_population(question: str):
+    """'anak' / 'dewasa' jika disebut di pertanyaan, selain itu None"""
+    text = question.lower()
+    if any(re.search(r'\b' + word, text) for word in CHILD_WORDS):
+        return 'anak'
+    if any(re.search(r'\b' + word, text) for word in ADULT_WORDS):
+        return 'dewasa'
+    return None
+
+
+def _fmt(value):
+    if value >= 100 or value == int(value):
+        return f"{value:.0f}"
+    return f"{value:.1f}".rstrip('0').rstrip('.')
+
+
+def _fmt_range(low, high):
+    if _fmt(low) == _fmt(high):
+        return _fmt(low)
+    return f"{_fmt(low)}-{_fmt(high)}"
+
+
+class DoseIndex:
+    """Index dosis berbasis array kolom: satu baris per (obat, populasi)
+
+    Kolom numerik disimpan di array('d') dengan NaN untuk nilai yang tidak
+    ada, flag per-kg/per-hari di array('B'), dan satuan sebagai id ke tabel
+    satuan kecil.
+    """
+
+    POPULATIONS = ('dewasa', 'anak')
+
+    def __init__(self):
+        self._rows = {}
+        self._texts = []
+        self.amount_min = array('d')
+        self.amount_max = array('d')
+        self.interval_min = array('d')
+        self.interval_max = array('d')
+        self.daily_max = array('d')
+        self.flags = array('B')
+        self.unit_ids = array('B')
+        self.units = list(UNITS)
+
+    @classmethod
+    def from_drug_records(cls, records: dict):
+        """Bangun index dari dict {kunci_obat: drug_info} (field dosis_dewasa/dosis_anak/dosis_maksimal)"""
+        index = cls()
+        for drug_key, info in records.items():
+            daily_max = parse_daily_max(info.get('dosis_maksimal') or '')
+            index.add(drug_key, 'dewasa', info.get('dosis_dewasa'), daily_max)
+            index.add(drug_key, 'anak', info.get('dosis_anak'))
+        return index
+
+    def add(self, drug_key: str, population: str, text: str, daily_max: float = None):
+        """Parse dan simpan satu string dosis; return False jika tidak bisa diparse"""
+        dose = parse_dose(text)
+        if not dose:
+            return False
+
+        if daily_max is not None and math.isnan(dose['daily_max']):
+            dose['daily_max'] = daily_max
+
+        self._rows[(drug_key.lower(), population)] = len(self.flags)
+        self._texts.append(text)
+        self.amount_min.append(dose['amount_min'])
+        self.amount_max.append(dose['amount_max'])
+        self.interval_min.append(dose['interval_min'])
+        self.interval_max.append(dose['interval_max'])
+        self.daily_max.append(dose['daily_max'])
+        self.flags.append((FLAG_PER_KG if dose['per_kg'] else 0) | (FLAG_PER_DAY if dose['per_day'] else 0))
+        self.unit_ids.append(self.units.index(dose['unit']))
+        return True
+
+    def __len__(self):
+        return len(self.flags)
+
+    def get(self, drug_key: str, population: str):
+        """Record dosis terstruktur untuk satu obat dan populasi"""
+        row = self._rows.get((drug_key.lower(), population))
+        if row is None:
+            return None
+
+        return {
+            'amount_min': self.amount_min[row],
+            'amount_max': self.amount_max[row],
+            'unit': self.units[self.unit_ids[row]],
+            'per_kg': bool(self.flags[row] & FLAG_PER_KG),
+            'per_day': bool(self.flags[row] & FLAG_PER_DAY),
+            'interval_min': self.interval_min[row],
+            'interval_max': self.interval_max[row],
+            'daily_max': self.daily_max[row],
+            'text': self._texts[row]
+        }
+
+    def _daily_cap(self, drug_key, dose):
+        if not math.isnan(dose['daily_max']):
+            return dose['daily_max']
+        # Dosis anak tidak boleh melebihi batas harian dewasa
+        adult = self.get(drug_key, 'dewasa')
+        if adult and adult['unit'] == dose['unit'] and not math.isnan(adult['daily_max']):
+            return adult['daily_max']
+        return None
+
+    def calculate(self, drug_key: str, weight_kg: float, population: str = None):
+        """Hitung dosis per kali dan per hari untuk berat badan tertentu
+
+        Tanpa populasi eksplisit, berat < ADULT_WEIGHT_KG dihitung sebagai anak.
+        Tidak ada fallback ke populasi lain: dosis anak yang tidak bisa diparse
+        (mis. "Tidak dianjurkan untuk anak") menghasilkan None. Total harian
+        dipotong ke dosis maksimal jika terlampaui.
+        """
+        if population is None:
+            population = 'dewasa' if weight_kg >= ADULT_WEIGHT_KG else 'anak'
+
+        dose = self.get(drug_key, population)
+        if not dose or math.isnan(dose['amount_min']):
+            return None
+
+        factor = weight_kg if dose['per_kg'] else 1.0
+        amount_min = dose['amount_min'] * factor
+        amount_max = dose['amount_max'] * factor
+        has_interval = not math.isnan(dose['interval_min'])
+
+        if has_interval:
+            doses_min = 24 / dose['interval_max']
+            doses_max = 24 / dose['interval_min']
+        else:
+            doses_min = doses_max = None
+
+        if dose['per_day']:
+            per_day_min, per_day_max = amount_min, amount_max
+            per_dose_min = amount_min / doses_max if has_interval else None
+            per_dose_max = amount_max / doses_min if has_interval else None
+        else:
+            per_dose_min, per_dose_max = amount_min, amount_max
+            per_day_min = amount_min * doses_min if has_interval else None
+            per_day_max = amount_max * doses_max if has_interval else None
+
+        daily_cap = self._daily_cap(drug_key, dose)
+        capped = False
+        if daily_cap is not None:
+            if per_day_max is not None and per_day_max > daily_cap:
+                per_day_max = daily_cap
+                per_day_min = min(per_day_min, daily_cap)
+                capped = True
+            if per_dose_max is not None and per_dose_max > daily_cap:
+                per_dose_max = daily_cap
+                per_dose_min = min(per_dose_min, daily_cap)
+                capped = True
+
+        return {
+            'population': population,
+            'weight_kg': weight_kg,
+            'unit': dose['unit'],
+            'per_kg': dose['per_kg'],
+            'per_dose_min': per_dose_min,
+            'per_dose_max': per_dose_max,
+            'doses_per_day_min': doses_min,
+            'doses_per_day_max': doses_max,
+            'interval_min': dose['interval_min'] if has_interval else None,
+            'interval_max': dose['interval_max'] if has_interval else None,
+            'per_day_min': per_day_min,
+            'per_day_max': per_day_max,
+            'daily_max': daily_cap,
+            'capped': capped,
+            'source_text': dose['text']
+        }
+
+    def get_stats(self):
+        columns = [self.amount_min, self.amount_max, self.interval_min,
+                   self.interval_max, self.daily_max, self.flags, self.unit_ids]
+        return {
+            'rows': len(self),
+            'bytes': sum(column.itemsize * len(column) for column in columns)
+        }
+
+
+def calculate_from_record(drug_key: str, drug_info, weight_kg: float, population: str = None):
+    """Hitung dosis dari teks dosis record yang sedang disajikan
+
+    Dipakai jika record bisa berbeda dari data yang di-index saat load (mis.
+    label FDA live), sehingga hasil hitungan selalu berasal dari sumber yang
+    sama dengan atribusi jawaban. None jika teks dosisnya tidak bisa diparse.
+    """
+    return DoseIndex.from_drug_records({drug_key: drug_info}).calculate(drug_key, weight_kg, population)
+
+
+def format_dose_calculation(drug_name: str, calc: dict):
+    """Render hasil DoseIndex.calculate sebagai jawaban markdown berbahasa Indonesia"""
+    unit = calc['unit']
+    lines = [f"### Perhitungan Dosis {drug_name} ({_fmt(calc['weight_kg'])} kg)", ""]
+
+    if calc['per_dose_min'] is not None:
+        lines.append(f"- **Dosis per kali:** {_fmt_range(calc['per_dose_min'], calc['per_dose_max'])} {unit}")
+
+    if calc['interval_min'] is not None:
+        lines.append(
+            f"- **Frekuensi:** setiap {_fmt_range(calc['interval_min'], calc['interval_max'])} jam "
+            f"({_fmt_range(calc['doses_per_day_min'], calc['doses_per_day_max'])} kali sehari)"
+        )
+
+    if calc['per_day_min'] is not None:
+        lines.append(f"- **Total per hari:** {_fmt_range(calc['per_day_min'], calc['per_day_max'])} {unit}")
+
+    if calc['daily_max'] is not None:
+        lines.append(f"- **Batas maksimal:** {_fmt(calc['daily_max'])} {unit} per hari")
+
+    if calc['capped']:
+        lines.append(f"\n⚠️ Hasil perhitungan melebihi batas harian, sehingga dipotong ke {_fmt(calc['daily_max'])} {unit} per hari.")
+
+    basis = "per kg berat badan" if calc['per_kg'] else "dosis tetap, tidak bergantung berat badan"
+    lines.append(f"\n_Dihitung dari dosis {calc['population']}: {calc['source_text']} ({basis})._")
+    return "\n".join(lines)
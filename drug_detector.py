@@ -0,0 +1,321 @@
+"""Deteksi nama obat di pertanyaan user untuk testchat.py
+
+AliasMatcher mencari semua alias dalam satu scan (Aho-Corasick),
+FuzzyAliasIndex menangani salah ketik lewat index SymSpell, dan
+EnhancedDrugDetector menggabungkan keduanya dengan kamus alias obat.
+Modul ini tidak bergantung pada Streamlit sehingga bisa dipakai CLI ingest.
+"""
+import collections
+import re
+
+class AliasMatcher:
+    """Automaton Aho-Corasick untuk mencari semua alias obat dalam satu kali scan query.
+
+    Dibangun sekali saat startup; biaya pencarian sebanding dengan panjang query
+    ditambah jumlah hit, tidak bergantung pada jumlah alias.
+    """
+
+    # Akhiran klitik Bahasa Indonesia yang boleh menempel pada nama obat ("paracetamolnya")
+    INDONESIAN_SUFFIXES = ('nya', 'lah', 'kah', 'pun')
+
+    def __init__(self, alias_to_drug: dict):
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+
+        for alias, drug_name in alias_to_drug.items():
+            self._add_pattern(alias, drug_name)
+
+        self._build_failure_links()
+
+    def _add_pattern(self, alias: str, drug_name: str):
+        state = 0
+        for char in alias:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+                self._goto[state][char] = next_state
+            state = next_state
+        self._output[state].append((alias, drug_name))
+
+    def _build_failure_links(self):
+        """BFS atas trie untuk membangun failure link dan menggabungkan output"""
+        queue = collections.deque(self._goto[0].values())
+
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[next_state] = self._goto[fallback].get(char, 0)
+                if self._fail[next_state] == next_state:
+                    self._fail[next_state] = 0
+
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def _is_word_boundary(self, text: str, start: int, end: int):
+        """Alias harus berdiri sebagai kata utuh, boleh diikuti akhiran klitik"""
+        if start > 0 and text[start - 1].isalnum():
+            return False
+
+        if end == len(text) or not text[end].isalnum():
+            return True
+
+        for suffix in self.INDONESIAN_SUFFIXES:
+            suffix_end = end + len(suffix)
+            if text.startswith(suffix, end) and (suffix_end == len(text) or not text[suffix_end].isalnum()):
+                return True
+
+        return False
+
+    def find_all(self, text: str):
+        """Semua hit alias sebagai dict (start, end, alias, drug_name), urut posisi"""
+        matches = []
+        state = 0
+
+        for position, char in enumerate(text):
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+
+            for alias, drug_name in self._output[state]:
+                start = position - len(alias) + 1
+                end = position + 1
+                if self._is_word_boundary(text, start, end):
+                    matches.append({'start': start, 'end': end, 'alias': alias, 'drug_name': drug_name})
+
+        matches.sort(key=lambda m: (m['start'], -(m['end'] - m['start'])))
+        return matches
+
+class FuzzyAliasIndex:
+    """Indeks typo-tolerant ala SymSpell (deletion dictionary) atas semua alias obat.
+
+    Semua varian hapus-huruf dari alias dihitung sekali saat startup, jadi lookup
+    cukup membangkitkan varian dari kata query lalu memverifikasi kandidatnya.
+    Ejaan Indonesia dinormalisasi dulu ("parasetamol", "amoksisilin", "omeprazol").
+    """
+
+    def __init__(self, alias_to_drug: dict, max_edit_distance: int = 2, min_length: int = 5):
+        self.max_edit_distance = max_edit_distance
+        self.min_length = min_length
+        self.alias_to_drug = {}
+        self.normalized_aliases = {}
+        self.deletes = {}
+
+        for alias, drug_name in alias_to_drug.items():
+            normalized = self.normalize(alias)
+            if len(normalized) < min_length:
+                continue
+
+            self.alias_to_drug[alias] = drug_name
+            self.normalized_aliases[alias] = normalized
+            for variant in self._generate_deletes(normalized):
+                self.deletes.setdefault(variant, set()).add(alias)
+
+    @staticmethod
+    def normalize(text: str):
+        """Samakan ejaan Inggris/Latin dengan ejaan Indonesia sebelum dibandingkan"""
+        # Huruf ganda disederhanakan: "amoxicillin" -> "amoxicilin"
+        text = re.sub(r'(.)\1+', r'\1', text.lower())
+        for source, target in (('ph', 'f'), ('th', 't'), ('ck', 'k'), ('qu', 'kw'), ('x', 'ks')):
+            text = text.replace(source, target)
+        text = re.sub(r'c(?=[eiy])', 's', text)
+        # c di akhir kata dibiarkan agar "vitamin c" tidak menjadi "vitamin k"
+        text = re.sub(r'c(?=[a-z])', 'k', text)
+        text = re.sub(r'(.)\1+', r'\1', text)
+        # Ejaan Indonesia biasanya membuang e di akhir: "omeprazole" -> "omeprazol"
+        if len(text) > 5 and text.endswith('e'):
+            text = text[:-1]
+        return text
+
+    def _generate_deletes(self, word: str):
+        """Semua string hasil menghapus hingga max_edit_distance huruf"""
+        results = {word}
+        frontier = {word}
+        for _ in range(self.max_edit_distance):
+            next_frontier = set()
+            for item in frontier:
+                for i in range(len(item)):
+                    next_frontier.add(item[:i] + item[i + 1:])
+            results |= next_frontier
+            frontier = next_frontier
+        return results
+
+    def _allowed_distance(self, length: int):
+        """Kata pendek butuh kecocokan lebih ketat agar tidak salah cocok dengan kata umum"""
+        if length <= 5:
+            return 0
+        if length <= 8:
+            return min(1, self.max_edit_distance)
+        return self.max_edit_distance
+
+    @staticmethod
+    def _edit_distance(a: str, b: str, limit: int):
+        """Damerau-Levenshtein (optimal string alignment) dengan batas awal"""
+        if abs(len(a) - len(b)) > limit:
+            return limit + 1
+
+        previous_previous = None
+        previous = list(range(len(b) + 1))
+        for i in range(1, len(a) + 1):
+            current = [i] + [0] * len(b)
+            for j in range(1, len(b) + 1):
+                cost = 0 if a[i - 1] == b[j - 1] else 1
+                current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+                if (previous_previous is not None and i > 1 and j > 1
+                        and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]):
+                    current[j] = min(current[j], previous_previous[j - 2] + 1)
+            if min(current) > limit:
+                return limit + 1
+            previous_previous, previous = previous, current
+
+        return previous[-1]
+
+    def lookup(self, term: str):
+        """Kandidat alias untuk term, urut jarak edit (0 = sama setelah normalisasi)"""
+        normalized = self.normalize(term)
+        if len(normalized) < self.min_length:
+            return []
+
+        # Untuk frasa, batas ditentukan kata terpendek ("vitamin k" bukan typo "vitamin c")
+        limit = self._allowed_distance(min(len(word) for word in normalized.split()))
+        candidates = set()
+        for variant in self._generate_deletes(normalized):
+            candidates |= self.deletes.get(variant, set())
+
+        matches = []
+        for alias in candidates:
+            distance = self._edit_distance(normalized, self.normalized_aliases[alias], limit)
+            if distance <= limit:
+                matches.append({'alias': alias, 'drug_name': self.alias_to_drug[alias], 'distance': distance})
+
+        matches.sort(key=lambda m: (m['distance'], m['alias']))
+        return matches
+
+class EnhancedDrugDetector:
+    def __init__(self):
+        self.drug_dictionary = {
+            'paracetamol': ['acetaminophen', 'paracetamol', 'panadol', 'sanmol', 'tempra'],
+            'omeprazole': ['omeprazole', 'prilosec', 'losec', 'omepron'],
+            'amoxicillin': ['amoxicillin', 'amoxilin', 'amoxan', 'moxigra'],
+            'ibuprofen': ['ibuprofen', 'proris', 'arthrifen', 'ibufar'],
+            'metformin': ['metformin', 'glucophage', 'metfor', 'diabex'],
+            'atorvastatin': ['atorvastatin', 'lipitor', 'atorva', 'tovast'],
+            'simvastatin': ['simvastatin', 'zocor', 'simvor', 'lipostat'],
+            'loratadine': ['loratadine', 'clarityne', 'loramine', 'allertine'],
+            'aspirin': ['aspirin', 'aspro', 'aspilet', 'cardiprin'],
+            'vitamin c': ['ascorbic acid', 'vitamin c', 'redoxon', 'enervon c'],
+            'lansoprazole': ['lansoprazole', 'prevacid', 'lanzol', 'gastracid'],
+            'esomeprazole': ['esomeprazole', 'nexium', 'esotrax', 'esomep'],
+            'cefixime': ['cefixime', 'suprax', 'cefix', 'fixcef'],
+            'cetirizine': ['cetirizine', 'zyrtec', 'cetrizin', 'allertec'],
+            'dextromethorphan': ['dextromethorphan', 'dmp', 'dextro', 'valtus'],
+            'ambroxol': ['ambroxol', 'mucosolvan', 'ambrox', 'broxol'],
+            'salbutamol': ['albuterol', 'salbutamol', 'ventolin', 'salbu', 'asmasolon']
+        }
+        
+        self.fda_name_mapping = {
+            'paracetamol': 'acetaminophen',
+            'vitamin c': 'ascorbic acid', 
+            'salbutamol': 'albuterol'
+        }
+        
+        # Automaton alias dibangun sekali; deteksi cukup satu kali scan query
+        alias_to_drug = {
+            alias: drug_name
+            for drug_name, aliases in self.drug_dictionary.items()
+            for alias in aliases
+        }
+        self.alias_matcher = AliasMatcher(alias_to_drug)
+        # Tahap kedua untuk salah ketik / ejaan Indonesia
+        self.fuzzy_index = FuzzyAliasIndex(alias_to_drug)
+    
+    def detect_drug_from_query(self, query: str):
+        """Detect drug name from user query dengan mapping ke nama FDA
+
+        Hasil diurutkan berdasarkan posisi kemunculan di query, lalu alias terpanjang.
+        """
+        matches = self.alias_matcher.find_all(query.lower())
+        
+        # Buang hit yang berada di dalam hit lain yang lebih panjang ("vitamin c" vs "c")
+        matches = [
+            m for m in matches
+            if not any(
+                other is not m
+                and other['start'] <= m['start'] and m['end'] <= other['end']
+                and (other['end'] - other['start']) > (m['end'] - m['start'])
+                for other in matches
+            )
+        ]
+        
+        detected_drugs = []
+        seen_drugs = set()
+        
+        for match in matches:
+            drug_name = match['drug_name']
+            if drug_name in seen_drugs:
+                continue
+            seen_drugs.add(drug_name)
+            
+            detected_drugs.append({
+                'drug_name': drug_name,
+                'fda_name': self.fda_name_mapping.get(drug_name, drug_name),
+                'alias_found': match['alias'],
+                'position': match['start'],
+                'confidence': 'high' if match['alias'] == drug_name else 'medium'
+            })
+        
+        detected_drugs.extend(self._detect_fuzzy(query.lower(), matches, seen_drugs))
+        detected_drugs.sort(key=lambda drug: drug['position'])
+        
+        return detected_drugs
+    
+    def _detect_fuzzy(self, query_lower: str, exact_matches, seen_drugs):
+        """Tahap kedua: cocokkan kata yang tidak tertangkap exact match dengan toleransi typo"""
+        covered = [(m['start'], m['end']) for m in exact_matches]
+        words = list(re.finditer(r'[a-z0-9]+', query_lower))
+        detected_drugs = []
+        
+        # Unigram dan bigram agar alias dua kata ("vitamin c") juga bisa dikenali
+        spans = [(w.start(), w.end()) for w in words]
+        spans += [(words[i].start(), words[i + 1].end()) for i in range(len(words) - 1)]
+        
+        for start, end in spans:
+            if any(start < c_end and c_start < end for c_start, c_end in covered):
+                continue
+            
+            term = query_lower[start:end]
+            if term.endswith('nya') and len(term) > 8:
+                term = term[:-3]
+            
+            for candidate in self.fuzzy_index.lookup(term):
+                drug_name = candidate['drug_name']
+                if drug_name in seen_drugs:
+                    break
+                seen_drugs.add(drug_name)
+                covered.append((start, end))
+                detected_drugs.append({
+                    'drug_name': drug_name,
+                    'fda_name': self.fda_name_mapping.get(drug_name, drug_name),
+                    'alias_found': candidate['alias'],
+                    'position': start,
+                    'confidence': 'low',
+                    'edit_distance': candidate['distance']
+                })
+                break
+        
+        return detected_drugs
+    
+    def get_all_available_drugs(self):
+        """Get list of all available drugs (nama yang dikenali user)"""
+        return list(self.drug_dictionary.keys())
+    
+    def get_fda_name(self, drug_name: str):
+        """Get FDA name untuk drug tertentu"""
+        return self.fda_name_mapping.get(drug_name, drug_name)
@@ -0,0 +1,112 @@
+"""Record obat ringkas berbasis __slots__ untuk app.py dan testchat.py
+
+Menggantikan dict per obat: field tetap (identifier di-intern), nilai kosong
+diwakili satu singleton MISSING, dan API mirip dict (get, [], in, keys) agar
+kode lama yang membaca drug_info tetap berjalan.
+"""
+import sys
+
+MISSING_TEXT = "Tidak tersedia"
+
+# Nilai pendek (sumber, rute, bentuk sediaan) sering berulang antar obat
+INTERN_MAX_CHARS = 40
+
+FIELDS = tuple(sys.intern(field) for field in (
+    'nama', 'nama_generik', 'merek_dagang', 'golongan', 'kategori', 'gejala',
+    'indikasi', 'dosis_dewasa', 'dosis_anak', 'dosis_maksimal', 'catatan_dosis',
+    'efek_samping', 'kontraindikasi', 'interaksi', 'peringatan',
+    'bentuk_sediaan', 'route_pemberian', 'kekuatan', 'sumber', 'catatan_fda'
+))
+FIELD_SET = frozenset(FIELDS)
+
+
+class _Missing(str):
+    """Singleton nilai kosong: sama dengan "Tidak tersedia" tetapi bernilai False"""
+    __slots__ = ()
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls, MISSING_TEXT)
+        return cls._instance
+
+    def __bool__(self):
+        return False
+
+    def __reduce__(self):
+        return (_Missing, ())
+
+    def __repr__(self):
+        return "MISSING"
+
+
+MISSING = _Missing()
+
+
+def _normalize(value):
+    if value is None or value is MISSING or value == MISSING_TEXT:
+        return MISSING
+    if isinstance(value, str) and len(value) <= INTERN_MAX_CHARS:
+        return sys.intern(value)
+    return value
+
+
+class DrugRecord:
+    """Satu obat dengan field tetap; record_id dipakai pesan chat sebagai referensi"""
+
+    __slots__ = ('record_id',) + FIELDS
+
+    def __init__(self, record_id: str = None, **values):
+        self.record_id = record_id
+        for field in FIELDS:
+            setattr(self, field, MISSING)
+        for field, value in values.items():
+            self[field] = value
+
+    @classmethod
+    def from_dict(cls, data, record_id: str = None):
+        """Buat record dari dict drug_info; key yang tidak dikenal diabaikan"""
+        if isinstance(data, cls):
+            return data
+        record = cls(record_id)
+        for field, value in data.items():
+            if field in FIELD_SET:
+                setattr(record, field, _normalize(value))
+        return record
+
+    def __getitem__(self, field):
+        if field not in FIELD_SET:
+            raise KeyError(field)
+        return getattr(self, field)
+
+    def __setitem__(self, field, value):
+        if field not in FIELD_SET:
+            raise KeyError(field)
+        setattr(self, field, _normalize(value))
+
+    def get(self, field, default=MISSING):
+        if field not in FIELD_SET:
+            return default
+        value = getattr(self, field)
+        return default if value is MISSING else value
+
+    def __contains__(self, field):
+        return field in FIELD_SET and getattr(self, field) is not MISSING
+
+    def keys(self):
+        return [field for field in FIELDS if getattr(self, field) is not MISSING]
+
+    def items(self):
+        return [(field, getattr(self, field)) for field in self.keys()]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def to_dict(self):
+        return dict(self.items())
+
+    def __repr__(self):
+        return f"DrugRecord({self.record_id!r}, nama={self.nama!r})"
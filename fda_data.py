@@ -0,0 +1,1663 @@
+"""Lapisan data openFDA untuk testchat.py, tanpa Streamlit
+
+Berisi cache SQLite, memori terjemahan, klien HTTP openFDA, parser label,
+store label lokal beserta ingest bulk, dan snapshot cache untuk deploy.
+Karena tidak mengimpor streamlit, modul ini aman dipakai worker
+ProcessPoolExecutor (fork maupun spawn) dan CLI:
+
+    python fda_data.py ingest drug-label-0001-of-0013.json.zip ...
+    python fda_data.py snapshot export|import [path]
+"""
+import collections
+import hashlib
+import io
+import json
+import os
+import random
+import re
+import sqlite3
+import sys
+import threading
+import time
+import zipfile
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from drug_detector import EnhancedDrugDetector
+from drug_record import DrugRecord
+from interaction_index import InteractionIndex
+
+# ===========================================
+# SQLITE
+# ===========================================
+def open_sqlite(path: str):
+    """Buka koneksi SQLite yang aman dipakai lintas thread dan proses"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+# ===========================================
+# PERSISTENT CACHE (SQLITE)
+# ===========================================
+CACHE_DB_PATH = os.environ.get("CHATOBAT_CACHE_DB", os.path.join(".cache", "chatobat.sqlite3"))
+LABEL_CACHE_TTL = int(os.environ.get("CHATOBAT_LABEL_TTL", 7 * 24 * 3600))
+DRUG_CACHE_TTL = int(os.environ.get("CHATOBAT_DRUG_TTL", 7 * 24 * 3600))
+
+class PersistentDrugCache:
+    """Cache on-disk untuk label mentah FDA dan drug_info yang sudah diterjemahkan.
+
+    Setiap entri menyimpan versi label (set_id + effective_time) sehingga entri
+    yang kedaluwarsa bisa divalidasi ulang tanpa menerjemahkan ulang jika label
+    FDA-nya belum berubah.
+    """
+
+    def __init__(self, path: str = CACHE_DB_PATH, label_ttl: int = LABEL_CACHE_TTL, drug_ttl: int = DRUG_CACHE_TTL):
+        self.path = path
+        self.label_ttl = label_ttl
+        self.drug_ttl = drug_ttl
+        self._lock = threading.Lock()
+        self._stats = {
+            'label_hits': 0,
+            'label_misses': 0,
+            'label_stale': 0,
+            'drug_hits': 0,
+            'drug_misses': 0,
+            'drug_stale': 0,
+            'revalidated': 0,
+            'refreshed': 0
+        }
+
+        try:
+            self._conn = open_sqlite(path)
+            self._create_tables()
+            self.available = True
+        except Exception as e:
+            print(f"Persistent cache error: {e}")
+            self._conn = None
+            self.available = False
+
+    def _create_tables(self):
+        """Buat tabel cache jika belum ada"""
+        with self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS fda_labels (
+                    query TEXT PRIMARY KEY,
+                    set_id TEXT,
+                    effective_time TEXT,
+                    raw_json TEXT NOT NULL,
+                    fetched_at REAL NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS drug_info (
+                    drug_key TEXT PRIMARY KEY,
+                    set_id TEXT,
+                    effective_time TEXT,
+                    info_json TEXT NOT NULL,
+                    stored_at REAL NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+            """)
+
+    def _count(self, name: str):
+        with self._lock:
+            self._stats[name] += 1
+
+    def get_label(self, query: str):
+        """Ambil label mentah; hasil berisi flag 'fresh' agar caller bisa revalidasi"""
+        if not self.available:
+            return None
+
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT raw_json, set_id, effective_time, expires_at FROM fda_labels WHERE query = ?",
+                (query,)
+            ).fetchone()
+
+        if not row:
+            self._count('label_misses')
+            return None
+
+        fresh = row[3] > time.time()
+        self._count('label_hits' if fresh else 'label_stale')
+        return {
+            'label': json.loads(row[0]),
+            'set_id': row[1],
+            'effective_time': row[2],
+            'fresh': fresh
+        }
+
+    def put_label(self, query: str, label: dict):
+        """Simpan label mentah FDA beserta versinya"""
+        if not self.available:
+            return
+
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO fda_labels VALUES (?, ?, ?, ?, ?, ?)",
+                (query, label.get('set_id'), label.get('effective_time'),
+                 json.dumps(label, ensure_ascii=False), now, now + self.label_ttl)
+            )
+
+    def touch_label(self, query: str):
+        """Perpanjang TTL label yang sudah divalidasi ulang dan tidak berubah"""
+        if not self.available:
+            return
+
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE fda_labels SET fetched_at = ?, expires_at = ? WHERE query = ?",
+                (now, now + self.label_ttl, query)
+            )
+            self._stats['revalidated'] += 1
+
+    def get_drug(self, drug_key: str, count_stats: bool = True):
+        """Ambil drug_info yang sudah diparse dan diterjemahkan
+
+        count_stats=False untuk pembacaan tampilan (render ulang kartu sumber)
+        agar hit/miss hanya mencerminkan lookup pertanyaan.
+        """
+        if not self.available:
+            return None
+
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT info_json, set_id, effective_time, expires_at FROM drug_info WHERE drug_key = ?",
+                (drug_key,)
+            ).fetchone()
+
+        if not row:
+            if count_stats:
+                self._count('drug_misses')
+            return None
+
+        fresh = row[3] > time.time()
+        if count_stats:
+            self._count('drug_hits' if fresh else 'drug_stale')
+        return {
+            'drug_info': DrugRecord.from_dict(json.loads(row[0]), record_id=drug_key),
+            'set_id': row[1],
+            'effective_time': row[2],
+            'fresh': fresh
+        }
+
+    def put_drug(self, drug_key: str, drug_info: dict, set_id=None, effective_time=None):
+        """Simpan drug_info hasil terjemahan beserta versi label sumbernya"""
+        if not self.available:
+            return
+
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO drug_info VALUES (?, ?, ?, ?, ?, ?)",
+                (drug_key, set_id, effective_time,
+                 json.dumps(dict(drug_info), ensure_ascii=False), now, now + self.drug_ttl)
+            )
+            self._stats['refreshed'] += 1
+
+    def touch_drug(self, drug_key: str):
+        """Perpanjang TTL drug_info jika versi labelnya masih sama"""
+        if not self.available:
+            return
+
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE drug_info SET stored_at = ?, expires_at = ? WHERE drug_key = ?",
+                (now, now + self.drug_ttl, drug_key)
+            )
+
+    def export_drugs(self):
+        """Semua drug_info untuk snapshot: [drug_key, set_id, effective_time, info, stored_at]"""
+        if not self.available:
+            return []
+
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT drug_key, set_id, effective_time, info_json, stored_at FROM drug_info"
+            ).fetchall()
+        return [[key, set_id, effective_time, json.loads(info_json), stored_at]
+                for key, set_id, effective_time, info_json, stored_at in rows]
+
+    def import_drugs(self, rows):
+        """Gabungkan drug_info dari snapshot; entri lokal yang lebih baru tidak ditimpa
+
+        Return drug_key yang benar-benar disimpan. Umur entri mengikuti stored_at
+        aslinya sehingga entri lama tetap divalidasi ulang seperti biasa.
+        """
+        if not self.available:
+            return []
+
+        imported = []
+        with self._lock, self._conn:
+            for drug_key, set_id, effective_time, info, stored_at in rows:
+                cursor = self._conn.execute(
+                    "INSERT INTO drug_info VALUES (?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT(drug_key) DO UPDATE SET set_id = excluded.set_id, "
+                    "effective_time = excluded.effective_time, info_json = excluded.info_json, "
+                    "stored_at = excluded.stored_at, expires_at = excluded.expires_at "
+                    "WHERE excluded.stored_at > drug_info.stored_at",
+                    (drug_key, set_id, effective_time, json.dumps(info, ensure_ascii=False),
+                     stored_at, stored_at + self.drug_ttl)
+                )
+                if cursor.rowcount:
+                    imported.append(drug_key)
+        return imported
+
+    def get_stats(self):
+        """Statistik hit/miss dan jumlah entri cache"""
+        stats = {'available': self.available, 'path': self.path}
+        with self._lock:
+            stats.update(self._stats)
+            if self.available:
+                stats['label_entries'] = self._conn.execute("SELECT COUNT(*) FROM fda_labels").fetchone()[0]
+                stats['drug_entries'] = self._conn.execute("SELECT COUNT(*) FROM drug_info").fetchone()[0]
+        return stats
+
+# ===========================================
+# TRANSLATION MEMORY
+# ===========================================
+TRANSLATION_MODEL = 'gemini-2.5-flash-lite'
+# Versi per prompt (satu field vs batch JSON); naikkan versi prompt yang aturannya
+# berubah agar hanya memori hasil prompt tersebut yang tidak dipakai lagi
+SINGLE_PROMPT_VERSION = 'single-v1'
+BATCH_PROMPT_VERSION = 'batch-v1'
+TRANSLATION_PROMPT_VERSIONS = (SINGLE_PROMPT_VERSION, BATCH_PROMPT_VERSION)
+# Update last_used hasil disk hit ditulis per batch, bukan satu transaksi per hit
+TOUCH_FLUSH_ENTRIES = 256
+TOUCH_FLUSH_SECONDS = 30
+TRANSLATION_MEMORY_MAX_ENTRIES = int(os.environ.get("CHATOBAT_TM_MAX_ENTRIES", 50000))
+
+class TranslationMemory:
+    """Memori terjemahan on-disk yang dibagi antar proses, di-key dengan hash konten.
+
+    Key = sha256(model, versi prompt, teks sumber), jadi teks identik dari obat
+    mana pun hanya diterjemahkan sekali per prompt. Entri paling lama tidak
+    dipakai dihapus saat jumlahnya melewati batas (LRU).
+    """
+
+    def __init__(self, path: str = CACHE_DB_PATH, max_entries: int = TRANSLATION_MEMORY_MAX_ENTRIES,
+                 memory_entries: int = 5000):
+        self.path = path
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+        self._memory = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._touches = {}
+        self._last_flush = time.monotonic()
+        self._entries = 0
+        self._stats = {
+            'lookups': 0,
+            'memory_hits': 0,
+            'disk_hits': 0,
+            'misses': 0,
+            'stores': 0,
+            'evictions': 0
+        }
+
+        try:
+            self._conn = open_sqlite(path)
+            with self._conn:
+                self._conn.execute("""
+                    CREATE TABLE IF NOT EXISTS translation_memory (
+                        key TEXT PRIMARY KEY,
+                        source TEXT NOT NULL,
+                        translation TEXT NOT NULL,
+                        model TEXT NOT NULL,
+                        prompt_version TEXT NOT NULL,
+                        created_at REAL NOT NULL,
+                        last_used REAL NOT NULL,
+                        hits INTEGER NOT NULL DEFAULT 0
+                    )
+                """)
+                self._conn.execute(
+                    "CREATE INDEX IF NOT EXISTS idx_translation_memory_last_used ON translation_memory (last_used)"
+                )
+            # Jumlah entri dihitung sekali; selanjutnya dilacak di proses
+            self._entries = self._conn.execute("SELECT COUNT(*) FROM translation_memory").fetchone()[0]
+            self.available = True
+        except Exception as e:
+            print(f"Translation memory error: {e}")
+            self._conn = None
+            self.available = False
+
+    @staticmethod
+    def make_key(text: str, prompt_version: str, model: str = TRANSLATION_MODEL):
+        return hashlib.sha256(f"{model}\0{prompt_version}\0{text}".encode('utf-8')).hexdigest()
+
+    def _remember(self, key: str, translation: str):
+        """Simpan di memori proses (LRU kecil) untuk exact-match tercepat"""
+        self._memory[key] = translation
+        self._memory.move_to_end(key)
+        if len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, text: str, prompt_version: str):
+        """Ambil terjemahan yang sudah pernah dibuat dengan prompt tersebut, None jika belum ada"""
+        key = self.make_key(text, prompt_version)
+
+        with self._lock:
+            self._stats['lookups'] += 1
+
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self._stats['memory_hits'] += 1
+                return self._memory[key]
+
+            if not self.available:
+                self._stats['misses'] += 1
+                return None
+
+            row = self._conn.execute(
+                "SELECT translation FROM translation_memory WHERE key = ?", (key,)
+            ).fetchone()
+
+            if not row:
+                self._stats['misses'] += 1
+                return None
+
+            self._stats['disk_hits'] += 1
+            self._remember(key, row[0])
+            self._touch(key)
+            return row[0]
+
+    def _touch(self, key: str):
+        """Catat disk hit; last_used ditulis per batch (dipanggil di dalam lock)"""
+        self._touches[key] = self._touches.get(key, 0) + 1
+        if len(self._touches) >= TOUCH_FLUSH_ENTRIES or time.monotonic() - self._last_flush >= TOUCH_FLUSH_SECONDS:
+            self._flush_touches()
+
+    def _flush_touches(self):
+        self._last_flush = time.monotonic()
+        if not self._touches:
+            return
+
+        now = time.time()
+        with self._conn:
+            self._conn.executemany(
+                "UPDATE translation_memory SET last_used = ?, hits = hits + ? WHERE key = ?",
+                [(now, hits, key) for key, hits in self._touches.items()]
+            )
+        self._touches.clear()
+
+    def flush(self):
+        """Tulis update last_used yang masih tertunda"""
+        with self._lock:
+            if self.available:
+                self._flush_touches()
+
+    def put(self, text: str, translation: str, prompt_version: str):
+        """Simpan hasil terjemahan; evict entri LRU jika melewati batas"""
+        key = self.make_key(text, prompt_version)
+
+        with self._lock:
+            self._remember(key, translation)
+            self._stats['stores'] += 1
+
+            if not self.available:
+                return
+
+            now = time.time()
+            with self._conn:
+                inserted = self._conn.execute(
+                    "INSERT OR IGNORE INTO translation_memory VALUES (?, ?, ?, ?, ?, ?, ?, 0)",
+                    (key, text, translation, TRANSLATION_MODEL, prompt_version, now, now)
+                ).rowcount
+                if inserted:
+                    self._entries += 1
+                else:
+                    self._conn.execute(
+                        "UPDATE translation_memory SET translation = ?, last_used = ? WHERE key = ?",
+                        (translation, now, key)
+                    )
+
+                self._evict_excess()
+
+    def _evict_excess(self):
+        """Hapus entri LRU di disk jika melewati batas (dipanggil di dalam lock dan transaksi)"""
+        if self._entries <= self.max_entries:
+            return
+
+        # Proses lain bisa ikut menulis: hitung ulang hanya saat batas tampak terlewati
+        self._flush_touches()
+        self._entries = self._conn.execute("SELECT COUNT(*) FROM translation_memory").fetchone()[0]
+        if self._entries > self.max_entries:
+            # Evict 10% sekaligus agar tidak menghapus satu per satu di setiap put
+            excess = self._entries - self.max_entries + max(1, self.max_entries // 10)
+            deleted = self._conn.execute(
+                "DELETE FROM translation_memory WHERE key IN "
+                "(SELECT key FROM translation_memory ORDER BY last_used ASC LIMIT ?)",
+                (excess,)
+            ).rowcount
+            self._entries -= deleted
+            self._stats['evictions'] += deleted
+
+    def export_entries(self):
+        """Entri untuk model dan versi prompt saat ini, terbaru dipakai lebih dulu"""
+        if not self.available:
+            return []
+
+        placeholders = ", ".join("?" for _ in TRANSLATION_PROMPT_VERSIONS)
+        with self._lock:
+            self._flush_touches()
+            rows = self._conn.execute(
+                "SELECT key, source, translation, prompt_version, created_at, last_used FROM translation_memory "
+                f"WHERE model = ? AND prompt_version IN ({placeholders}) ORDER BY last_used DESC LIMIT ?",
+                (TRANSLATION_MODEL, *TRANSLATION_PROMPT_VERSIONS, self.max_entries)
+            ).fetchall()
+        return [list(row) for row in rows]
+
+    def import_entries(self, rows, model: str = TRANSLATION_MODEL):
+        """Tambahkan entri dari snapshot; key yang sudah ada tidak diubah"""
+        if not self.available or model != TRANSLATION_MODEL:
+            return 0
+
+        # Terjemahan dari prompt lain tidak akan pernah cocok dengan key saat ini
+        rows = [
+            (key, source, translation, model, prompt_version, created_at, last_used)
+            for key, source, translation, prompt_version, created_at, last_used in rows
+            if prompt_version in TRANSLATION_PROMPT_VERSIONS
+        ]
+        with self._lock, self._conn:
+            before = self._conn.total_changes
+            self._conn.executemany("INSERT OR IGNORE INTO translation_memory VALUES (?, ?, ?, ?, ?, ?, ?, 0)", rows)
+            imported = self._conn.total_changes - before
+            self._entries += imported
+            self._evict_excess()
+        return imported
+
+    def get_stats(self):
+        """Statistik reuse terjemahan"""
+        with self._lock:
+            stats = dict(self._stats)
+            if self.available:
+                stats['entries'] = self._entries
+                stats['pending_touches'] = len(self._touches)
+
+        hits = stats['memory_hits'] + stats['disk_hits']
+        stats['reuse_rate'] = round(hits / stats['lookups'], 3) if stats['lookups'] else 0.0
+        return stats
+
+# ===========================================
+# HTTP CLIENT OPENFDA
+# ===========================================
+class OpenFDAError(Exception):
+    """openFDA gagal merespons setelah semua percobaan ulang"""
+
+class CircuitOpenError(OpenFDAError):
+    """Circuit breaker terbuka: request ditolak tanpa menghubungi openFDA"""
+
+class CircuitBreaker:
+    """Circuit breaker sederhana: closed -> open -> half_open -> closed"""
+
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.times_opened = 0
+        self._lock = threading.Lock()
+
+    def allow_request(self):
+        """Cek apakah request boleh dikirim; di half_open hanya satu request percobaan"""
+        with self._lock:
+            if self.state == 'closed':
+                return True
+
+            if self.state == 'open' and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = 'half_open'
+                return True
+
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = 'closed'
+            self.consecutive_failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.state == 'half_open' or self.consecutive_failures >= self.failure_threshold:
+                if self.state != 'open':
+                    self.times_opened += 1
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                'state': self.state,
+                'consecutive_failures': self.consecutive_failures,
+                'times_opened': self.times_opened
+            }
+
+class OpenFDAClient:
+    """Client HTTP bersama untuk openFDA dengan connection pool, retry dan circuit breaker"""
+
+    RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+    def __init__(self, base_url: str, pool_size: int = 10, max_retries: int = 3,
+                 backoff_base: float = 0.5, backoff_max: float = 8.0,
+                 connect_timeout: float = 3.05, read_timeout: float = 10.0,
+                 breaker: CircuitBreaker = None):
+        self.base_url = base_url
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = (connect_timeout, read_timeout)
+        self.breaker = breaker or CircuitBreaker()
+
+        self.pool_size = pool_size
+        self._session = None
+
+        self._lock = threading.Lock()
+        self._latencies = collections.deque(maxlen=200)
+        self._stats = {
+            'requests': 0,
+            'retries': 0,
+            'failures': 0,
+            'client_errors': 0,
+            'short_circuited': 0
+        }
+
+    @property
+    def session(self):
+        """Session dibuat (dan requests diimpor) saat request pertama, bukan saat startup"""
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    import requests
+                    from requests.adapters import HTTPAdapter
+
+                    # Session + adapter menjaga koneksi keep-alive; pool_block membatasi jumlah koneksi
+                    session = requests.Session()
+                    adapter = HTTPAdapter(
+                        pool_connections=1,
+                        pool_maxsize=self.pool_size,
+                        pool_block=True,
+                        max_retries=0
+                    )
+                    session.mount("https://", adapter)
+                    self._session = session
+        return self._session
+
+    def get_json(self, params: dict, deadline: float = 20.0):
+        """GET ke openFDA; None jika tidak ada hasil (404), OpenFDAError jika upstream gagal"""
+        import requests
+
+        if not self.breaker.allow_request():
+            with self._lock:
+                self._stats['short_circuited'] += 1
+            raise CircuitOpenError("openFDA sedang tidak dapat diakses")
+
+        started = time.monotonic()
+        last_error = None
+
+        for attempt in range(self.max_retries + 1):
+            retry_after = None
+            request_started = time.monotonic()
+
+            try:
+                response = self.session.get(self.base_url, params=params, timeout=self.timeout)
+                self._record_latency(time.monotonic() - request_started)
+
+                if response.status_code == 200:
+                    self.breaker.record_success()
+                    return response.json()
+
+                if response.status_code == 404:
+                    # openFDA mengembalikan 404 jika pencarian tidak menemukan label
+                    self.breaker.record_success()
+                    return None
+
+                last_error = OpenFDAError(f"HTTP {response.status_code}")
+                if response.status_code not in self.RETRY_STATUS_CODES:
+                    # 4xx lain (query salah, dsb.) berarti server sehat: jangan buka breaker
+                    self.breaker.record_success()
+                    with self._lock:
+                        self._stats['client_errors'] += 1
+                    raise last_error
+                retry_after = response.headers.get('Retry-After')
+
+            except requests.RequestException as e:
+                self._record_latency(time.monotonic() - request_started)
+                last_error = OpenFDAError(str(e))
+
+            if attempt == self.max_retries:
+                break
+
+            delay = self._backoff_delay(attempt, retry_after)
+            if time.monotonic() - started + delay > deadline:
+                break
+
+            with self._lock:
+                self._stats['retries'] += 1
+            time.sleep(delay)
+
+        with self._lock:
+            self._stats['failures'] += 1
+        self.breaker.record_failure()
+        raise last_error
+
+    def _backoff_delay(self, attempt: int, retry_after=None):
+        """Exponential backoff dengan full jitter, menghormati header Retry-After"""
+        cap = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        if retry_after:
+            try:
+                return min(float(retry_after), self.backoff_max)
+            except ValueError:
+                pass
+        return random.uniform(0, cap)
+
+    def _record_latency(self, seconds: float):
+        with self._lock:
+            self._stats['requests'] += 1
+            self._latencies.append(seconds)
+
+    def get_stats(self):
+        """Statistik latensi dan status breaker untuk monitoring"""
+        with self._lock:
+            stats = dict(self._stats)
+            latencies = sorted(self._latencies)
+
+        if latencies:
+            stats['latency_avg_ms'] = round(sum(latencies) / len(latencies) * 1000, 1)
+            stats['latency_p50_ms'] = round(latencies[len(latencies) // 2] * 1000, 1)
+            stats['latency_p95_ms'] = round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000, 1)
+
+        stats['breaker'] = self.breaker.get_stats()
+        return stats
+
+# ===========================================
+# OFFLINE LABEL STORE (BULK OPENFDA)
+# ===========================================
+LABEL_STORE_PATH = os.environ.get("CHATOBAT_LABEL_STORE", os.path.join(".cache", "openfda_labels.sqlite3"))
+FDA_LIVE_FALLBACK = os.environ.get("CHATOBAT_FDA_LIVE_FALLBACK", "1") != "0"
+
+# Hanya field yang dipakai parser yang disimpan, sisanya dibuang agar store tetap kecil
+COMPACT_LABEL_FIELDS = [
+    'set_id', 'effective_time', 'indications_and_usage', 'purpose', 'description',
+    'dosage_and_administration', 'adverse_reactions', 'contraindications',
+    'drug_interactions', 'warnings', 'drug_class'
+]
+COMPACT_OPENFDA_FIELDS = ['generic_name', 'brand_name', 'dosage_form', 'route', 'product_ndc']
+
+def compact_label(label: dict):
+    """Ambil subset label FDA yang dibutuhkan _parse_fda_data_with_dosage_fallback"""
+    compact = {field: label[field] for field in COMPACT_LABEL_FIELDS if field in label}
+    openfda = label.get('openfda', {})
+    compact['openfda'] = {field: openfda[field] for field in COMPACT_OPENFDA_FIELDS if field in openfda}
+    return compact
+
+def iter_label_records(path: str, chunk_size: int = 1 << 20):
+    """Stream record dari file bulk openFDA (.json atau .zip) tanpa memuat seluruh file"""
+    if path.endswith('.zip'):
+        with zipfile.ZipFile(path) as archive:
+            for member in archive.namelist():
+                if member.endswith('.json'):
+                    with archive.open(member) as raw:
+                        yield from _iter_results_array(io.TextIOWrapper(raw, encoding='utf-8'), chunk_size)
+    else:
+        with open(path, 'r', encoding='utf-8') as stream:
+            yield from _iter_results_array(stream, chunk_size)
+
+def _iter_results_array(stream, chunk_size: int):
+    """Decode elemen array "results" satu per satu dari stream teks"""
+    decoder = json.JSONDecoder()
+    buffer = ""
+    eof = False
+
+    # Cari awal array "results" (meta juga punya key "results" tapi berupa objek)
+    results_start = re.compile(r'"results"\s*:\s*\[')
+    while True:
+        match = results_start.search(buffer)
+        if match:
+            buffer = buffer[match.end():]
+            break
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            return
+        # Sisakan ekor buffer agar pola yang terpotong antar chunk tetap ditemukan
+        buffer = buffer[-32:] + chunk
+
+    position = 0
+    while True:
+        while True:
+            while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                position += 1
+            if position < len(buffer) or eof:
+                break
+            buffer, position = stream.read(chunk_size), 0
+            eof = not buffer
+
+        if position >= len(buffer) or buffer[position] == ']':
+            return
+
+        try:
+            record, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            # Record belum lengkap di buffer: tambah chunk berikutnya lalu coba lagi
+            chunk = stream.read(chunk_size)
+            eof = not chunk
+            buffer, position = buffer[position:] + chunk, 0
+            continue
+
+        yield record
+        position = end
+
+class LocalLabelStore:
+    """Store lokal label FDA hasil ingest bulk, diindeks per nama generik, merek dan set_id"""
+
+    SOURCE = "Label FDA (store lokal hasil ingest bulk openFDA)"
+
+    def __init__(self, path: str = LABEL_STORE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = open_sqlite(path)
+        self._stats = {'hits': 0, 'misses': 0}
+        with self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS labels (
+                    set_id TEXT PRIMARY KEY,
+                    effective_time TEXT,
+                    generic_name TEXT,
+                    completeness INTEGER NOT NULL,
+                    label_blob BLOB NOT NULL,
+                    drug_info_json TEXT NOT NULL
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS label_names (
+                    name TEXT NOT NULL,
+                    kind TEXT NOT NULL,
+                    set_id TEXT NOT NULL,
+                    PRIMARY KEY (name, kind, set_id)
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS label_interactions (
+                    drug_a TEXT NOT NULL,
+                    drug_b TEXT NOT NULL,
+                    sentence TEXT NOT NULL,
+                    PRIMARY KEY (drug_a, drug_b, sentence)
+                )
+            """)
+
+    @classmethod
+    def open_if_exists(cls, path: str = LABEL_STORE_PATH):
+        """Buka store hanya jika sudah pernah di-ingest; None jika tidak ada"""
+        if not os.path.exists(path):
+            return None
+        try:
+            return cls(path)
+        except Exception as e:
+            print(f"Label store error: {e}")
+            return None
+
+    def put_many(self, entries):
+        """Simpan batch (label, drug_info, completeness) dalam satu transaksi"""
+        with self._lock, self._conn:
+            for label, drug_info, completeness in entries:
+                set_id = label.get('set_id')
+                if not set_id:
+                    continue
+
+                existing = self._conn.execute(
+                    "SELECT effective_time FROM labels WHERE set_id = ?", (set_id,)
+                ).fetchone()
+                if existing and (existing[0] or '') > (label.get('effective_time') or ''):
+                    continue
+
+                openfda = label.get('openfda', {})
+                generic_names = [name.lower() for name in openfda.get('generic_name', [])]
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO labels VALUES (?, ?, ?, ?, ?, ?)",
+                    (set_id, label.get('effective_time'), generic_names[0] if generic_names else None,
+                     completeness, zlib.compress(json.dumps(label, ensure_ascii=False).encode('utf-8')),
+                     json.dumps(drug_info, ensure_ascii=False))
+                )
+
+                self._conn.execute("DELETE FROM label_names WHERE set_id = ?", (set_id,))
+                names = [(name, 'generic', set_id) for name in generic_names]
+                names += [(name.lower(), 'brand', set_id) for name in openfda.get('brand_name', [])]
+                self._conn.executemany("INSERT OR IGNORE INTO label_names VALUES (?, ?, ?)", names)
+
+    def _find(self, name: str, columns: str):
+        with self._lock:
+            row = self._conn.execute(f"""
+                SELECT {columns} FROM labels
+                WHERE set_id IN (SELECT set_id FROM label_names WHERE name = ?)
+                ORDER BY completeness DESC, effective_time DESC
+                LIMIT 1
+            """, (name.lower(),)).fetchone()
+            self._stats['hits' if row else 'misses'] += 1
+        return row
+
+    def _stored_drug_info(self, drug_info_json: str):
+        drug_info = json.loads(drug_info_json)
+        drug_info['sumber'] = self.SOURCE
+        return drug_info
+
+    def get_entry(self, name: str):
+        """(label, drug_info, nama generik) dari baris yang sama; (None, None, None) jika tidak ada"""
+        row = self._find(name, "label_blob, drug_info_json, generic_name")
+        if not row:
+            return None, None, None
+        return json.loads(zlib.decompress(row[0])), self._stored_drug_info(row[1]), row[2]
+
+    def put_interactions(self, rows):
+        """Ganti seluruh pasangan interaksi (drug_a, drug_b, kalimat) hasil ingest"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM label_interactions")
+            self._conn.executemany("INSERT OR IGNORE INTO label_interactions VALUES (?, ?, ?)", rows)
+
+    def iter_interactions(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT drug_a, drug_b, sentence FROM label_interactions").fetchall()
+        return rows
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['labels'] = self._conn.execute("SELECT COUNT(*) FROM labels").fetchone()[0]
+            stats['interaction_rows'] = self._conn.execute("SELECT COUNT(*) FROM label_interactions").fetchone()[0]
+        stats['path'] = self.path
+        return stats
+
+def ingest_label_files(paths, store_path: str = LABEL_STORE_PATH, batch_size: int = 4096, workers: int = None):
+    """Ingest file bulk openFDA ke LocalLabelStore melalui parser FDADrugAPI yang sama"""
+    store = LocalLabelStore(store_path)
+    parser = FDADrugAPI()
+    # Pasangan interaksi dikumpulkan sekali saat ingest dari section drug_interactions
+    interactions = InteractionIndex(EnhancedDrugDetector().drug_dictionary)
+    total = 0
+    batch = []
+
+    # Satu process pool untuk seluruh ingest; worker dan parsernya dipakai ulang antar batch
+    workers = workers if workers is not None else (os.cpu_count() or 1)
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+
+    def flush(batch):
+        for label, generic_name in batch:
+            interactions.add_text(generic_name, " ".join(label.get('drug_interactions', [])), source=label.get('set_id'))
+
+        parsed = parser.parse_labels_batch(batch, executor=executor)
+        store.put_many(
+            (label, drug_info, completeness)
+            for (label, _), (drug_info, completeness) in zip(batch, parsed)
+        )
+        return len(batch)
+
+    try:
+        for path in paths:
+            for record in iter_label_records(path):
+                generic_names = record.get('openfda', {}).get('generic_name')
+                if not generic_names or not record.get('set_id'):
+                    continue
+
+                batch.append((compact_label(record), generic_names[0].lower()))
+
+                if len(batch) >= batch_size:
+                    total += flush(batch)
+                    batch = []
+                    print(f"Ingested {total} label...")
+
+        if batch:
+            total += flush(batch)
+    finally:
+        if executor:
+            executor.shutdown()
+
+    store.put_interactions(interactions.iter_pairs())
+    print(f"Selesai: {total} label disimpan di {store_path} ({interactions.get_stats()['pairs']} pasangan interaksi)")
+    return total
+
+# ===========================================
+# FDA API DENGAN PERBAIKAN EKSTRAKSI DOSIS
+# ===========================================
+class FDADrugAPI:
+    def __init__(self, label_cache: PersistentDrugCache = None, client: OpenFDAClient = None,
+                 label_store: LocalLabelStore = None, live_fallback: bool = True):
+        self.base_url = "https://api.fda.gov/drug/label.json"
+        self.label_cache = label_cache
+        self.client = client or OpenFDAClient(self.base_url)
+        # Store hasil ingest bulk dijawab lebih dulu; API live hanya sebagai fallback opsional
+        self.label_store = label_store
+        self.live_fallback = live_fallback
+
+        # Database fallback untuk dosis yang tidak lengkap di FDA
+        self.dosage_fallback_db = {
+            'acetaminophen': {
+                'dosis_dewasa': '500-1000 mg setiap 4-6 jam',
+                'dosis_maksimal': 'Maksimal 4000 mg per hari',
+                'dosis_anak': '10-15 mg/kgBB setiap 4-6 jam',
+                'catatan_dosis': 'Hati-hati pada pasien gangguan hati'
+            },
+            'paracetamol': {
+                'dosis_dewasa': '500-1000 mg setiap 4-6 jam',
+                'dosis_maksimal': 'Maksimal 4000 mg per hari',
+                'dosis_anak': '10-15 mg/kgBB setiap 4-6 jam',
+                'catatan_dosis': 'Hati-hati pada pasien gangguan hati'
+            },
+            'amoxicillin': {
+                'dosis_dewasa': '250-500 mg setiap 8 jam atau 875 mg setiap 12 jam',
+                'dosis_maksimal': 'Maksimal 3000 mg per hari',
+                'dosis_anak': '20-50 mg/kgBB/hari dibagi 3 dosis',
+                'catatan_dosis': 'Untuk infeksi bakteri'
+            },
+            'omeprazole': {
+                'dosis_dewasa': '20-40 mg sekali sehari sebelum makan',
+                'dosis_maksimal': 'Maksimal 40 mg per hari',
+                'dosis_anak': 'Tidak dianjurkan untuk anak <1 tahun',
+                'catatan_dosis': 'Untuk tukak lambung dan GERD'
+            },
+            'ibuprofen': {
+                'dosis_dewasa': '200-400 mg setiap 4-6 jam',
+                'dosis_maksimal': 'Maksimal 1200 mg per hari',
+                'dosis_anak': '5-10 mg/kgBB setiap 6-8 jam',
+                'catatan_dosis': 'Hati-hati pada gangguan lambung'
+            },
+            'albuterol': {
+                'dosis_dewasa': 'Inhalasi: 1-2 inhalasi setiap 4-6 jam',
+                'dosis_maksimal': 'Maksimal 8 inhalasi per hari',
+                'dosis_anak': 'Inhalasi: 1 inhalasi setiap 4-6 jam',
+                'catatan_dosis': 'Untuk asma dan bronkospasme'
+            },
+            'salbutamol': {
+                'dosis_dewasa': 'Inhalasi: 1-2 inhalasi setiap 4-6 jam',
+                'dosis_maksimal': 'Maksimal 8 inhalasi per hari',
+                'dosis_anak': 'Inhalasi: 1 inhalasi setiap 4-6 jam',
+                'catatan_dosis': 'Untuk asma dan bronkospasme'
+            },
+            'ascorbic acid': {
+                'dosis_dewasa': '500-1000 mg per hari',
+                'dosis_maksimal': 'Maksimal 2000 mg per hari',
+                'dosis_anak': 'Sesuai kebutuhan, konsultasi dokter',
+                'catatan_dosis': 'Suplemen vitamin C'
+            },
+            'vitamin c': {
+                'dosis_dewasa': '500-1000 mg per hari',
+                'dosis_maksimal': 'Maksimal 2000 mg per hari',
+                'dosis_anak': 'Sesuai kebutuhan, konsultasi dokter',
+                'catatan_dosis': 'Suplemen vitamin C'
+            },
+            'metformin': {
+                'dosis_dewasa': '500 mg 2x sehari (awal), dapat ditingkatkan',
+                'dosis_maksimal': 'Maksimal 2000 mg per hari',
+                'dosis_anak': 'Tidak dianjurkan untuk anak <10 tahun',
+                'catatan_dosis': 'Untuk diabetes tipe 2'
+            },
+            'atorvastatin': {
+                'dosis_dewasa': '10-80 mg sekali sehari',
+                'dosis_maksimal': 'Maksimal 80 mg per hari',
+                'dosis_anak': 'Tidak dianjurkan untuk anak',
+                'catatan_dosis': 'Untuk kolesterol tinggi'
+            },
+            'simvastatin': {
+                'dosis_dewasa': '10-40 mg sekali sehari',
+                'dosis_maksimal': 'Maksimal 40 mg per hari',
+                'dosis_anak': 'Tidak dianjurkan untuk anak',
+                'catatan_dosis': 'Untuk kolesterol tinggi'
+            },
+            'loratadine': {
+                'dosis_dewasa': '10 mg sekali sehari',
+                'dosis_maksimal': 'Maksimal 10 mg per hari',
+                'dosis_anak': '5 mg sekali sehari (usia 6-12 tahun)',
+                'catatan_dosis': 'Untuk alergi'
+            },
+            'aspirin': {
+                'dosis_dewasa': 'Nyeri: 325-650 mg setiap 4 jam',
+                'dosis_maksimal': 'Maksimal 4000 mg per hari',
+                'dosis_anak': 'Hindari pada anak <16 tahun',
+                'catatan_dosis': 'Hati-hati risiko perdarahan'
+            },
+            'lansoprazole': {
+                'dosis_dewasa': '15-30 mg sekali sehari',
+                'dosis_maksimal': 'Maksimal 30 mg per hari',
+                'dosis_anak': '0.5-1 mg/kgBB/hari',
+                'catatan_dosis': 'Untuk gangguan asam lambung'
+            },
+            'esomeprazole': {
+                'dosis_dewasa': '20-40 mg sekali sehari',
+                'dosis_maksimal': 'Maksimal 40 mg per hari',
+                'dosis_anak': 'Tidak dianjurkan untuk anak <1 tahun',
+                'catatan_dosis': 'Untuk tukak lambung'
+            },
+            'cetirizine': {
+                'dosis_dewasa': '5-10 mg sekali sehari',
+                'dosis_maksimal': 'Maksimal 10 mg per hari',
+                'dosis_anak': '2.5-5 mg sekali sehari',
+                'catatan_dosis': 'Untuk alergi'
+            },
+            'dextromethorphan': {
+                'dosis_dewasa': '10-20 mg setiap 4 jam',
+                'dosis_maksimal': 'Maksimal 120 mg per hari',
+                'dosis_anak': '2.5-10 mg setiap 4-6 jam',
+                'catatan_dosis': 'Untuk batuk kering'
+            }
+        }
+    
+    def get_fallback_drug_info(self, generic_name: str):
+        """Data minimal dari dosage_fallback_db saat FDA API tidak sehat"""
+        if generic_name.lower() not in self.dosage_fallback_db:
+            return None
+
+        drug_info = self._parse_fda_data_with_dosage_fallback({}, generic_name)
+        drug_info['sumber'] = "Database dosis lokal (FDA API tidak dapat diakses)"
+        return drug_info
+
+    def get_label_entry(self, generic_name: str):
+        """(label, drug_info) — drug_info hanya terisi untuk label dari store lokal
+
+        drug_info store sudah diparse saat ingest dengan nama generik yang sama,
+        jadi caller tidak perlu memparse ulang label tersebut.
+        """
+        if self.label_store:
+            label, drug_info, stored_name = self.label_store.get_entry(generic_name)
+            if label:
+                return label, drug_info if stored_name == generic_name.lower() else None
+            if not self.live_fallback:
+                return None, None
+        elif not self.live_fallback:
+            return None, None
+
+        return self._get_live_label(generic_name), None
+
+    def _get_live_label(self, generic_name: str):
+        """Label dari cache on-disk (jika masih valid) atau openFDA"""
+        cache_key = generic_name.lower()
+        cached = self.label_cache.get_label(cache_key) if self.label_cache else None
+
+        if cached and cached['fresh']:
+            return cached['label']
+
+        try:
+            if cached and cached['set_id']:
+                # Entri kedaluwarsa: cek apakah label FDA berubah sejak terakhir diambil
+                current = self._fetch_label_by_set_id(cached['set_id'])
+                if current and current.get('effective_time') == cached['effective_time']:
+                    self.label_cache.touch_label(cache_key)
+                    return cached['label']
+                if current:
+                    self.label_cache.put_label(cache_key, current)
+                    return current
+
+            label = self._fetch_label(generic_name)
+        except OpenFDAError:
+            # FDA tidak bisa diakses: lebih baik sajikan data lama daripada kosong
+            if cached:
+                return cached['label']
+            raise
+
+        if label and self.label_cache:
+            self.label_cache.put_label(cache_key, label)
+
+        return label
+
+    def get_label_version(self, label: dict):
+        """Versi label FDA: (set_id, effective_time)"""
+        if not label:
+            return None, None
+        return label.get('set_id'), label.get('effective_time')
+
+    def get_health(self):
+        """Status circuit breaker dan latensi openFDA"""
+        return self.client.get_stats()
+
+    def _fetch_label(self, generic_name: str):
+        """Ambil label terbaik langsung dari FDA API"""
+        params = {
+            'search': f'openfda.generic_name:"{generic_name}"',
+            'limit': 5
+        }
+
+        data = self.client.get_json(params)
+
+        if data and data.get('results'):
+            best_result = None
+            max_field_count = 0
+
+            for result in data['results']:
+                field_count = self._count_complete_fields(result)
+                if field_count > max_field_count:
+                    max_field_count = field_count
+                    best_result = result
+
+            if best_result:
+                return best_result
+
+            return data['results'][0]
+
+        return self._try_alternative_search(generic_name)
+
+    def _fetch_label_by_set_id(self, set_id: str):
+        """Ambil versi terbaru sebuah label berdasarkan set_id (untuk revalidasi)"""
+        params = {
+            'search': f'set_id:"{set_id}"',
+            'limit': 1
+        }
+
+        data = self.client.get_json(params)
+        if data and data.get('results'):
+            return data['results'][0]
+
+        return None
+
+    def _count_complete_fields(self, fda_data: dict):
+        """Hitung jumlah field yang memiliki data"""
+        important_fields = [
+            'indications_and_usage',
+            'dosage_and_administration', 
+            'adverse_reactions',
+            'contraindications',
+            'drug_interactions',
+            'warnings'
+        ]
+        
+        count = 0
+        for field in important_fields:
+            if field in fda_data and fda_data[field]:
+                value = fda_data[field]
+                if isinstance(value, list) and value:
+                    if value[0] and value[0].strip():
+                        count += 1
+                elif value and value.strip():
+                    count += 1
+        
+        return count
+    
+    def _try_alternative_search(self, generic_name: str):
+        """Coba pencarian alternatif jika data tidak ditemukan"""
+        params = {
+            'search': f'_exists_:openfda.generic_name AND {generic_name}',
+            'limit': 3
+        }
+
+        data = self.client.get_json(params)
+        if data and data.get('results'):
+            return data['results'][0]
+
+        return None
+    
+    def _parse_fda_data_with_dosage_fallback(self, fda_data: dict, generic_name: str):
+        """Parse data FDA dengan fallback untuk dosis yang tidak lengkap"""
+        openfda = fda_data.get('openfda', {})
+        
+        # Gunakan nama Indonesia untuk obat tertentu
+        display_name = generic_name.title()
+        if 'acetaminophen' in generic_name.lower():
+            display_name = 'Paracetamol'
+        elif 'albuterol' in generic_name.lower():
+            display_name = 'Salbutamol'
+        elif 'ascorbic acid' in generic_name.lower():
+            display_name = 'Vitamin C'
+        
+        # Ekstrak informasi dengan method yang diperbaiki
+        indications = self._extract_indications(fda_data)
+        
+        # Dapatkan informasi dosis dengan fallback
+        dosage_info = self._get_detailed_dosage_info(fda_data, generic_name.lower())
+        
+        side_effects = self._extract_side_effects(fda_data)
+        contraindications = self._extract_contraindications(fda_data)
+        interactions = self._extract_interactions(fda_data)
+        warnings = self._extract_warnings(fda_data)
+        
+        # Tambahkan strengths dari openfda jika ada
+        strengths = []
+        if 'product_ndc' in openfda:
+            strengths = openfda.get('product_ndc', [])
+        
+        drug_info = {
+            "nama": display_name,
+            "nama_generik": display_name,
+            "merek_dagang": ", ".join(openfda.get('brand_name', ['Tidak tersedia']))[:200],
+            "golongan": self._get_field(fda_data, 'drug_class', "Tidak tersedia")[:100],
+            "indikasi": indications[:500] if indications != "Tidak tersedia" else "Tidak tersedia",
+            "dosis_dewasa": dosage_info.get('dosis_dewasa', 'Tidak tersedia')[:300],
+            "dosis_anak": dosage_info.get('dosis_anak', 'Tidak tersedia')[:300],
+            "dosis_maksimal": dosage_info.get('dosis_maksimal', 'Tidak tersedia')[:200],
+            "catatan_dosis": dosage_info.get('catatan_dosis', 'Tidak tersedia')[:200],
+            "efek_samping": side_effects[:500] if side_effects != "Tidak tersedia" else "Tidak tersedia",
+            "kontraindikasi": contraindications[:500] if contraindications != "Tidak tersedia" else "Tidak tersedia",
+            "interaksi": interactions[:500] if interactions != "Tidak tersedia" else "Tidak tersedia",
+            "peringatan": warnings[:500] if warnings != "Tidak tersedia" else "Tidak tersedia",
+            "bentuk_sediaan": ", ".join(openfda.get('dosage_form', ['Tidak tersedia']))[:100],
+            "route_pemberian": ", ".join(openfda.get('route', ['Tidak tersedia']))[:100],
+            "kekuatan": ", ".join(strengths[:3]) if strengths else "Tidak tersedia",
+            "sumber": "FDA API"
+        }
+        
+        # Tambahkan catatan untuk nama FDA yang berbeda
+        if generic_name.lower() in ['acetaminophen', 'albuterol', 'ascorbic acid']:
+            drug_info['catatan_fda'] = f"Di FDA dikenal sebagai {generic_name}"
+        
+        return drug_info
+    
+    def _get_field(self, fda_data: dict, field_name: str, default: str = "Tidak tersedia"):
+        """Helper untuk mendapatkan field dengan handling yang lebih baik"""
+        if field_name not in fda_data:
+            return default
+        
+        value = fda_data[field_name]
+        if isinstance(value, list):
+            if value:
+                return ' '.join([str(v) for v in value if v])[:300]
+            return default
+        elif value:
+            return str(value)[:300]
+        
+        return default
+    
+    def _extract_indications(self, fda_data: dict):
+        """Ekstrak informasi indikasi"""
+        fields_to_check = [
+            'indications_and_usage',
+            'purpose',
+            'description'
+        ]
+        
+        for field in fields_to_check:
+            if field in fda_data and fda_data[field]:
+                value = fda_data[field]
+                if isinstance(value, list) and value:
+                    return value[0][:500]
+                elif value:
+                    return str(value)[:500]
+        
+        return "Tidak tersedia"
+    
+    def _extract_side_effects(self, fda_data: dict):
+        """Ekstrak informasi efek samping"""
+        if 'adverse_reactions' in fda_data and fda_data['adverse_reactions']:
+            value = fda_data['adverse_reactions']
+            if isinstance(value, list) and value:
+                return value[0][:500]
+            elif value:
+                return str(value)[:500]
+        
+        return "Tidak tersedia"
+    
+    def _extract_contraindications(self, fda_data: dict):
+        """Ekstrak informasi kontraindikasi"""
+        if 'contraindications' in fda_data and fda_data['contraindications']:
+            value = fda_data['contraindications']
+            if isinstance(value, list) and value:
+                return value[0][:500]
+            elif value:
+                return str(value)[:500]
+        
+        return "Tidak tersedia"
+    
+    def _extract_interactions(self, fda_data: dict):
+        """Ekstrak informasi interaksi"""
+        if 'drug_interactions' in fda_data and fda_data['drug_interactions']:
+            value = fda_data['drug_interactions']
+            if isinstance(value, list) and value:
+                return value[0][:500]
+            elif value:
+                return str(value)[:500]
+        
+        return "Tidak tersedia"
+    
+    def _extract_warnings(self, fda_data: dict):
+        """Ekstrak informasi peringatan"""
+        if 'warnings' in fda_data and fda_data['warnings']:
+            value = fda_data['warnings']
+            if isinstance(value, list) and value:
+                return value[0][:500]
+            elif value:
+                return str(value)[:500]
+        
+        return "Tidak tersedia"
+    
+    def _get_detailed_dosage_info(self, fda_data: dict, drug_name: str):
+        """Dapatkan informasi dosis detail dengan fallback"""
+        result = {
+            'dosis_dewasa': 'Tidak tersedia',
+            'dosis_anak': 'Tidak tersedia',
+            'dosis_maksimal': 'Tidak tersedia',
+            'catatan_dosis': 'Tidak tersedia'
+        }
+        
+        # Coba ekstrak dari FDA data pertama
+        fda_dosage = self._extract_detailed_dosage_from_fda(fda_data)
+        
+        if fda_dosage['dosis_dewasa'] != 'Tidak tersedia':
+            # Jika FDA punya data, gunakan itu
+            return fda_dosage
+        else:
+            # Jika FDA tidak punya data, gunakan fallback database
+            if drug_name in self.dosage_fallback_db:
+                return self.dosage_fallback_db[drug_name]
+        
+        return result
+    
+    def _extract_detailed_dosage_from_fda(self, fda_data: dict):
+        """Ekstrak informasi dosis detail dari data FDA"""
+        result = {
+            'dosis_dewasa': 'Tidak tersedia',
+            'dosis_anak': 'Tidak tersedia',
+            'dosis_maksimal': 'Tidak tersedia',
+            'catatan_dosis': 'Tidak tersedia'
+        }
+        
+        # Cek field dosage_and_administration
+        if 'dosage_and_administration' in fda_data and fda_data['dosage_and_administration']:
+            dosage_text = fda_data['dosage_and_administration']
+            if isinstance(dosage_text, list) and dosage_text:
+                dosage_text = ' '.join([str(t) for t in dosage_text if t])
+            elif not isinstance(dosage_text, str):
+                dosage_text = str(dosage_text)
+            
+            # Analisis teks dosis
+            analyzed_dosage = self._analyze_dosage_text(dosage_text)
+            
+            # Update result dengan informasi yang ditemukan
+            for key in ['dosis_dewasa', 'dosis_anak', 'dosis_maksimal', 'catatan_dosis']:
+                if analyzed_dosage.get(key) and analyzed_dosage[key] != 'Tidak tersedia':
+                    result[key] = analyzed_dosage[key]
+        
+        return result
+    
+    def _analyze_dosage_text(self, text: str):
+        """Analisis teks dosis untuk ekstrak informasi spesifik"""
+        result = {
+            'dosis_dewasa': 'Tidak tersedia',
+            'dosis_anak': 'Tidak tersedia',
+            'dosis_maksimal': 'Tidak tersedia',
+            'catatan_dosis': 'Tidak tersedia'
+        }
+        
+        text_lower = text.lower()
+        
+        # Pola pencarian untuk dosis dewasa
+        adult_patterns = [
+            r'adult[s]?\s*dose[:\s]*([^\.]+)',
+            r'adult[s]?\s*:\s*([^\.]+)',
+            r'for adult[s]?\s*([^\.]+)',
+            r'recommended dose\s*([^\.]+)',
+            r'usual dose\s*([^\.]+)',
+            r'(\d+\s*-\s*\d+\s*mg.*?(?:per|every|daily))',
+            r'(\d+\s*mg.*?(?:per|every|daily))'
+        ]
+        
+        # Cari dosis dewasa
+        for pattern in adult_patterns:
+            matches = re.findall(pattern, text_lower)
+            if matches:
+                result['dosis_dewasa'] = self._clean_dosage_text(matches[0])
+                break
+        
+        # Pola pencarian untuk dosis anak
+        pediatric_patterns = [
+            r'pediatric[s]?\s*dose[:\s]*([^\.]+)',
+            r'children[s]?\s*dose[:\s]*([^\.]+)',
+            r'for children\s*([^\.]+)',
+            r'child dose\s*([^\.]+)',
+            r'(\d+\s*mg/kg.*?(?:per|every|daily))',
+            r'(\d+\s*-\s*\d+\s*mg/kg)'
+        ]
+        
+        # Cari dosis anak
+        for pattern in pediatric_patterns:
+            matches = re.findall(pattern, text_lower)
+            if matches:
+                result['dosis_anak'] = self._clean_dosage_text(matches[0])
+                break
+        
+        # Pola pencarian untuk dosis maksimal
+        max_patterns = [
+            r'maximum\s*dose[:\s]*([^\.]+)',
+            r'maximum\s*:\s*([^\.]+)',
+            r'maximum\s*([^\.]+)',
+            r'not exceed\s*([^\.]+)',
+            r'do not exceed\s*([^\.]+)',
+            r'max\s*(\d+\s*mg.*?per day)'
+        ]
+        
+        # Cari dosis maksimal
+        for pattern in max_patterns:
+            matches = re.findall(pattern, text_lower)
+            if matches:
+                result['dosis_maksimal'] = self._clean_dosage_text(matches[0])
+                break
+        
+        # Ekstrak catatan penting
+        warning_keywords = ['warning', 'caution', 'note', 'important', 'should', 'must']
+        sentences = text.split('.')
+        for sentence in sentences:
+            if any(keyword in sentence.lower() for keyword in warning_keywords):
+                if len(sentence.strip()) > 20:  # Hanya ambil kalimat yang bermakna
+                    result['catatan_dosis'] = sentence.strip()[:150]
+                    break
+        
+        return result
+    
+    def _clean_dosage_text(self, text: str):
+        """Bersihkan dan format teks dosis"""
+        # Hapus whitespace berlebih
+        text = ' '.join(text.split())
+        
+        # Capitalize huruf pertama
+        if text and len(text) > 0:
+            text = text[0].upper() + text[1:]
+        
+        # Batasi panjang teks
+        if len(text) > 150:
+            text = text[:147] + "..."
+        
+        return text
+
+    def parse_labels_batch(self, labels, executor: ProcessPoolExecutor = None, chunk_size: int = 256):
+        """Parse banyak label sekaligus; hasil (drug_info, completeness) urut sesuai input
+
+        labels berisi pasangan (label, generic_name). Jika executor (process pool milik
+        caller, dipakai ulang antar batch) diberikan, record dibagi per chunk dan tiap
+        chunk dikirim sebagai satu blob JSON. Ini menambah satu serialize/parse penuh
+        per label, jadi hanya sepadan jika parsing dibagi ke beberapa core.
+        Output identik dengan jalur tunggal.
+        """
+        labels = list(labels)
+
+        if executor is None or len(labels) <= chunk_size:
+            return [
+                (self._parse_fda_data_with_dosage_fallback(label, generic_name), self._count_complete_fields(label))
+                for label, generic_name in labels
+            ]
+
+        payloads = [
+            json.dumps(labels[i:i + chunk_size], ensure_ascii=False).encode('utf-8')
+            for i in range(0, len(labels), chunk_size)
+        ]
+
+        results = []
+        # executor.map menjaga urutan chunk sehingga hasil deterministik
+        for blob in executor.map(_parse_label_chunk, payloads):
+            results.extend((drug_info, completeness) for drug_info, completeness in json.loads(blob))
+        return results
+
+_WORKER_PARSER = None
+
+def _parse_label_chunk(payload: bytes):
+    """Worker process pool: parse satu chunk label dan kembalikan hasil sebagai blob JSON"""
+    global _WORKER_PARSER
+    if _WORKER_PARSER is None:
+        _WORKER_PARSER = FDADrugAPI()
+
+    parsed = [
+        (_WORKER_PARSER._parse_fda_data_with_dosage_fallback(label, generic_name),
+         _WORKER_PARSER._count_complete_fields(label))
+        for label, generic_name in json.loads(payload)
+    ]
+    return json.dumps(parsed, ensure_ascii=False).encode('utf-8')
+
+# ===========================================
+# SNAPSHOT CACHE (DEPLOY)
+# ===========================================
+SNAPSHOT_PATH = os.environ.get("CHATOBAT_SNAPSHOT", os.path.join(".cache", "chatobat.snapshot"))
+SNAPSHOT_MAGIC = b"CHATOBAT-SNAPSHOT"
+# v2: entri terjemahan membawa versi prompt masing-masing
+SNAPSHOT_SCHEMA_VERSION = 2
+SNAPSHOT_HEADER_KEYS = ('schema_version', 'created_at', 'compression', 'sha256', 'drugs', 'translations')
+# Tipe kolom baris payload: export_drugs dan TranslationMemory.export_entries
+_OPTIONAL_STR = (str, type(None))
+_NUMBER = (int, float)
+SNAPSHOT_ROW_TYPES = {
+    'drugs': (str, _OPTIONAL_STR, _OPTIONAL_STR, dict, _NUMBER),
+    'translations': (str, str, str, str, _NUMBER, _NUMBER)
+}
+
+def _valid_snapshot_row(row, types):
+    return (isinstance(row, list) and len(row) == len(types)
+            and all(isinstance(value, kind) for value, kind in zip(row, types)))
+
+class SnapshotError(Exception):
+    """File snapshot rusak, bukan snapshot chatobat, atau versi skemanya tidak didukung"""
+
+def export_snapshot(path: str, cache: PersistentDrugCache, memory: TranslationMemory):
+    """Tulis drug_info dan memori terjemahan ke satu file terkompresi
+
+    Format: magic, satu baris header JSON (versi skema, checksum, jumlah entri),
+    lalu payload JSON terkompresi zlib. sha256 dihitung dari payload terkompresi
+    sehingga file rusak ditolak sebelum didekompresi.
+    """
+    payload = {
+        'drugs': cache.export_drugs(),
+        'translations': memory.export_entries()
+    }
+    compressed = zlib.compress(json.dumps(payload, ensure_ascii=False).encode('utf-8'), 6)
+    header = {
+        'schema_version': SNAPSHOT_SCHEMA_VERSION,
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'compression': 'zlib',
+        'sha256': hashlib.sha256(compressed).hexdigest(),
+        'payload_bytes': len(compressed),
+        'drugs': len(payload['drugs']),
+        'translations': len(payload['translations']),
+        'translation_model': TRANSLATION_MODEL,
+        'prompt_versions': list(TRANSLATION_PROMPT_VERSIONS)
+    }
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    # Tulis ke file sementara lalu rename agar replica tidak membaca snapshot setengah jadi
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(SNAPSHOT_MAGIC + b"\n")
+        f.write(json.dumps(header).encode('utf-8') + b"\n")
+        f.write(compressed)
+    os.replace(tmp_path, path)
+    return header
+
+def read_snapshot(path: str):
+    """Baca dan verifikasi snapshot; return (header, payload) atau SnapshotError"""
+    with open(path, 'rb') as f:
+        if f.readline().rstrip(b"\n") != SNAPSHOT_MAGIC:
+            raise SnapshotError(f"{path} bukan file snapshot chatobat")
+        try:
+            header = json.loads(f.readline())
+        except ValueError as e:
+            raise SnapshotError(f"Header snapshot rusak: {e}")
+        compressed = f.read()
+
+    if not isinstance(header, dict):
+        raise SnapshotError("Header snapshot rusak: bukan objek JSON")
+    missing = [key for key in SNAPSHOT_HEADER_KEYS if key not in header]
+    if missing:
+        raise SnapshotError(f"Header snapshot tidak lengkap: {', '.join(missing)}")
+
+    if header.get('schema_version') != SNAPSHOT_SCHEMA_VERSION:
+        raise SnapshotError(
+            f"Versi skema snapshot {header.get('schema_version')} tidak didukung "
+            f"(didukung: {SNAPSHOT_SCHEMA_VERSION})"
+        )
+    if header.get('compression') != 'zlib' or hashlib.sha256(compressed).hexdigest() != header.get('sha256'):
+        raise SnapshotError("Checksum snapshot tidak cocok, file rusak atau terpotong")
+
+    try:
+        payload = json.loads(zlib.decompress(compressed))
+    except (zlib.error, ValueError) as e:
+        raise SnapshotError(f"Payload snapshot rusak: {e}")
+
+    if not isinstance(payload, dict):
+        raise SnapshotError("Payload snapshot rusak: bukan objek JSON")
+    # Seluruh baris dicek sebelum ada yang ditulis ke SQLite
+    for section, types in SNAPSHOT_ROW_TYPES.items():
+        rows = payload.get(section)
+        if not isinstance(rows, list) or not all(_valid_snapshot_row(row, types) for row in rows):
+            raise SnapshotError(f"Payload snapshot rusak: bagian '{section}' tidak sesuai format")
+    return header, payload
+
+def import_snapshot(path: str, cache: PersistentDrugCache, memory: TranslationMemory):
+    """Muat snapshot ke cache persisten dan memori terjemahan
+
+    Return (report, drug_rows yang disimpan) agar caller bisa mengisi cache memori.
+    """
+    started = time.perf_counter()
+    header, payload = read_snapshot(path)
+
+    imported_keys = set(cache.import_drugs(payload['drugs']))
+    translations = memory.import_entries(payload['translations'], header.get('translation_model'))
+
+    report = {
+        'path': path,
+        'created_at': header['created_at'],
+        'schema_version': header['schema_version'],
+        'drugs': header['drugs'],
+        'drugs_imported': len(imported_keys),
+        'translations': header['translations'],
+        'translations_imported': translations,
+        'load_ms': round((time.perf_counter() - started) * 1000, 1)
+    }
+    return report, [row for row in payload['drugs'] if row[0] in imported_keys]
+
+
+def main(argv):
+    import argparse
+    arg_parser = argparse.ArgumentParser(description="Ingest label openFDA dan export/import snapshot cache")
+    commands = arg_parser.add_subparsers(dest="command", required=True)
+
+    ingest = commands.add_parser("ingest", help="ingest file bulk label openFDA ke store lokal")
+    ingest.add_argument("files", nargs="+")
+    ingest.add_argument("--store", default=LABEL_STORE_PATH)
+    ingest.add_argument("--workers", type=int, default=None,
+                        help="jumlah proses parser (default: jumlah core)")
+
+    snapshot = commands.add_parser("snapshot", help="export/import snapshot cache obat dan terjemahan")
+    snapshot.add_argument("action", choices=["export", "import"])
+    snapshot.add_argument("path", nargs="?", default=SNAPSHOT_PATH)
+
+    args = arg_parser.parse_args(argv)
+    if args.command == "ingest":
+        ingest_label_files(args.files, args.store, workers=args.workers)
+        return
+
+    cache = PersistentDrugCache()
+    memory = TranslationMemory()
+    if args.action == "export":
+        print(json.dumps(export_snapshot(args.path, cache, memory), indent=2))
+    else:
+        report, _ = import_snapshot(args.path, cache, memory)
+        print(json.dumps(report, indent=2))
+    memory.flush()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,264 @@
+"""Index interaksi obat-obat yang dibangun sekali dari teks interaksi
+
+Dipakai bersama oleh app.py dan testchat.py. Setiap kalimat interaksi milik
+obat A yang menyebut obat/zat B disimpan di bawah pasangan frozenset({A, B}),
+sehingga cek satu pasangan O(1) dan pertanyaan dengan n obat cukup n² lookup.
+
+Kalimat dicatat per sumber (obat atau label); jika teks sumber berubah, kalimat
+lama sumber itu diganti. Kalimat hasil ingest dan teks yang terjemahannya
+gagal (bahasa Inggris) disimpan sebagai referensi: hanya dipakai sebagai
+konteks Gemini, tidak ditampilkan langsung ke user.
+"""
+import hashlib
+import re
+import threading
+from itertools import combinations
+
+# Zat/golongan yang sering disebut di teks interaksi tetapi bukan obat di database
+COMMON_INTERACTANTS = {
+    'alkohol': ['alkohol', 'alcohol', 'minuman beralkohol'],
+    'warfarin': ['warfarin'],
+    'antikoagulan': ['antikoagulan', 'anticoagulant', 'anticoagulants', 'pengencer darah'],
+    'kontrasepsi oral': ['kontrasepsi oral', 'pil kb', 'oral contraceptive', 'oral contraceptives'],
+    'probenesid': ['probenesid', 'probenecid'],
+    'ketoconazole': ['ketoconazole', 'ketokonazol'],
+    'itraconazole': ['itraconazole', 'itrakonazol'],
+    'clopidogrel': ['clopidogrel'],
+    'eritromisin': ['eritromisin', 'erythromycin'],
+    'grapefruit': ['grapefruit', 'jeruk bali'],
+    'antijamur': ['antijamur', 'antifungal', 'antifungals']
+}
+
+# Kalimat yang menyebut golongan juga berlaku untuk anggota golongannya
+CLASS_MEMBERS = {
+    'antikoagulan': ['warfarin'],
+    'antijamur': ['ketoconazole', 'itraconazole']
+}
+
+SENTENCE_SPLIT_RE = re.compile(r'(?<=[.;])\s+|\n+')
+MAX_SENTENCES_PER_PAIR = 3
+MAX_SENTENCE_CHARS = 300
+
+# Sumber untuk pasangan yang dimuat dari store ingest (teks label mentah)
+REFERENCE_SOURCE = '_reference'
+
+# Kata fungsi umum untuk menebak bahasa teks interaksi (terjemahan Gemini bisa gagal)
+INDONESIAN_WORDS = {
+    'yang', 'dan', 'dengan', 'untuk', 'dari', 'dalam', 'pada', 'dapat', 'tidak', 'atau',
+    'jika', 'bersama', 'obat', 'risiko', 'meningkatkan', 'penggunaan', 'ini', 'oleh', 'harus'
+}
+ENGLISH_WORDS = {
+    'the', 'and', 'with', 'of', 'may', 'to', 'is', 'be', 'in', 'or', 'if', 'not',
+    'use', 'drug', 'drugs', 'risk', 'increase', 'should', 'this', 'by', 'taking'
+}
+WORD_RE = re.compile(r'[a-z]+')
+
+# "boleh/aman ... minum" untuk pertanyaan tentang tepat satu pasangan obat
+PAIR_QUESTION_RE = re.compile(r'\b(boleh|aman)\b.*\bminum\b|\bminum\b.*\b(boleh|aman)\b')
+
+
+def _text_hash(text: str):
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest()
+
+
+def looks_indonesian(text: str):
+    """Tebakan kasar: lebih banyak kata fungsi Indonesia daripada Inggris"""
+    words = WORD_RE.findall((text or '').lower())
+    indonesian = sum(word in INDONESIAN_WORDS for word in words)
+    english = sum(word in ENGLISH_WORDS for word in words)
+    return indonesian > english
+
+
+def asks_about_pair(question: str, drug_keys):
+    """True untuk pertanyaan seperti 'boleh minum A dengan B?' (tepat dua obat)"""
+    return len(drug_keys) == 2 and bool(PAIR_QUESTION_RE.search(question.lower()))
+
+
+class InteractionIndex:
+    """Peta frozenset({obat_a, obat_b}) -> kalimat interaksi yang relevan"""
+
+    def __init__(self, aliases: dict = None):
+        """aliases: {kunci_obat: [alias, ...]}, digabung dengan COMMON_INTERACTANTS"""
+        self.alias_to_key = {}
+        for key, names in {**COMMON_INTERACTANTS, **(aliases or {})}.items():
+            for name in [key] + list(names):
+                self.alias_to_key[name.lower()] = key.lower()
+
+        # Alias terpanjang dicoba lebih dulu ("vitamin c" sebelum "vitamin")
+        pattern = '|'.join(re.escape(alias) for alias in sorted(self.alias_to_key, key=len, reverse=True))
+        self._alias_re = re.compile(r'\b(' + pattern + r')\b')
+        self._pairs = {}    # pasangan -> {sumber: [kalimat]}
+        self._sources = {}  # sumber -> (hash teks, pasangan yang diisi sumber itu)
+        self._reference_sources = set()  # sumber add_text yang teksnya belum diterjemahkan
+        self._lock = threading.Lock()
+
+    def resolve(self, name: str):
+        """Kunci kanonik untuk nama/alias obat, None jika tidak dikenal"""
+        return self.alias_to_key.get(name.lower())
+
+    def find_drugs(self, text: str):
+        """Kunci obat/zat yang disebut di teks, urut kemunculan tanpa duplikat"""
+        found = []
+        for match in self._alias_re.finditer(text.lower()):
+            key = self.alias_to_key[match.group(1)]
+            if key not in found:
+                found.append(key)
+        return found
+
+    def add_pair(self, drug_a: str, drug_b: str, sentence: str, source: str = REFERENCE_SOURCE):
+        pair = frozenset((drug_a, drug_b))
+        if len(pair) != 2:
+            return False
+
+        with self._lock:
+            return self._add_locked(pair, sentence, source)
+
+    def _add_locked(self, pair, sentence, source):
+        sentences = self._pairs.setdefault(pair, {}).setdefault(source, [])
+        if sentence in sentences or len(sentences) >= MAX_SENTENCES_PER_PAIR:
+            return False
+        sentences.append(sentence)
+        return True
+
+    def _remove_source_locked(self, source):
+        _, pairs = self._sources.pop(source, (None, ()))
+        self._reference_sources.discard(source)
+        for pair in pairs:
+            by_source = self._pairs.get(pair)
+            if by_source is not None:
+                by_source.pop(source, None)
+                if not by_source:
+                    del self._pairs[pair]
+
+    def add_text(self, drug_key: str, text: str, source: str = None, reference: bool = False):
+        """Indeks teks interaksi milik satu obat; teks baru menggantikan kalimat lama sumbernya
+
+        source default-nya kunci obat; ingest memakai set_id label agar beberapa
+        label obat yang sama tidak saling menggantikan. reference=True untuk teks
+        yang belum diterjemahkan: kalimatnya hanya jadi konteks Gemini.
+        """
+        if not text or text == "Tidak tersedia":
+            return 0
+
+        drug_key = self.resolve(drug_key) or drug_key.lower()
+        source = source or drug_key
+        text_hash = _text_hash(text)
+        with self._lock:
+            if self._sources.get(source, (None,))[0] == text_hash:
+                return 0
+
+        # Pencarian alias dilakukan di luar lock, hanya penggantian yang di dalam
+        found = []
+        for sentence in SENTENCE_SPLIT_RE.split(text):
+            sentence = sentence.strip()
+            if not sentence:
+                continue
+            if len(sentence) > MAX_SENTENCE_CHARS:
+                sentence = sentence[:MAX_SENTENCE_CHARS] + "..."
+
+            for other in self.find_drugs(sentence):
+                for target in [other] + CLASS_MEMBERS.get(other, []):
+                    pair = frozenset((drug_key, target))
+                    if len(pair) == 2:
+                        found.append((pair, sentence))
+
+        added = 0
+        with self._lock:
+            self._remove_source_locked(source)
+            pairs = set()
+            for pair, sentence in found:
+                if self._add_locked(pair, sentence, source):
+                    added += 1
+                    pairs.add(pair)
+            self._sources[source] = (text_hash, pairs)
+            if reference:
+                self._reference_sources.add(source)
+        return added
+
+    def load_pairs(self, rows):
+        """Muat pasangan (drug_a, drug_b, kalimat) hasil ingest sebagai referensi"""
+        for drug_a, drug_b, sentence in rows:
+            self.add_pair(drug_a, drug_b, sentence)
+
+    def iter_pairs(self):
+        with self._lock:
+            pairs = list(self._pairs)
+        for pair in pairs:
+            drug_a, drug_b = sorted(pair)
+            sentences, reference = self._collect(pair)
+            for sentence in sentences + reference:
+                yield drug_a, drug_b, sentence
+
+    def _is_reference(self, source):
+        return source == REFERENCE_SOURCE or source in self._reference_sources
+
+    def _collect(self, pair):
+        """Kalimat satu pasangan: (terjemahan/langsung, referensi), tanpa duplikat"""
+        sentences, reference = [], []
+        with self._lock:
+            for source, items in self._pairs.get(pair, {}).items():
+                target = reference if self._is_reference(source) else sentences
+                target.extend(sentence for sentence in items if sentence not in target)
+        reference = [sentence for sentence in reference if sentence not in sentences]
+        return sentences[:MAX_SENTENCES_PER_PAIR], reference[:MAX_SENTENCES_PER_PAIR]
+
+    def lookup(self, drug_a: str, drug_b: str):
+        """Kalimat interaksi untuk satu pasangan (urutan tidak berpengaruh), termasuk referensi"""
+        sentences, reference = self._collect(frozenset((drug_a.lower(), drug_b.lower())))
+        return sentences + reference
+
+    def check(self, drug_keys):
+        """Cek semua pasangan dari daftar obat; hanya pasangan yang punya interaksi dikembalikan
+
+        'sentences' boleh ditampilkan langsung, 'reference' hanya untuk konteks Gemini.
+        """
+        results = []
+        for drug_a, drug_b in combinations(drug_keys, 2):
+            sentences, reference = self._collect(frozenset((drug_a.lower(), drug_b.lower())))
+            if sentences or reference:
+                results.append({'drugs': (drug_a, drug_b), 'sentences': sentences, 'reference': reference})
+        return results
+
+    def get_stats(self):
+        with self._lock:
+            counts = [
+                (self._is_reference(source), len(items))
+                for by_source in self._pairs.values()
+                for source, items in by_source.items()
+            ]
+            return {
+                'pairs': len(self._pairs),
+                'sentences': sum(count for reference, count in counts if not reference),
+                'reference_sentences': sum(count for reference, count in counts if reference),
+                'sources': len(self._sources),
+                'aliases': len(self.alias_to_key)
+            }
+
+
+def _display_name(drug_key: str):
+    return drug_key.replace('_', ' ').title()
+
+
+def is_direct_answer(results):
+    """True jika setiap pasangan punya kalimat yang boleh ditampilkan langsung"""
+    return bool(results) and all(result['sentences'] for result in results)
+
+
+def format_interactions(results, heading: str = "### Interaksi Obat", include_reference: bool = False):
+    """Render hasil InteractionIndex.check sebagai markdown
+
+    Tanpa include_reference hanya kalimat berbahasa Indonesia yang dirender;
+    kalimat referensi (label mentah) hanya untuk konteks Gemini.
+    """
+    lines = [heading, ""]
+    for result in results:
+        sentences = list(result['sentences'])
+        if include_reference:
+            sentences += result.get('reference', [])
+        if not sentences:
+            continue
+        drug_a, drug_b = result['drugs']
+        lines.append(f"**{_display_name(drug_a)} + {_display_name(drug_b)}**")
+        lines.extend(f"- {sentence}" for sentence in sentences)
+        lines.append("")
+    return "\n".join(lines)
@@ -0,0 +1,85 @@
+"""Pengukuran anggaran startup untuk app.py dan testchat.py
+
+Modul ini diimpor sekali per proses Streamlit, jadi STARTUP_TRACKER bertahan
+antar rerun. Setiap run script membuat StartupRun sendiri (aman untuk banyak
+sesi paralel) yang mencatat waktu per fase sampai render pertama. Run pertama
+di proses adalah cold start: import modul berat dan pembuatan assistant.
+"""
+import logging
+import os
+import threading
+import time
+
+STARTUP_BUDGET_MS = float(os.environ.get("CHATOBAT_STARTUP_BUDGET_MS", "3000"))
+RERUN_BUDGET_MS = float(os.environ.get("CHATOBAT_RERUN_BUDGET_MS", "300"))
+
+logger = logging.getLogger(__name__)
+
+
+class StartupRun:
+    """Timer satu run script: mark(fase) mencatat waktu sejak run dimulai"""
+
+    def __init__(self, tracker, started: float):
+        self.tracker = tracker
+        self.started = started
+        self.phases = {}
+
+    def mark(self, phase: str):
+        self.phases[phase] = round((time.perf_counter() - self.started) * 1000, 1)
+
+    def finish(self, phase: str = "first_render"):
+        """Tutup run setelah konten utama dirender dan laporkan ke tracker"""
+        self.mark(phase)
+        self.tracker.record(self.phases)
+        return self.phases
+
+
+class StartupTracker:
+    """Statistik cold start dan rerun per proses, dibandingkan dengan anggaran"""
+
+    def __init__(self, startup_budget_ms: float = STARTUP_BUDGET_MS, rerun_budget_ms: float = RERUN_BUDGET_MS):
+        self.startup_budget_ms = startup_budget_ms
+        self.rerun_budget_ms = rerun_budget_ms
+        self._lock = threading.Lock()
+        self._cold_start = None
+        self._last = {}
+        self._last_over_budget = {}
+        self._stats = {'runs': 0, 'reruns_ms_total': 0.0, 'over_budget': 0}
+
+    def begin(self, started: float = None):
+        return StartupRun(self, time.perf_counter() if started is None else started)
+
+    def record(self, phases: dict):
+        total = max(phases.values())
+        with self._lock:
+            cold = self._cold_start is None
+            budget = self.startup_budget_ms if cold else self.rerun_budget_ms
+            if cold:
+                self._cold_start = dict(phases)
+            else:
+                self._stats['reruns_ms_total'] += total
+            self._stats['runs'] += 1
+            self._last = dict(phases)
+            over = total > budget
+            if over:
+                self._stats['over_budget'] += 1
+                self._last_over_budget = dict(phases)
+
+        # Cukup dihitung; detail per run hanya untuk debug agar log tidak banjir
+        if over:
+            logger.debug("Startup budget exceeded: %s ms > %s ms %s", total, budget, phases)
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['cold_start_ms'] = dict(self._cold_start or {})
+            stats['last_run_ms'] = dict(self._last)
+            stats['last_over_budget_ms'] = dict(self._last_over_budget)
+        reruns = stats['runs'] - 1
+        stats['avg_rerun_ms'] = round(stats.pop('reruns_ms_total') / reruns, 1) if reruns > 0 else 0.0
+        stats['startup_budget_ms'] = self.startup_budget_ms
+        stats['rerun_budget_ms'] = self.rerun_budget_ms
+        return stats
+
+
+STARTUP_TRACKER = StartupTracker()
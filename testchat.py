@@ -1,13 +1,35 @@
+import time
+
+# Awal run script: dasar pengukuran anggaran startup (import + render pertama)
+_RUN_STARTED = time.perf_counter()
+
 import streamlit as st
-import pandas as pd
-import google.generativeai as genai
-import requests
-import numpy as np
 from datetime import datetime
-import time
-import re
 import json
 import random
+import os
+import sys
+import threading
+import collections
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from dose_index import calculate_from_record, format_dose_calculation, parse_population, parse_weight
+from interaction_index import (
+    InteractionIndex, asks_about_pair, format_interactions, is_direct_answer, looks_indonesian
+)
+from drug_detector import EnhancedDrugDetector
+from fda_data import (
+    BATCH_PROMPT_VERSION, CACHE_DB_PATH, FDA_LIVE_FALLBACK, SINGLE_PROMPT_VERSION,
+    SNAPSHOT_PATH, TRANSLATION_MODEL, FDADrugAPI, LocalLabelStore, OpenFDAError, PersistentDrugCache,
+    TranslationMemory, import_snapshot, open_sqlite
+)
+from context_builder import ContextBuilder
+from drug_record import DrugRecord
+from conversation_context import ConversationContext
+from startup_budget import STARTUP_TRACKER
+
+startup_run = STARTUP_TRACKER.begin(_RUN_STARTED)
+startup_run.mark('imports')
 
 # Konfigurasi halaman
 st.set_page_config(
@@ -16,15 +38,29 @@ st.set_page_config(
     layout="wide"
 )
 
-# Setup Gemini API
+# Setup Gemini API (library baru diimpor saat terjemahan/jawaban pertama dibuat)
 try:
     GEMINI_API_KEY = st.secrets["GEMINI_API_KEY"]
-    genai.configure(api_key=GEMINI_API_KEY)
     gemini_available = True
 except Exception as e:
     st.error(f"❌ Error konfigurasi Gemini API: {str(e)}")
     gemini_available = False
 
+def configure_genai():
+    """Import dan configure google.generativeai tanpa cache Streamlit
+
+    Aman dipanggil dari thread latar (pool retrieval, pre-warm) yang tidak
+    punya ScriptRunContext; pemanggil menyimpan hasilnya sendiri.
+    """
+    import google.generativeai as genai
+    genai.configure(api_key=GEMINI_API_KEY)
+    return genai
+
+@st.cache_resource
+def load_genai():
+    """configure_genai sekali per proses, untuk kode yang berjalan di thread script"""
+    return configure_genai()
+
 # ===========================================
 # HELPER FUNCTIONS
 # ===========================================
@@ -32,31 +68,285 @@ def safe_get(dictionary, key, default="Tidak tersedia"):
     """Safe get dengan default value"""
     return dictionary.get(key, default) if dictionary else default
 
+# ===========================================
+# MEMORY CACHE (LRU + TTL)
+# ===========================================
+MEMORY_CACHE_MAX_ENTRIES = int(os.environ.get("CHATOBAT_MEMORY_CACHE_MAX_ENTRIES", 1024))
+MEMORY_CACHE_MAX_BYTES = int(os.environ.get("CHATOBAT_MEMORY_CACHE_MAX_BYTES", 32 * 1024 * 1024))
+MEMORY_CACHE_TTL = int(os.environ.get("CHATOBAT_MEMORY_CACHE_TTL", 3600))
+
+def approx_size(value):
+    """Perkiraan ukuran entri dalam byte (teks field dihitung sebagai UTF-8)"""
+    if hasattr(value, 'items'):
+        return sys.getsizeof(value) + sum(
+            len(str(key)) + len(str(item).encode('utf-8')) for key, item in value.items()
+        )
+    if isinstance(value, str):
+        return len(value.encode('utf-8'))
+    return sys.getsizeof(value)
+
+class BoundedCache:
+    """Cache in-memory thread-safe dengan batas entri dan byte, eviksi LRU dan TTL
+
+    Dipakai sebagai tier memory di depan store persisten: miss di sini berarti
+    caller membaca dari store lalu memanggil put(). on_evict(key, value) dipanggil
+    untuk entri yang dibuang (LRU, kedaluwarsa, atau diganti lewat invalidate).
+    """
+
+    def __init__(self, max_entries: int = MEMORY_CACHE_MAX_ENTRIES, max_bytes: int = MEMORY_CACHE_MAX_BYTES,
+                 ttl: float = MEMORY_CACHE_TTL, size_of=approx_size, on_evict=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.size_of = size_of
+        self.on_evict = on_evict
+        self._entries = collections.OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'expired': 0, 'evictions': 0, 'rejected': 0}
+
+    def _remove(self, key):
+        value, _, size = self._entries.pop(key)
+        self._bytes -= size
+        return value
+
+    def _notify(self, evicted):
+        if self.on_evict:
+            for key, value in evicted:
+                self.on_evict(key, value)
+
+    def get(self, key, default=None):
+        evicted = []
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats['misses'] += 1
+                return default
+
+            if entry[1] <= time.monotonic():
+                evicted.append((key, self._remove(key)))
+                self._stats['expired'] += 1
+                self._stats['misses'] += 1
+                value = default
+            else:
+                self._entries.move_to_end(key)
+                self._stats['hits'] += 1
+                value = entry[0]
+
+        self._notify(evicted)
+        return value
+
+    def put(self, key, value):
+        """Simpan entri; entri LRU dibuang sampai batas entri dan byte terpenuhi"""
+        size = self.size_of(value)
+        evicted = []
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+            if size > self.max_bytes:
+                # Satu entri lebih besar dari seluruh anggaran: jangan simpan
+                self._stats['rejected'] += 1
+                return False
+
+            self._entries[key] = (value, time.monotonic() + self.ttl, size)
+            self._bytes += size
+
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                old_key = next(iter(self._entries))
+                evicted.append((old_key, self._remove(old_key)))
+                self._stats['evictions'] += 1
+
+        self._notify(evicted)
+        return True
+
+    def peek(self, key, default=None):
+        """Baca entri yang masih berlaku tanpa mengubah statistik atau urutan LRU"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= time.monotonic():
+                return default
+            return entry[0]
+
+    def invalidate(self, key):
+        with self._lock:
+            value = self._remove(key) if key in self._entries else None
+        if value is not None:
+            self._notify([(key, value)])
+
+    def clear(self):
+        with self._lock:
+            evicted = [(key, entry[0]) for key, entry in self._entries.items()]
+            self._entries.clear()
+            self._bytes = 0
+        self._notify(evicted)
+
+    def __contains__(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and entry[1] > time.monotonic()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+            stats['bytes'] = self._bytes
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 3) if lookups else 0.0
+        stats['max_entries'] = self.max_entries
+        stats['max_bytes'] = self.max_bytes
+        return stats
+
+# ===========================================
+# NEGATIVE CACHE
+# ===========================================
+NEGATIVE_TTL_NOT_FOUND = int(os.environ.get("CHATOBAT_NEGATIVE_TTL_NOT_FOUND", 30 * 60))
+NEGATIVE_TTL_UPSTREAM_ERROR = int(os.environ.get("CHATOBAT_NEGATIVE_TTL_UPSTREAM_ERROR", 60))
+NEGATIVE_MAX_ENTRIES = int(os.environ.get("CHATOBAT_NEGATIVE_MAX_ENTRIES", 2048))
+
+class NegativeResultCache:
+    """Cache hasil negatif (obat tidak ditemukan / FDA error) dengan TTL pendek per alasan
+
+    Jumlah entri dibatasi (LRU) karena key berasal dari query pengguna, termasuk salah ketik.
+    """
+
+    NOT_FOUND = 'not_found'
+    UPSTREAM_ERROR = 'upstream_error'
+
+    REASON_MESSAGES = {
+        NOT_FOUND: "tidak ditemukan di database FDA",
+        UPSTREAM_ERROR: "FDA API sedang tidak dapat diakses, coba lagi nanti"
+    }
+
+    def __init__(self, not_found_ttl: int = NEGATIVE_TTL_NOT_FOUND,
+                 upstream_error_ttl: int = NEGATIVE_TTL_UPSTREAM_ERROR,
+                 max_entries: int = NEGATIVE_MAX_ENTRIES):
+        self.ttls = {
+            self.NOT_FOUND: not_found_ttl,
+            self.UPSTREAM_ERROR: upstream_error_ttl
+        }
+        self.max_entries = max_entries
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {
+            'hits': {reason: 0 for reason in self.ttls},
+            'stores': {reason: 0 for reason in self.ttls},
+            'evictions': 0
+        }
+
+    def put(self, key: str, reason: str, detail: str = ""):
+        """Catat hasil negatif beserta alasannya"""
+        now = time.time()
+        with self._lock:
+            self._entries[key] = {
+                'reason': reason,
+                'detail': detail,
+                'created_at': now,
+                'expires_at': now + self.ttls[reason]
+            }
+            self._entries.move_to_end(key)
+            self._stats['stores'][reason] += 1
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def peek(self, key: str):
+        """Entri negatif yang masih berlaku tanpa menghitung hit (untuk UI)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry['expires_at'] <= time.time():
+                del self._entries[key]
+                return None
+            return entry
+
+    def get(self, key: str):
+        """Entri negatif yang masih berlaku, dihitung sebagai hit"""
+        entry = self.peek(key)
+        if entry:
+            with self._lock:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                self._stats['hits'][entry['reason']] += 1
+        return entry
+
+    def describe(self, key: str):
+        """Pesan alasan dalam Bahasa Indonesia untuk ditampilkan ke pengguna"""
+        entry = self.peek(key)
+        return self.REASON_MESSAGES[entry['reason']] if entry else None
+
+    def get_stats(self):
+        now = time.time()
+        with self._lock:
+            active = [entry['reason'] for entry in self._entries.values() if entry['expires_at'] > now]
+            return {
+                'active': {reason: active.count(reason) for reason in self.ttls},
+                'hits': dict(self._stats['hits']),
+                'stores': dict(self._stats['stores']),
+                'evictions': self._stats['evictions'],
+                'max_entries': self.max_entries
+            }
+
 # ===========================================
 # TRANSLATION SERVICE
 # ===========================================
+TRANSLATION_BATCH_MAX_CHARS = 12000
 class TranslationService:
-    def __init__(self):
+    def __init__(self, memory: TranslationMemory = None):
         self.available = gemini_available
+        self.memory = memory
+        self._model = None
+        self._stats = {
+            'batch_requests': 0,
+            'batch_fields': 0,
+            'batch_fallbacks': 0,
+            'single_requests': 0
+        }
+        self._lock = threading.Lock()
+    
+    def _count(self, name: str, amount: int = 1):
+        with self._lock:
+            self._stats[name] += amount
+    
+    def _get_model(self):
+        """Satu instance GenerativeModel dipakai ulang untuk semua terjemahan"""
+        if self._model is None:
+            self._model = configure_genai().GenerativeModel(TRANSLATION_MODEL)
+        return self._model
+    
+    def _needs_translation(self, text: str):
+        """Cek apakah teks perlu dikirim ke Gemini untuk diterjemahkan"""
+        if not self.available or not text or text == "Tidak tersedia":
+            return False
+        
+        # Skip jika sudah mengandung banyak kata Bahasa Indonesia
+        indonesian_indicators = ['untuk', 'dengan', 'yang', 'dari', 'dalam', 'pada', 'adalah', 'sebagai']
+        indonesian_count = sum(1 for word in indonesian_indicators if word in text.lower())
+        
+        if indonesian_count > 3:
+            return False
+        
+        # Skip teks yang sangat teknis atau pendek
+        if len(text.strip()) < 15 or text.replace('.', '').replace('mg', '').replace('ml', '').replace(' ', '').isalnum():
+            return False
+        
+        return True
     
     def translate_to_indonesian(self, text: str):
         """Translate text ke Bahasa Indonesia menggunakan Gemini"""
-        if not self.available or not text or text == "Tidak tersedia":
+        if not self._needs_translation(text):
             return text
         
+        remembered = self.memory.get(text, SINGLE_PROMPT_VERSION) if self.memory else None
+        if remembered:
+            return remembered
+        
         try:
-            # Skip jika sudah mengandung banyak kata Bahasa Indonesia
-            indonesian_indicators = ['untuk', 'dengan', 'yang', 'dari', 'dalam', 'pada', 'adalah', 'sebagai']
-            indonesian_count = sum(1 for word in indonesian_indicators if word in text.lower())
-            
-            if indonesian_count > 3:
-                return text
-            
-            # Skip teks yang sangat teknis atau pendek
-            if len(text.strip()) < 15 or text.replace('.', '').replace('mg', '').replace('ml', '').replace(' ', '').isalnum():
-                return text
-            
-            model = genai.GenerativeModel('gemini-2.5-flash-lite')
+            model = self._get_model()
             
             prompt = f"""
             Anda adalah penerjemah medis profesional. Terjemahkan teks medis berikut ke Bahasa Indonesia:
@@ -80,6 +370,7 @@ class TranslationService:
             HASIL TERJEMAHAN:
             """
             
+            self._count('single_requests')
             response = model.generate_content(prompt)
             translated = response.text.strip()
             
@@ -90,508 +381,608 @@ class TranslationService:
             if not translated or len(translated) < 5:
                 return text
             
+            if self.memory:
+                self.memory.put(text, translated, SINGLE_PROMPT_VERSION)
+            
             return translated
             
         except Exception as e:
             print(f"Translation error: {e}")
             return text
-
-# ===========================================
-# FDA API DENGAN PERBAIKAN EKSTRAKSI DOSIS
-# ===========================================
-class FDADrugAPI:
-    def __init__(self):
-        self.base_url = "https://api.fda.gov/drug/label.json"
-        
-        # Database fallback untuk dosis yang tidak lengkap di FDA
-        self.dosage_fallback_db = {
-            'acetaminophen': {
-                'dosis_dewasa': '500-1000 mg setiap 4-6 jam',
-                'dosis_maksimal': 'Maksimal 4000 mg per hari',
-                'dosis_anak': '10-15 mg/kgBB setiap 4-6 jam',
-                'catatan_dosis': 'Hati-hati pada pasien gangguan hati'
-            },
-            'paracetamol': {
-                'dosis_dewasa': '500-1000 mg setiap 4-6 jam',
-                'dosis_maksimal': 'Maksimal 4000 mg per hari',
-                'dosis_anak': '10-15 mg/kgBB setiap 4-6 jam',
-                'catatan_dosis': 'Hati-hati pada pasien gangguan hati'
-            },
-            'amoxicillin': {
-                'dosis_dewasa': '250-500 mg setiap 8 jam atau 875 mg setiap 12 jam',
-                'dosis_maksimal': 'Maksimal 3000 mg per hari',
-                'dosis_anak': '20-50 mg/kgBB/hari dibagi 3 dosis',
-                'catatan_dosis': 'Untuk infeksi bakteri'
-            },
-            'omeprazole': {
-                'dosis_dewasa': '20-40 mg sekali sehari sebelum makan',
-                'dosis_maksimal': 'Maksimal 40 mg per hari',
-                'dosis_anak': 'Tidak dianjurkan untuk anak <1 tahun',
-                'catatan_dosis': 'Untuk tukak lambung dan GERD'
-            },
-            'ibuprofen': {
-                'dosis_dewasa': '200-400 mg setiap 4-6 jam',
-                'dosis_maksimal': 'Maksimal 1200 mg per hari',
-                'dosis_anak': '5-10 mg/kgBB setiap 6-8 jam',
-                'catatan_dosis': 'Hati-hati pada gangguan lambung'
-            },
-            'albuterol': {
-                'dosis_dewasa': 'Inhalasi: 1-2 inhalasi setiap 4-6 jam',
-                'dosis_maksimal': 'Maksimal 8 inhalasi per hari',
-                'dosis_anak': 'Inhalasi: 1 inhalasi setiap 4-6 jam',
-                'catatan_dosis': 'Untuk asma dan bronkospasme'
-            },
-            'salbutamol': {
-                'dosis_dewasa': 'Inhalasi: 1-2 inhalasi setiap 4-6 jam',
-                'dosis_maksimal': 'Maksimal 8 inhalasi per hari',
-                'dosis_anak': 'Inhalasi: 1 inhalasi setiap 4-6 jam',
-                'catatan_dosis': 'Untuk asma dan bronkospasme'
-            },
-            'ascorbic acid': {
-                'dosis_dewasa': '500-1000 mg per hari',
-                'dosis_maksimal': 'Maksimal 2000 mg per hari',
-                'dosis_anak': 'Sesuai kebutuhan, konsultasi dokter',
-                'catatan_dosis': 'Suplemen vitamin C'
-            },
-            'vitamin c': {
-                'dosis_dewasa': '500-1000 mg per hari',
-                'dosis_maksimal': 'Maksimal 2000 mg per hari',
-                'dosis_anak': 'Sesuai kebutuhan, konsultasi dokter',
-                'catatan_dosis': 'Suplemen vitamin C'
-            },
-            'metformin': {
-                'dosis_dewasa': '500 mg 2x sehari (awal), dapat ditingkatkan',
-                'dosis_maksimal': 'Maksimal 2000 mg per hari',
-                'dosis_anak': 'Tidak dianjurkan untuk anak <10 tahun',
-                'catatan_dosis': 'Untuk diabetes tipe 2'
-            },
-            'atorvastatin': {
-                'dosis_dewasa': '10-80 mg sekali sehari',
-                'dosis_maksimal': 'Maksimal 80 mg per hari',
-                'dosis_anak': 'Tidak dianjurkan untuk anak',
-                'catatan_dosis': 'Untuk kolesterol tinggi'
-            },
-            'simvastatin': {
-                'dosis_dewasa': '10-40 mg sekali sehari',
-                'dosis_maksimal': 'Maksimal 40 mg per hari',
-                'dosis_anak': 'Tidak dianjurkan untuk anak',
-                'catatan_dosis': 'Untuk kolesterol tinggi'
-            },
-            'loratadine': {
-                'dosis_dewasa': '10 mg sekali sehari',
-                'dosis_maksimal': 'Maksimal 10 mg per hari',
-                'dosis_anak': '5 mg sekali sehari (usia 6-12 tahun)',
-                'catatan_dosis': 'Untuk alergi'
-            },
-            'aspirin': {
-                'dosis_dewasa': 'Nyeri: 325-650 mg setiap 4 jam',
-                'dosis_maksimal': 'Maksimal 4000 mg per hari',
-                'dosis_anak': 'Hindari pada anak <16 tahun',
-                'catatan_dosis': 'Hati-hati risiko perdarahan'
-            },
-            'lansoprazole': {
-                'dosis_dewasa': '15-30 mg sekali sehari',
-                'dosis_maksimal': 'Maksimal 30 mg per hari',
-                'dosis_anak': '0.5-1 mg/kgBB/hari',
-                'catatan_dosis': 'Untuk gangguan asam lambung'
-            },
-            'esomeprazole': {
-                'dosis_dewasa': '20-40 mg sekali sehari',
-                'dosis_maksimal': 'Maksimal 40 mg per hari',
-                'dosis_anak': 'Tidak dianjurkan untuk anak <1 tahun',
-                'catatan_dosis': 'Untuk tukak lambung'
-            },
-            'cetirizine': {
-                'dosis_dewasa': '5-10 mg sekali sehari',
-                'dosis_maksimal': 'Maksimal 10 mg per hari',
-                'dosis_anak': '2.5-5 mg sekali sehari',
-                'catatan_dosis': 'Untuk alergi'
-            },
-            'dextromethorphan': {
-                'dosis_dewasa': '10-20 mg setiap 4 jam',
-                'dosis_maksimal': 'Maksimal 120 mg per hari',
-                'dosis_anak': '2.5-10 mg setiap 4-6 jam',
-                'catatan_dosis': 'Untuk batuk kering'
-            }
-        }
     
-    def get_drug_info(self, generic_name: str):
-        """Ambil data obat langsung dari FDA API"""
-        params = {
-            'search': f'openfda.generic_name:"{generic_name}"',
-            'limit': 5
-        }
+    def translate_batch(self, texts: dict):
+        """Translate banyak teks sekaligus; key input dipetakan kembali ke hasil terjemahan"""
+        results = dict(texts)
+        pending = {}
+        
+        for key, text in texts.items():
+            if not self._needs_translation(text):
+                continue
+            remembered = self.memory.get(text, BATCH_PROMPT_VERSION) if self.memory else None
+            if remembered:
+                results[key] = remembered
+            else:
+                pending[key] = text
+        
+        for chunk in self._split_batch(pending):
+            translated = self._translate_chunk(chunk)
+            
+            for key, text in chunk.items():
+                value = translated.get(key) if translated else None
+                if isinstance(value, str) and len(value.strip()) >= 5:
+                    results[key] = value.strip()
+                    if self.memory:
+                        self.memory.put(text, results[key], BATCH_PROMPT_VERSION)
+                else:
+                    # Output terstruktur rusak/tidak lengkap: terjemahkan field ini satu per satu
+                    self._count('batch_fallbacks')
+                    results[key] = self.translate_to_indonesian(text)
         
+        return results
+    
+    def _split_batch(self, texts: dict):
+        """Pecah batch agar output Gemini tidak terpotong"""
+        chunk, size = {}, 0
+        for key, text in texts.items():
+            if chunk and size + len(text) > TRANSLATION_BATCH_MAX_CHARS:
+                yield chunk
+                chunk, size = {}, 0
+            chunk[key] = text
+            size += len(text)
+        if chunk:
+            yield chunk
+    
+    def _translate_chunk(self, texts: dict):
+        """Satu panggilan Gemini dengan input dan output JSON ber-key"""
         try:
-            response = requests.get(self.base_url, params=params, timeout=20)
+            model = self._get_model()
             
-            if response.status_code == 200:
-                data = response.json()
-                if data.get('results'):
-                    best_result = None
-                    max_field_count = 0
-                    
-                    for result in data['results']:
-                        field_count = self._count_complete_fields(result)
-                        if field_count > max_field_count:
-                            max_field_count = field_count
-                            best_result = result
-                    
-                    if best_result:
-                        return self._parse_fda_data_with_dosage_fallback(best_result, generic_name)
-                    
-                    return self._parse_fda_data_with_dosage_fallback(data['results'][0], generic_name)
+            prompt = f"""
+            Anda adalah penerjemah medis profesional. Terjemahkan SETIAP nilai pada objek JSON berikut ke Bahasa Indonesia.
+            
+            TEKS ASLI (JSON):
+            {json.dumps(texts, ensure_ascii=False)}
+            
+            ATURAN PENERJEMAHAN:
+            1. Pertahankan SEMUA angka, dosis, satuan (mg, ml, tablet, etc.)
+            2. Pertahankan nama obat asli (acetaminophen, ibuprofen, etc.)
+            3. Pertahankan istilah medis baku yang sudah dikenal di Indonesia
+            4. Gunakan bahasa Indonesia formal yang mudah dipahami pasien
+            5. Jangan ubah makna atau informasi medis
+            6. Kembalikan HANYA objek JSON dengan key yang SAMA PERSIS, nilai berupa hasil terjemahan
+            
+            HASIL TERJEMAHAN (JSON):
+            """
+            
+            self._count('batch_requests')
+            self._count('batch_fields', len(texts))
+            response = model.generate_content(
+                prompt,
+                generation_config={'response_mime_type': 'application/json'}
+            )
+            return self._parse_json_object(response.text)
             
-            return self._try_alternative_search(generic_name)
-                
         except Exception as e:
-            st.error(f"Error FDA API: {e}")
+            print(f"Batch translation error: {e}")
             return None
     
-    def _count_complete_fields(self, fda_data: dict):
-        """Hitung jumlah field yang memiliki data"""
-        important_fields = [
-            'indications_and_usage',
-            'dosage_and_administration', 
-            'adverse_reactions',
-            'contraindications',
-            'drug_interactions',
-            'warnings'
-        ]
-        
-        count = 0
-        for field in important_fields:
-            if field in fda_data and fda_data[field]:
-                value = fda_data[field]
-                if isinstance(value, list) and value:
-                    if value[0] and value[0].strip():
-                        count += 1
-                elif value and value.strip():
-                    count += 1
-        
-        return count
-    
-    def _try_alternative_search(self, generic_name: str):
-        """Coba pencarian alternatif jika data tidak ditemukan"""
-        params = {
-            'search': f'_exists_:openfda.generic_name AND {generic_name}',
-            'limit': 3
-        }
+    def _parse_json_object(self, text: str):
+        """Parse objek JSON dari respons Gemini, toleran terhadap code fence"""
+        cleaned = text.strip()
+        if cleaned.startswith('```'):
+            cleaned = cleaned.strip('`')
+            if cleaned.lower().startswith('json'):
+                cleaned = cleaned[4:]
         
         try:
-            response = requests.get(self.base_url, params=params, timeout=15)
-            if response.status_code == 200:
-                data = response.json()
-                if data.get('results'):
-                    return self._parse_fda_data_with_dosage_fallback(data['results'][0], generic_name)
-        except:
-            pass
-        
-        return None
-    
-    def _parse_fda_data_with_dosage_fallback(self, fda_data: dict, generic_name: str):
-        """Parse data FDA dengan fallback untuk dosis yang tidak lengkap"""
-        openfda = fda_data.get('openfda', {})
-        
-        # Gunakan nama Indonesia untuk obat tertentu
-        display_name = generic_name.title()
-        if 'acetaminophen' in generic_name.lower():
-            display_name = 'Paracetamol'
-        elif 'albuterol' in generic_name.lower():
-            display_name = 'Salbutamol'
-        elif 'ascorbic acid' in generic_name.lower():
-            display_name = 'Vitamin C'
-        
-        # Ekstrak informasi dengan method yang diperbaiki
-        indications = self._extract_indications(fda_data)
-        
-        # Dapatkan informasi dosis dengan fallback
-        dosage_info = self._get_detailed_dosage_info(fda_data, generic_name.lower())
-        
-        side_effects = self._extract_side_effects(fda_data)
-        contraindications = self._extract_contraindications(fda_data)
-        interactions = self._extract_interactions(fda_data)
-        warnings = self._extract_warnings(fda_data)
-        
-        # Tambahkan strengths dari openfda jika ada
-        strengths = []
-        if 'product_ndc' in openfda:
-            strengths = openfda.get('product_ndc', [])
-        
-        drug_info = {
-            "nama": display_name,
-            "nama_generik": display_name,
-            "merek_dagang": ", ".join(openfda.get('brand_name', ['Tidak tersedia']))[:200],
-            "golongan": self._get_field(fda_data, 'drug_class', "Tidak tersedia")[:100],
-            "indikasi": indications[:500] if indications != "Tidak tersedia" else "Tidak tersedia",
-            "dosis_dewasa": dosage_info.get('dosis_dewasa', 'Tidak tersedia')[:300],
-            "dosis_anak": dosage_info.get('dosis_anak', 'Tidak tersedia')[:300],
-            "dosis_maksimal": dosage_info.get('dosis_maksimal', 'Tidak tersedia')[:200],
-            "catatan_dosis": dosage_info.get('catatan_dosis', 'Tidak tersedia')[:200],
-            "efek_samping": side_effects[:500] if side_effects != "Tidak tersedia" else "Tidak tersedia",
-            "kontraindikasi": contraindications[:500] if contraindications != "Tidak tersedia" else "Tidak tersedia",
-            "interaksi": interactions[:500] if interactions != "Tidak tersedia" else "Tidak tersedia",
-            "peringatan": warnings[:500] if warnings != "Tidak tersedia" else "Tidak tersedia",
-            "bentuk_sediaan": ", ".join(openfda.get('dosage_form', ['Tidak tersedia']))[:100],
-            "route_pemberian": ", ".join(openfda.get('route', ['Tidak tersedia']))[:100],
-            "kekuatan": ", ".join(strengths[:3]) if strengths else "Tidak tersedia",
-            "sumber": "FDA API"
-        }
-        
-        # Tambahkan catatan untuk nama FDA yang berbeda
-        if generic_name.lower() in ['acetaminophen', 'albuterol', 'ascorbic acid']:
-            drug_info['catatan_fda'] = f"Di FDA dikenal sebagai {generic_name}"
-        
-        return drug_info
-    
-    def _get_field(self, fda_data: dict, field_name: str, default: str = "Tidak tersedia"):
-        """Helper untuk mendapatkan field dengan handling yang lebih baik"""
-        if field_name not in fda_data:
-            return default
-        
-        value = fda_data[field_name]
-        if isinstance(value, list):
-            if value:
-                return ' '.join([str(v) for v in value if v])[:300]
-            return default
-        elif value:
-            return str(value)[:300]
-        
-        return default
-    
-    def _extract_indications(self, fda_data: dict):
-        """Ekstrak informasi indikasi"""
-        fields_to_check = [
-            'indications_and_usage',
-            'purpose',
-            'description'
-        ]
-        
-        for field in fields_to_check:
-            if field in fda_data and fda_data[field]:
-                value = fda_data[field]
-                if isinstance(value, list) and value:
-                    return value[0][:500]
-                elif value:
-                    return str(value)[:500]
-        
-        return "Tidak tersedia"
-    
-    def _extract_side_effects(self, fda_data: dict):
-        """Ekstrak informasi efek samping"""
-        if 'adverse_reactions' in fda_data and fda_data['adverse_reactions']:
-            value = fda_data['adverse_reactions']
-            if isinstance(value, list) and value:
-                return value[0][:500]
-            elif value:
-                return str(value)[:500]
-        
-        return "Tidak tersedia"
-    
-    def _extract_contraindications(self, fda_data: dict):
-        """Ekstrak informasi kontraindikasi"""
-        if 'contraindications' in fda_data and fda_data['contraindications']:
-            value = fda_data['contraindications']
-            if isinstance(value, list) and value:
-                return value[0][:500]
-            elif value:
-                return str(value)[:500]
-        
-        return "Tidak tersedia"
-    
-    def _extract_interactions(self, fda_data: dict):
-        """Ekstrak informasi interaksi"""
-        if 'drug_interactions' in fda_data and fda_data['drug_interactions']:
-            value = fda_data['drug_interactions']
-            if isinstance(value, list) and value:
-                return value[0][:500]
-            elif value:
-                return str(value)[:500]
-        
-        return "Tidak tersedia"
-    
-    def _extract_warnings(self, fda_data: dict):
-        """Ekstrak informasi peringatan"""
-        if 'warnings' in fda_data and fda_data['warnings']:
-            value = fda_data['warnings']
-            if isinstance(value, list) and value:
-                return value[0][:500]
-            elif value:
-                return str(value)[:500]
-        
-        return "Tidak tersedia"
-    
-    def _get_detailed_dosage_info(self, fda_data: dict, drug_name: str):
-        """Dapatkan informasi dosis detail dengan fallback"""
-        result = {
-            'dosis_dewasa': 'Tidak tersedia',
-            'dosis_anak': 'Tidak tersedia',
-            'dosis_maksimal': 'Tidak tersedia',
-            'catatan_dosis': 'Tidak tersedia'
-        }
-        
-        # Coba ekstrak dari FDA data pertama
-        fda_dosage = self._extract_detailed_dosage_from_fda(fda_data)
-        
-        if fda_dosage['dosis_dewasa'] != 'Tidak tersedia':
-            # Jika FDA punya data, gunakan itu
-            return fda_dosage
-        else:
-            # Jika FDA tidak punya data, gunakan fallback database
-            if drug_name in self.dosage_fallback_db:
-                return self.dosage_fallback_db[drug_name]
-        
-        return result
-    
-    def _extract_detailed_dosage_from_fda(self, fda_data: dict):
-        """Ekstrak informasi dosis detail dari data FDA"""
-        result = {
-            'dosis_dewasa': 'Tidak tersedia',
-            'dosis_anak': 'Tidak tersedia',
-            'dosis_maksimal': 'Tidak tersedia',
-            'catatan_dosis': 'Tidak tersedia'
-        }
-        
-        # Cek field dosage_and_administration
-        if 'dosage_and_administration' in fda_data and fda_data['dosage_and_administration']:
-            dosage_text = fda_data['dosage_and_administration']
-            if isinstance(dosage_text, list) and dosage_text:
-                dosage_text = ' '.join([str(t) for t in dosage_text if t])
-            elif not isinstance(dosage_text, str):
-                dosage_text = str(dosage_text)
-            
-            # Analisis teks dosis
-            analyzed_dosage = self._analyze_dosage_text(dosage_text)
-            
-            # Update result dengan informasi yang ditemukan
-            for key in ['dosis_dewasa', 'dosis_anak', 'dosis_maksimal', 'catatan_dosis']:
-                if analyzed_dosage.get(key) and analyzed_dosage[key] != 'Tidak tersedia':
-                    result[key] = analyzed_dosage[key]
+            data = json.loads(cleaned)
+        except ValueError:
+            return None
         
-        return result
+        return data if isinstance(data, dict) else None
     
-    def _analyze_dosage_text(self, text: str):
-        """Analisis teks dosis untuk ekstrak informasi spesifik"""
-        result = {
-            'dosis_dewasa': 'Tidak tersedia',
-            'dosis_anak': 'Tidak tersedia',
-            'dosis_maksimal': 'Tidak tersedia',
-            'catatan_dosis': 'Tidak tersedia'
+    def get_stats(self):
+        with self._lock:
+            return dict(self._stats)
+
+# ===========================================
+# SINGLE-FLIGHT
+# ===========================================
+class SingleFlight:
+    """Gabungkan pekerjaan konkuren dengan key yang sama menjadi satu eksekusi.
+
+    Caller pertama untuk sebuah key menjadi leader dan mengerjakannya; caller lain
+    yang datang selama leader masih berjalan menunggu Future yang sama.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._stats = {'leaders': 0, 'coalesced': 0}
+
+    def begin(self, key: str):
+        """Kembalikan (future, is_leader); hanya leader yang wajib memanggil resolve/reject"""
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self._stats['coalesced'] += 1
+                return future, False
+
+            future = Future()
+            self._calls[key] = future
+            self._stats['leaders'] += 1
+            return future, True
+
+    def resolve(self, key: str, result):
+        with self._lock:
+            future = self._calls.pop(key)
+        future.set_result(result)
+
+    def reject(self, key: str, error: BaseException):
+        with self._lock:
+            future = self._calls.pop(key)
+        future.set_exception(error)
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['in_flight'] = len(self._calls)
+        return stats
+
+# ===========================================
+# PRE-WARM OBAT POPULER
+# ===========================================
+PREWARM_TOP_N = int(os.environ.get("CHATOBAT_PREWARM_TOP_N", 20))
+PREWARM_INTERVAL = int(os.environ.get("CHATOBAT_PREWARM_INTERVAL", 3600))
+PREWARM_RATE_PER_MINUTE = float(os.environ.get("CHATOBAT_PREWARM_RATE", 6))
+PREWARM_DELAY = float(os.environ.get("CHATOBAT_PREWARM_DELAY", 30))
+
+class DrugPopularityStore:
+    """Jumlah pertanyaan yang dijawab per obat, disimpan di SQLite agar bertahan restart"""
+
+    def __init__(self, path: str = CACHE_DB_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+
+        try:
+            self._conn = open_sqlite(path)
+            with self._conn:
+                self._conn.execute("""
+                    CREATE TABLE IF NOT EXISTS drug_popularity (
+                        drug_key TEXT PRIMARY KEY,
+                        hits INTEGER NOT NULL,
+                        last_seen REAL NOT NULL
+                    )
+                """)
+            self.available = True
+        except Exception as e:
+            print(f"Popularity store error: {e}")
+            self._conn = None
+            self.available = False
+
+    def record(self, drug_keys):
+        """Tambah hitungan untuk obat sumber satu jawaban (setiap obat sekali)"""
+        drug_keys = set(drug_keys)
+        if not self.available or not drug_keys:
+            return
+
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO drug_popularity VALUES (?, 1, ?) "
+                "ON CONFLICT(drug_key) DO UPDATE SET hits = hits + 1, last_seen = excluded.last_seen",
+                [(drug_key, now) for drug_key in drug_keys]
+            )
+
+    def top(self, limit: int):
+        if not self.available:
+            return []
+
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT drug_key FROM drug_popularity ORDER BY hits DESC, last_seen DESC LIMIT ?",
+                (limit,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def get_stats(self):
+        stats = {'available': self.available}
+        if self.available:
+            with self._lock:
+                stats['drugs'], stats['hits'] = self._conn.execute(
+                    "SELECT COUNT(*), COALESCE(SUM(hits), 0) FROM drug_popularity"
+                ).fetchone()
+        return stats
+
+class PreWarmer:
+    """Thread latar yang mengambil dan menerjemahkan obat terpopuler sebelum ditanyakan
+
+    Dimulai setelah render pertama (bukan di constructor assistant); putaran
+    pertama menunggu `initial_delay` detik, lalu berulang setiap `interval`
+    detik. Antar obat ada jeda 60 / rate_per_minute detik agar kuota openFDA
+    dan Gemini tidak habis untuk pre-warm. Obat yang sudah ada di cache memori
+    dilewati. Thread ini tidak memanggil API Streamlit.
+    """
+
+    def __init__(self, warm, is_warm, popularity: DrugPopularityStore, top_n: int = PREWARM_TOP_N,
+                 interval: float = PREWARM_INTERVAL, rate_per_minute: float = PREWARM_RATE_PER_MINUTE,
+                 initial_delay: float = PREWARM_DELAY):
+        self.warm = warm
+        self.is_warm = is_warm
+        self.popularity = popularity
+        self.top_n = top_n
+        self.interval = interval
+        self.initial_delay = initial_delay
+        self.min_delay = 60.0 / rate_per_minute if rate_per_minute > 0 else 0.0
+        self.enabled = top_n > 0 and rate_per_minute > 0 and popularity.available
+
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._progress = {
+            'state': 'idle' if self.enabled else 'disabled',
+            'cycles': 0, 'done': 0, 'total': 0,
+            'warmed': 0, 'skipped': 0, 'not_found': 0, 'errors': 0,
+            'current': None, 'last_cycle_at': None, 'last_error': None
         }
-        
-        text_lower = text.lower()
-        
-        # Pola pencarian untuk dosis dewasa
-        adult_patterns = [
-            r'adult[s]?\s*dose[:\s]*([^\.]+)',
-            r'adult[s]?\s*:\s*([^\.]+)',
-            r'for adult[s]?\s*([^\.]+)',
-            r'recommended dose\s*([^\.]+)',
-            r'usual dose\s*([^\.]+)',
-            r'(\d+\s*-\s*\d+\s*mg.*?(?:per|every|daily))',
-            r'(\d+\s*mg.*?(?:per|every|daily))'
-        ]
-        
-        # Cari dosis dewasa
-        for pattern in adult_patterns:
-            matches = re.findall(pattern, text_lower)
-            if matches:
-                result['dosis_dewasa'] = self._clean_dosage_text(matches[0])
+
+    def _update(self, **changes):
+        with self._lock:
+            self._progress.update(changes)
+
+    def _count(self, name: str):
+        with self._lock:
+            self._progress[name] += 1
+            self._progress['done'] += 1
+
+    def start(self):
+        """Idempoten: aman dipanggil setiap rerun, thread hanya dibuat sekali"""
+        with self._lock:
+            if not self.enabled or self._thread:
+                return
+            self._thread = threading.Thread(target=self._run, name="prewarm", daemon=True)
+            self._progress['state'] = 'waiting'
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        if self._stop.wait(self.initial_delay):
+            self._update(state='stopped')
+            return
+        while not self._stop.is_set():
+            self.run_cycle()
+            if self._stop.wait(self.interval):
                 break
-        
-        # Pola pencarian untuk dosis anak
-        pediatric_patterns = [
-            r'pediatric[s]?\s*dose[:\s]*([^\.]+)',
-            r'children[s]?\s*dose[:\s]*([^\.]+)',
-            r'for children\s*([^\.]+)',
-            r'child dose\s*([^\.]+)',
-            r'(\d+\s*mg/kg.*?(?:per|every|daily))',
-            r'(\d+\s*-\s*\d+\s*mg/kg)'
-        ]
-        
-        # Cari dosis anak
-        for pattern in pediatric_patterns:
-            matches = re.findall(pattern, text_lower)
-            if matches:
-                result['dosis_anak'] = self._clean_dosage_text(matches[0])
+        self._update(state='stopped', current=None)
+
+    def run_cycle(self):
+        """Satu putaran pre-warm untuk top-N obat"""
+        drug_keys = self.popularity.top(self.top_n)
+        self._update(state='running', done=0, total=len(drug_keys))
+
+        for drug_key in drug_keys:
+            if self._stop.is_set():
                 break
-        
-        # Pola pencarian untuk dosis maksimal
-        max_patterns = [
-            r'maximum\s*dose[:\s]*([^\.]+)',
-            r'maximum\s*:\s*([^\.]+)',
-            r'maximum\s*([^\.]+)',
-            r'not exceed\s*([^\.]+)',
-            r'do not exceed\s*([^\.]+)',
-            r'max\s*(\d+\s*mg.*?per day)'
-        ]
-        
-        # Cari dosis maksimal
-        for pattern in max_patterns:
-            matches = re.findall(pattern, text_lower)
-            if matches:
-                result['dosis_maksimal'] = self._clean_dosage_text(matches[0])
+            if self.is_warm(drug_key):
+                self._count('skipped')
+                continue
+
+            self._update(current=drug_key)
+            try:
+                self._count('warmed' if self.warm(drug_key) is not None else 'not_found')
+            except Exception as e:
+                self._update(last_error=f"{drug_key}: {e}")
+                self._count('errors')
+
+            # Batas laju: jeda antar obat yang benar-benar diambil
+            if self._stop.wait(self.min_delay):
                 break
-        
-        # Ekstrak catatan penting
-        warning_keywords = ['warning', 'caution', 'note', 'important', 'should', 'must']
-        sentences = text.split('.')
-        for sentence in sentences:
-            if any(keyword in sentence.lower() for keyword in warning_keywords):
-                if len(sentence.strip()) > 20:  # Hanya ambil kalimat yang bermakna
-                    result['catatan_dosis'] = sentence.strip()[:150]
-                    break
-        
-        return result
-    
-    def _clean_dosage_text(self, text: str):
-        """Bersihkan dan format teks dosis"""
-        # Hapus whitespace berlebih
-        text = ' '.join(text.split())
-        
-        # Capitalize huruf pertama
-        if text and len(text) > 0:
-            text = text[0].upper() + text[1:]
-        
-        # Batasi panjang teks
-        if len(text) > 150:
-            text = text[:147] + "..."
-        
-        return text
+
+        with self._lock:
+            self._progress['cycles'] += 1
+            self._progress.update(state='idle', current=None, last_cycle_at=datetime.now().strftime("%H:%M:%S"))
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._progress)
+        stats['top_n'] = self.top_n
+        stats['rate_per_minute'] = round(60.0 / self.min_delay, 2) if self.min_delay else 0
+        return stats
 
 # ===========================================
 # RAG MODEL
 # ===========================================
+RETRIEVAL_CONCURRENCY = int(os.environ.get("CHATOBAT_RETRIEVAL_CONCURRENCY", 4))
+
 class SimpleRAGPharmaAssistant:
+    # Intent pertanyaan dan keyword pemicunya
+    QUESTION_KEYWORDS = {
+        'dosis': ['dosis', 'berapa', 'takaran', 'aturan pakai', 'berapa mg', 'berapa ml'],
+        'efek': ['efek samping', 'side effect', 'bahaya', 'efeknya'],
+        'kontraindikasi': ['kontra', 'tidak boleh', 'hindari', 'larangan'],
+        'interaksi': ['interaksi', 'bereaksi dengan', 'makanan', 'minuman'],
+        'indikasi': ['untuk apa', 'kegunaan', 'manfaat', 'indikasi'],
+        'peringatan': ['peringatan', 'warning', 'hati-hati']
+    }
+
+    # Intent -> (judul, field drug_info) untuk jawaban template tanpa Gemini
+    FAST_PATH_FIELDS = {
+        'dosis': ('Dosis', [
+            ('Dosis Dewasa', 'dosis_dewasa'),
+            ('Dosis Anak', 'dosis_anak'),
+            ('Dosis Maksimal', 'dosis_maksimal'),
+            ('Catatan Dosis', 'catatan_dosis')
+        ]),
+        'efek': ('Efek Samping', [('Efek Samping', 'efek_samping')]),
+        'kontraindikasi': ('Kontraindikasi', [('Kontraindikasi', 'kontraindikasi')]),
+        'interaksi': ('Interaksi Obat', [('Interaksi', 'interaksi')]),
+        'indikasi': ('Indikasi', [('Indikasi', 'indikasi')]),
+        'peringatan': ('Peringatan', [('Peringatan', 'peringatan')])
+    }
+
+    # Pertanyaan terbuka/kondisional tetap dijawab Gemini
+    OPEN_ENDED_MARKERS = [
+        'kenapa', 'mengapa', 'bagaimana', 'jelaskan', 'bandingkan', 'dibanding',
+        'lebih baik', 'bolehkah', 'apakah aman', 'sebaiknya', 'hamil', 'menyusui'
+    ]
+
+    # Urutan field di konteks RAG
+    CONTEXT_FIELDS = [
+        ('Catatan', 'catatan_fda'),
+        ('Dosis Dewasa', 'dosis_dewasa'),
+        ('Dosis Anak', 'dosis_anak'),
+        ('Dosis Maksimal', 'dosis_maksimal'),
+        ('Catatan Dosis', 'catatan_dosis'),
+        ('Nama Generik', 'nama_generik'),
+        ('Merek Dagang', 'merek_dagang'),
+        ('Golongan', 'golongan'),
+        ('Indikasi', 'indikasi'),
+        ('Efek Samping', 'efek_samping'),
+        ('Kontraindikasi', 'kontraindikasi'),
+        ('Interaksi', 'interaksi'),
+        ('Peringatan', 'peringatan'),
+        ('Bentuk Sediaan', 'bentuk_sediaan'),
+        ('Kekuatan', 'kekuatan')
+    ]
+
+    # Penanda pertanyaan penggunaan beberapa obat bersamaan
+    INTERACTION_MARKERS = [
+        'interaksi', 'bersamaan', 'barengan', 'bareng', 'dicampur', 'digabung',
+        'dikombinasikan', 'kombinasi', 'sekaligus'
+    ]
+
+    DISCLAIMER = "\n\n⚠️ **HARAP KONSULTASIKAN DENGAN DOKTER ATAU APOTEKER SEBELUM MENGGUNAKAN OBAT INI**"
+
     def __init__(self):
-        self.fda_api = FDADrugAPI()
-        self.translator = TranslationService()
+        self.persistent_cache = PersistentDrugCache()
+        self.label_store = LocalLabelStore.open_if_exists()
+        self.fda_api = FDADrugAPI(
+            label_cache=self.persistent_cache,
+            label_store=self.label_store,
+            live_fallback=FDA_LIVE_FALLBACK
+        )
+        self.translation_memory = TranslationMemory()
+        self.translator = TranslationService(memory=self.translation_memory)
         self.drug_detector = EnhancedDrugDetector()
-        self.drugs_cache = {}
-        self.current_context = {}
-    
+        self.interaction_index = InteractionIndex(self.drug_detector.drug_dictionary)
+        self.context_builder = ContextBuilder(
+            fields=self.CONTEXT_FIELDS,
+            intent_fields={
+                intent: [field for _, field in fields]
+                for intent, (_, fields) in self.FAST_PATH_FIELDS.items()
+            },
+            core_fields=['catatan_fda', 'golongan', 'peringatan'],
+            header="## INFORMASI OBAT DARI FDA:\n\n",
+            drug_heading="### OBAT {index}: {nama}\n",
+            line_format="- **{label}:** {text}\n"
+        )
+        if self.label_store:
+            self.interaction_index.load_pairs(self.label_store.iter_interactions())
+        # Tier memory terbatas di depan PersistentDrugCache; fragmen konteks ikut dibuang saat eviksi
+        self.drugs_cache = BoundedCache(on_evict=lambda key, _: self.context_builder.invalidate(key))
+        self.negative_cache = NegativeResultCache()
+        self.single_flight = SingleFlight()
+        self.fast_path_stats = {'questions': 0, 'fast_path': 0, 'dose_calculations': 0, 'interaction_answers': 0}
+        self._stats_lock = threading.Lock()
+
+        # Pool bersama untuk fetch+translate paralel; max_workers = batas konkurensi
+        self.retrieval_concurrency = RETRIEVAL_CONCURRENCY
+        self._retrieval_pool = ThreadPoolExecutor(
+            max_workers=max(1, self.retrieval_concurrency),
+            thread_name_prefix="rag-retrieve"
+        )
+
+        self.snapshot_report = self._load_snapshot(SNAPSHOT_PATH)
+
+        # Obat yang paling sering ditanyakan diambil di latar belakang (tidak memblokir UI)
+        self.popularity = DrugPopularityStore()
+        self.prewarmer = PreWarmer(
+            warm=self._get_or_fetch_drug_info,
+            is_warm=lambda drug_key: drug_key in self.drugs_cache,
+            popularity=self.popularity
+        )
+
+    def _load_snapshot(self, path: str):
+        """Muat snapshot hasil export instance lain (jika ada) dan isi cache memori"""
+        if not path or not os.path.exists(path):
+            return None
+
+        # Snapshot apa pun yang gagal dimuat (termasuk saat mengisi cache memori)
+        # tidak boleh menggagalkan startup
+        try:
+            report, drug_rows = import_snapshot(path, self.persistent_cache, self.translation_memory)
+
+            # Hanya entri yang masih fresh yang langsung disajikan dari memori, terbaru lebih dulu
+            fresh_after = time.time() - self.persistent_cache.drug_ttl
+            drug_rows.sort(key=lambda row: row[4], reverse=True)
+            for drug_key, _, _, info, stored_at in drug_rows[:self.drugs_cache.max_entries]:
+                if stored_at > fresh_after:
+                    self._cache_drug_info(drug_key, info)
+        except Exception as e:
+            print(f"Snapshot error: {e}")
+            return {'path': path, 'error': str(e)}
+        return report
+
     def _get_or_fetch_drug_info(self, drug_name: str):
-        """Dapatkan data dari cache atau fetch dari FDA API"""
+        """Dapatkan data dari cache (memori, lalu disk) atau fetch dari FDA API"""
+        return self._fetch_drug_infos([drug_name])[0]
+
+    def _cache_drug_info(self, drug_key: str, drug_info):
+        """Simpan record di memory cache dan render ulang fragmen konteksnya"""
+        record = DrugRecord.from_dict(drug_info, record_id=drug_key)
+        self.drugs_cache.put(drug_key, record)
+        self.context_builder.prime(drug_key, record)
+        return record
+
+    def get_record(self, record_id: str):
+        """Resolve id record yang disimpan di pesan chat ke versi terkini
+
+        Hanya untuk tampilan: tidak menghitung statistik cache dan tidak mengubah
+        urutan LRU. None jika record sudah tidak ada di cache mana pun.
+        """
+        record = self.drugs_cache.peek(record_id)
+        if record:
+            return record
+
+        cached = self.persistent_cache.get_drug(record_id, count_stats=False)
+        if cached:
+            return cached['drug_info']
+
+        fallback = self._upstream_error_fallback(record_id, self.drug_detector.get_fda_name(record_id), None)
+        return fallback['drug_info'] if fallback else None
+
+    def _lookup_drug_info(self, drug_name: str):
+        """Cari drug_info di cache atau ambil label FDA; hasil fetch baru belum diterjemahkan"""
         drug_key = drug_name.lower()
-        
-        if drug_key in self.drugs_cache:
-            return self.drugs_cache[drug_key]
-        
+
+        record = self.drugs_cache.get(drug_key)
+        if record is not None:
+            return {'drug_info': record, 'needs_translation': False}
+
+        cached = self.persistent_cache.get_drug(drug_key)
+        if cached and cached['fresh']:
+            self._cache_drug_info(drug_key, cached['drug_info'])
+            return {'drug_info': cached['drug_info'], 'needs_translation': False}
+
         fda_name = self.drug_detector.get_fda_name(drug_name)
-        drug_info = self.fda_api.get_drug_info(fda_name)
-        
-        if drug_info:
-            if drug_name != fda_name:
-                drug_info['nama'] = drug_name.title()
-                drug_info['catatan_fda'] = f"Di FDA dikenal sebagai {fda_name}"
-            
-            drug_info = self._translate_all_fields(drug_info)
-            self.drugs_cache[drug_key] = drug_info
-        
-        return drug_info
-    
-    def _translate_all_fields(self, drug_info: dict):
-        """Translate SEMUA field yang penting ke Bahasa Indonesia"""
+
+        # Hasil negatif yang masih berlaku: jangan ulangi pencarian FDA
+        negative = self.negative_cache.get(drug_key)
+        if negative and negative['reason'] == NegativeResultCache.UPSTREAM_ERROR:
+            return self._upstream_error_fallback(drug_name, fda_name, cached)
+        if negative:
+            return {'drug_info': cached['drug_info'], 'needs_translation': False} if cached else None
+
+        try:
+            label, stored_info = self.fda_api.get_label_entry(fda_name)
+        except OpenFDAError as e:
+            # openFDA tidak sehat: gagal cepat ke terjemahan lama atau database dosis lokal
+            print(f"Error FDA API: {e}")
+            self.negative_cache.put(drug_key, NegativeResultCache.UPSTREAM_ERROR, str(e))
+            return self._upstream_error_fallback(drug_name, fda_name, cached)
+
+        set_id, effective_time = self.fda_api.get_label_version(label)
+
+        # Label belum berubah sejak diterjemahkan: pakai ulang hasil terjemahan lama
+        if cached and label and cached['set_id'] == set_id and cached['effective_time'] == effective_time:
+            self.persistent_cache.touch_drug(drug_key)
+            self._cache_drug_info(drug_key, cached['drug_info'])
+            return {'drug_info': cached['drug_info'], 'needs_translation': False}
+
+        if not label:
+            self.negative_cache.put(drug_key, NegativeResultCache.NOT_FOUND, fda_name)
+            if cached:
+                # FDA tidak tersedia: sajikan terjemahan lama daripada tidak menjawab
+                self._cache_drug_info(drug_key, cached['drug_info'])
+                return {'drug_info': cached['drug_info'], 'needs_translation': False}
+            return None
+
+        # Label dari store lokal sudah diparse saat ingest (dan sudah ditandai sumbernya)
+        drug_info = stored_info or self.fda_api._parse_fda_data_with_dosage_fallback(label, fda_name)
+        if drug_name != fda_name:
+            drug_info['nama'] = drug_name.title()
+            drug_info['catatan_fda'] = f"Di FDA dikenal sebagai {fda_name}"
+
+        return {
+            'drug_info': drug_info,
+            'needs_translation': True,
+            'drug_key': drug_key,
+            'set_id': set_id,
+            'effective_time': effective_time
+        }
+
+    def _upstream_error_fallback(self, drug_name: str, fda_name: str, cached):
+        """Saat FDA error: terjemahan lama jika ada, jika tidak database dosis lokal"""
+        if cached:
+            return {'drug_info': cached['drug_info'], 'needs_translation': False}
+
+        fallback_info = self.fda_api.get_fallback_drug_info(fda_name)
+        if not fallback_info:
+            return None
+        if drug_name != fda_name:
+            fallback_info['nama'] = drug_name.title()
+        return {
+            'drug_info': DrugRecord.from_dict(fallback_info, record_id=drug_name.lower()),
+            'needs_translation': False
+        }
+
+    def _fetch_drug_infos(self, drug_names):
+        """Ambil beberapa obat sekaligus; urutan hasil mengikuti urutan input
+
+        Fetch untuk obat yang sama dari sesi lain yang sedang berjalan tidak diulang:
+        caller menunggu hasil leader (single-flight per nama obat kanonik).
+        """
+        flights = {}
+        leader_names = []
+        for drug_name in drug_names:
+            drug_key = drug_name.lower()
+            if drug_key not in flights:
+                flights[drug_key] = self.single_flight.begin(drug_key)
+                if flights[drug_key][1]:
+                    leader_names.append(drug_name)
+
+        try:
+            leader_infos = self._fetch_and_translate(leader_names) if leader_names else []
+        except BaseException as e:
+            for drug_name in leader_names:
+                self.single_flight.reject(drug_name.lower(), e)
+            raise
+
+        for drug_name, drug_info in zip(leader_names, leader_infos):
+            self.single_flight.resolve(drug_name.lower(), drug_info)
+
+        return [flights[drug_name.lower()][0].result() for drug_name in drug_names]
+
+    def _fetch_and_translate(self, drug_names):
+        """Fetch paralel lalu terjemahkan semua obat baru dalam satu batch"""
+        if len(drug_names) <= 1 or self.retrieval_concurrency <= 1:
+            lookups = [self._lookup_drug_info(drug_name) for drug_name in drug_names]
+        else:
+            lookups = list(self._retrieval_pool.map(self._lookup_drug_info, drug_names))
+
+        # Semua obat yang baru diambil diterjemahkan bersama dalam satu request Gemini
+        pending = [lookup for lookup in lookups if lookup and lookup['needs_translation']]
+        if pending:
+            self._translate_drug_infos([lookup['drug_info'] for lookup in pending])
+            for lookup in pending:
+                lookup['drug_info'] = self._cache_drug_info(lookup['drug_key'], lookup['drug_info'])
+                self.persistent_cache.put_drug(
+                    lookup['drug_key'], lookup['drug_info'], lookup['set_id'], lookup['effective_time']
+                )
+
+        # Teks interaksi obat yang baru diambil ikut masuk index pasangan; teks yang
+        # masih berbahasa Inggris (Gemini tidak aktif/gagal) hanya jadi referensi
+        for drug_name, lookup in zip(drug_names, lookups):
+            if lookup:
+                interaksi = lookup['drug_info'].get('interaksi')
+                self.interaction_index.add_text(drug_name, interaksi, reference=not looks_indonesian(interaksi))
+
+        return [lookup['drug_info'] if lookup else None for lookup in lookups]
+
+    def _translate_drug_infos(self, drug_infos):
+        """Translate field penting dari satu atau lebih obat dalam satu batch"""
         # Define semua fields yang mungkin ada
         possible_fields = [
             'indikasi', 'dosis_dewasa', 'dosis_anak', 'dosis_maksimal',
@@ -599,18 +990,29 @@ class SimpleRAGPharmaAssistant:
             'peringatan', 'golongan', 'bentuk_sediaan', 'route_pemberian',
             'nama', 'merek_dagang', 'kekuatan', 'nama_generik'
         ]
-        
-        for field in possible_fields:
-            if field in drug_info and drug_info[field] != "Tidak tersedia":
-                text = drug_info[field]
-                drug_info[field] = self.translator.translate_to_indonesian(text)
-        
-        return drug_info
-    
+
+        texts = {}
+        for i, drug_info in enumerate(drug_infos):
+            for field in possible_fields:
+                if field in drug_info and drug_info[field] != "Tidak tersedia":
+                    texts[f"{i}.{field}"] = drug_info[field]
+
+        translated = self.translator.translate_batch(texts)
+
+        for key, text in translated.items():
+            i, field = key.split('.', 1)
+            drug_infos[int(i)][field] = text
+
+        return drug_infos
+
     def _rag_retrieve(self, query, top_k=3):
-        """Retrieve relevant information dari FDA API"""
+        """Retrieve relevant information dari FDA API
+        
+        Mengembalikan (results, detected_drugs) agar hasil deteksi obat bisa
+        dipakai ulang oleh pemanggil tanpa mendeteksi ulang.
+        """
         query_lower = query.lower()
-        results = []
+        candidates = []
         
         detected_drugs = self.drug_detector.detect_drug_from_query(query)
         
@@ -619,106 +1021,90 @@ class SimpleRAGPharmaAssistant:
         else:
             common_drugs = [drug['drug_name'] for drug in detected_drugs]
         
+        detected_aliases = {drug['drug_name']: drug['alias_found'] for drug in detected_drugs}
+        
         for drug_name in common_drugs[:top_k]:
             score = 0
             
             if drug_name in query_lower:
                 score += 10
             
-            aliases = self.drug_detector.drug_dictionary.get(drug_name, [])
-            for alias in aliases:
-                if alias in query_lower:
-                    score += 8
-                    break
-            
-            question_keywords = {
-                'dosis': ['dosis', 'berapa', 'takaran', 'aturan pakai', 'berapa mg', 'berapa ml'],
-                'efek': ['efek samping', 'side effect', 'bahaya', 'efeknya'],
-                'kontraindikasi': ['kontra', 'tidak boleh', 'hindari', 'larangan'],
-                'interaksi': ['interaksi', 'bereaksi dengan', 'makanan', 'minuman'],
-                'indikasi': ['untuk apa', 'kegunaan', 'manfaat', 'indikasi'],
-                'peringatan': ['peringatan', 'warning', 'hati-hati']
-            }
+            if drug_name in detected_aliases:
+                score += 8
             
-            for key, keywords in question_keywords.items():
+            for keywords in self.QUESTION_KEYWORDS.values():
                 if any(kw in query_lower for kw in keywords):
                     score += 3
             
             if score > 0:
-                drug_info = self._get_or_fetch_drug_info(drug_name)
-                if drug_info:
-                    results.append({
-                        'score': score,
-                        'drug_info': drug_info,
-                        'drug_id': drug_name
-                    })
+                candidates.append((score, drug_name))
+        
+        # Fetch + translate semua kandidat secara paralel; latensi = fetch terlama
+        drug_infos = self._fetch_drug_infos([drug_name for _, drug_name in candidates])
+        
+        results = []
+        for (score, drug_name), drug_info in zip(candidates, drug_infos):
+            if drug_info:
+                results.append({
+                    'score': score,
+                    'drug_info': drug_info,
+                    'drug_id': drug_name
+                })
         
         results.sort(key=lambda x: x['score'], reverse=True)
-        return results[:top_k]
+        return results[:top_k], detected_drugs
     
-    def _build_rag_context(self, retrieved_results):
-        """Build context untuk RAG generator dari data FDA"""
+    def _build_rag_context(self, retrieved_results, intents=()):
+        """Build context untuk RAG generator dari data FDA, dibatasi anggaran token"""
         if not retrieved_results:
             return "Tidak ada informasi yang relevan ditemukan dalam database FDA."
         
-        context = "## INFORMASI OBAT DARI FDA:\n\n"
-        
-        for i, result in enumerate(retrieved_results, 1):
-            drug_info = result['drug_info']
-            context += f"### OBAT {i}: {drug_info['nama']}\n"
-            
-            if 'catatan_fda' in drug_info:
-                context += f"- **Catatan:** {drug_info['catatan_fda']}\n"
-            
-            # Tampilkan informasi dosis dengan pengecekan key existence
-            if safe_get(drug_info, 'dosis_dewasa') != "Tidak tersedia":
-                context += f"- **Dosis Dewasa:** {drug_info['dosis_dewasa']}\n"
-            
-            if safe_get(drug_info, 'dosis_anak') != "Tidak tersedia":
-                context += f"- **Dosis Anak:** {drug_info['dosis_anak']}\n"
-            
-            if safe_get(drug_info, 'dosis_maksimal') != "Tidak tersedia":
-                context += f"- **Dosis Maksimal:** {drug_info['dosis_maksimal']}\n"
-            
-            if safe_get(drug_info, 'catatan_dosis') != "Tidak tersedia":
-                context += f"- **Catatan Dosis:** {drug_info['catatan_dosis']}\n"
-            
-            # Fields lainnya dengan pengecekan yang sama
-            fields_to_display = [
-                ('Nama Generik', 'nama_generik'),
-                ('Merek Dagang', 'merek_dagang'),
-                ('Golongan', 'golongan'),
-                ('Indikasi', 'indikasi'),
-                ('Efek Samping', 'efek_samping'),
-                ('Kontraindikasi', 'kontraindikasi'),
-                ('Interaksi', 'interaksi'),
-                ('Peringatan', 'peringatan'),
-                ('Bentuk Sediaan', 'bentuk_sediaan'),
-                ('Kekuatan', 'kekuatan')
-            ]
-            
-            for label, field in fields_to_display:
-                if safe_get(drug_info, field) != "Tidak tersedia":
-                    text = drug_info[field]
-                    if len(text) > 300:
-                        text = text[:300] + "..."
-                    context += f"- **{label}:** {text}\n"
-            
-            context += "\n"
-        
-        return context
+        return self.context_builder.build(retrieved_results, intents)
     
-    def ask_question(self, question):
-        """Main RAG interface dengan FDA API"""
+    def _asked_intents(self, query_lower):
+        return [key for key, keywords in self.QUESTION_KEYWORDS.items()
+                if any(kw in query_lower for kw in keywords)]
+    
+    def ask_question(self, question, on_token=None, context: ConversationContext = None):
+        """Main RAG interface dengan FDA API
+
+        on_token (opsional) dipanggil dengan teks jawaban sementara setiap kali
+        chunk baru dari Gemini diterima, untuk ditampilkan secara streaming.
+        context (opsional) adalah ConversationContext milik sesi yang bertanya.
+        """
         try:
-            retrieved_results = self._rag_retrieve(question)
+            with self._stats_lock:
+                self.fast_path_stats['questions'] += 1
+            
+            retrieved_results, detected_drugs = self._rag_retrieve(question)
             
             if not retrieved_results:
                 available_drugs = ", ".join(self.drug_detector.get_all_available_drugs()[:10])
-                return f"❌ Tidak ditemukan informasi yang relevan dalam database FDA untuk pertanyaan Anda.\n\n💡 **Coba tanyakan tentang:** {available_drugs}", []
+                answer = "❌ Tidak ditemukan informasi yang relevan dalam database FDA untuk pertanyaan Anda."
+                
+                # Jelaskan alasan per obat jika pencarian sebelumnya gagal
+                for drug in detected_drugs:
+                    reason = self.negative_cache.describe(drug['drug_name'].lower())
+                    if reason:
+                        answer += f"\n\n⚠️ **{drug['drug_name'].title()}:** {reason}"
+                
+                return f"{answer}\n\n💡 **Coba tanyakan tentang:** {available_drugs}", []
             
-            rag_context = self._build_rag_context(retrieved_results)
-            answer = self._generate_rag_response(question, rag_context)
+            # Interaksi antar obat yang disebut di pertanyaan (semua pasangan)
+            interaction_drugs = self.interaction_index.find_drugs(question)
+            interactions = self.interaction_index.check(interaction_drugs)
+            
+            if interactions:
+                answer = self._answer_interactions(question, interactions, interaction_drugs)
+            else:
+                # Satu obat + satu field: jawab langsung dari drug_info tanpa Gemini
+                answer = self._try_fast_path(question, retrieved_results, detected_drugs)
+            
+            if answer is None:
+                rag_context = self._build_rag_context(retrieved_results, self._asked_intents(question.lower()))
+                if interactions:
+                    rag_context = format_interactions(interactions, "## INTERAKSI TERDETEKSI:", include_reference=True) + "\n" + rag_context
+                answer = self._generate_rag_response(question, rag_context, on_token=on_token)
             
             sources = []
             seen_drug_names = set()
@@ -729,7 +1115,8 @@ class SimpleRAGPharmaAssistant:
                     sources.append(result['drug_info'])
                     seen_drug_names.add(drug_name)
             
-            self._update_conversation_context(question, answer, sources)
+            self._update_conversation_context(context, sources)
+            self.popularity.record(drug.record_id for drug in sources if drug.record_id)
             
             return answer, sources
             
@@ -737,13 +1124,93 @@ class SimpleRAGPharmaAssistant:
             st.error(f"Error dalam proses RAG: {e}")
             return "Maaf, terjadi error dalam sistem. Silakan coba lagi.", []
     
-    def _generate_rag_response(self, question, context):
-        """Generate response menggunakan RAG """
+    def _try_fast_path(self, question, retrieved_results, detected_drugs):
+        """Jawaban template untuk pertanyaan satu obat + satu field, None jika tidak cocok"""
+        query_lower = question.lower()
+        
+        if any(marker in query_lower for marker in self.OPEN_ENDED_MARKERS):
+            return None
+        
+        # Harus tepat satu obat yang terdeteksi secara meyakinkan (bukan fuzzy)
+        if len(detected_drugs) != 1 or detected_drugs[0]['confidence'] == 'low':
+            return None
+        
+        intents = self._asked_intents(query_lower)
+        if len(intents) != 1:
+            return None
+        
+        drug_name = detected_drugs[0]['drug_name']
+        result = next((r for r in retrieved_results if r['drug_id'] == drug_name), None)
+        if not result:
+            return None
+        
+        drug_info = result['drug_info']
+        
+        # Pertanyaan dosis dengan berat badan dihitung dari teks dosis record yang disajikan
+        # (label FDA live atau database lokal), sehingga sumbernya sama dengan atribusi di bawah
+        weight = parse_weight(question) if intents[0] == 'dosis' else None
+        calc = calculate_from_record(drug_name, drug_info, weight, parse_population(question)) if weight else None
+        
+        title, fields = self.FAST_PATH_FIELDS[intents[0]]
+        lines = [
+            f"- **{label}:** {drug_info[field]}"
+            for label, field in fields
+            if safe_get(drug_info, field) != "Tidak tersedia"
+        ]
+        if calc:
+            answer = format_dose_calculation(drug_info['nama'], calc)
+        elif lines:
+            answer = f"### {title} {drug_info['nama']}\n\n" + "\n".join(lines)
+        else:
+            return None
+        
+        if 'catatan_fda' in drug_info:
+            answer += f"\n\nℹ️ {drug_info['catatan_fda']}"
+        
+        source = drug_info.get('sumber', 'FDA API')
+        if source == "FDA API":
+            answer += "\n\n📚 Informasi ini berasal dari database resmi FDA (U.S. Food and Drug Administration)."
+        else:
+            answer += f"\n\n📚 Sumber: {source}"
+        
+        answer += self.DISCLAIMER
+        
+        with self._stats_lock:
+            self.fast_path_stats['fast_path'] += 1
+            if calc:
+                self.fast_path_stats['dose_calculations'] += 1
+        
+        return answer
+    
+    def _answer_interactions(self, question, interactions, drug_keys):
+        """Jawab langsung 'interaksi A dan B?' / 'boleh minum A dengan B?' jika ada interaksi tercatat"""
+        query_lower = question.lower()
+        if not (any(marker in query_lower for marker in self.INTERACTION_MARKERS) or
+                asks_about_pair(question, drug_keys)):
+            return None
+        
+        # Pertanyaan terbuka dan interaksi yang hanya ada di label mentah dijawab Gemini
+        if any(marker in query_lower for marker in self.OPEN_ENDED_MARKERS) or not is_direct_answer(interactions):
+            return None
+        
+        with self._stats_lock:
+            self.fast_path_stats['fast_path'] += 1
+            self.fast_path_stats['interaction_answers'] += 1
+        
+        return (
+            format_interactions(interactions) +
+            "\nℹ️ Interaksi diambil dari label resmi FDA (U.S. Food and Drug Administration). "
+            "Hanya interaksi yang tercatat yang ditampilkan; kombinasi lain belum tentu aman." +
+            self.DISCLAIMER
+        )
+    
+    def _generate_rag_response(self, question, context, on_token=None):
+        """Generate response menggunakan RAG, streaming jika on_token diberikan"""
         if not gemini_available:
             return f"**Informasi dari FDA:**\n\n{context}"
         
         try:
-            model = genai.GenerativeModel('gemini-2.5-flash-lite')
+            model = load_genai().GenerativeModel('gemini-2.5-flash-lite')
             
             prompt = f"""
             ANDA HARUS MENGGUNAKAN BAHASA INDONESIA SELURUHNYA.
@@ -776,10 +1243,15 @@ class SimpleRAGPharmaAssistant:
             
             ## JAWABAN (DALAM BAHASA INDONESIA):
             """
+            self.context_builder.record_prompt(prompt)
             
-            response = model.generate_content(prompt)
-            answer = response.text
+            if on_token:
+                answer = self._stream_response(model, prompt, on_token)
+            else:
+                response = model.generate_content(prompt)
+                answer = response.text
             
+            # Post-processing tetap dilakukan pada jawaban lengkap
             # Pastikan jawaban dalam Bahasa Indonesia
             if self._is_mostly_english(answer):
                 answer = self.translator.translate_to_indonesian(answer)
@@ -790,6 +1262,23 @@ class SimpleRAGPharmaAssistant:
             print(f"Generation error: {e}")
             return f"**Informasi dari FDA:**\n\n{context}\n\n**Peringatan:** Konsultasikan dengan dokter atau apoteker sebelum menggunakan obat ini."
     
+    def _stream_response(self, model, prompt, on_token):
+        """Kirim chunk jawaban ke on_token segera setelah diterima dari Gemini"""
+        answer = ""
+        
+        for chunk in model.generate_content(prompt, stream=True):
+            try:
+                text = chunk.text
+            except ValueError:
+                # Chunk tanpa teks (mis. hanya metadata safety)
+                continue
+            
+            if text:
+                answer += text
+                on_token(answer)
+        
+        return answer
+    
     def _is_mostly_english(self, text):
         """Cek apakah teks masih banyak bahasa Inggrisnya"""
         indonesian_words = ['yang', 'untuk', 'dengan', 'dari', 'pada', 'adalah', 'sebagai', 'dapat', 'harus', 'jangan']
@@ -801,71 +1290,36 @@ class SimpleRAGPharmaAssistant:
         
         return en_count > id_count
     
-    def _update_conversation_context(self, question, answer, sources):
-        """Update conversation context"""
-        if sources:
-            self.current_context = {
-                'current_drug': sources[0]['nama'],
-                'timestamp': datetime.now()
-            }
+    def _update_conversation_context(self, context, sources):
+        """Update konteks milik sesi pemanggil; assistant bersama tidak menyimpan state sesi"""
+        if context is not None:
+            context.update(sources)
 
-# ===========================================
-# DRUG DETECTOR
-# ===========================================
-class EnhancedDrugDetector:
-    def __init__(self):
-        self.drug_dictionary = {
-            'paracetamol': ['acetaminophen', 'paracetamol', 'panadol', 'sanmol', 'tempra'],
-            'omeprazole': ['omeprazole', 'prilosec', 'losec', 'omepron'],
-            'amoxicillin': ['amoxicillin', 'amoxilin', 'amoxan', 'moxigra'],
-            'ibuprofen': ['ibuprofen', 'proris', 'arthrifen', 'ibufar'],
-            'metformin': ['metformin', 'glucophage', 'metfor', 'diabex'],
-            'atorvastatin': ['atorvastatin', 'lipitor', 'atorva', 'tovast'],
-            'simvastatin': ['simvastatin', 'zocor', 'simvor', 'lipostat'],
-            'loratadine': ['loratadine', 'clarityne', 'loramine', 'allertine'],
-            'aspirin': ['aspirin', 'aspro', 'aspilet', 'cardiprin'],
-            'vitamin c': ['ascorbic acid', 'vitamin c', 'redoxon', 'enervon c'],
-            'lansoprazole': ['lansoprazole', 'prevacid', 'lanzol', 'gastracid'],
-            'esomeprazole': ['esomeprazole', 'nexium', 'esotrax', 'esomep'],
-            'cefixime': ['cefixime', 'suprax', 'cefix', 'fixcef'],
-            'cetirizine': ['cetirizine', 'zyrtec', 'cetrizin', 'allertec'],
-            'dextromethorphan': ['dextromethorphan', 'dmp', 'dextro', 'valtus'],
-            'ambroxol': ['ambroxol', 'mucosolvan', 'ambrox', 'broxol'],
-            'salbutamol': ['albuterol', 'salbutamol', 'ventolin', 'salbu', 'asmasolon']
-        }
-        
-        self.fda_name_mapping = {
-            'paracetamol': 'acetaminophen',
-            'vitamin c': 'ascorbic acid', 
-            'salbutamol': 'albuterol'
+    def _fast_path_summary(self):
+        with self._stats_lock:
+            stats = dict(self.fast_path_stats)
+        stats['hit_rate'] = round(stats['fast_path'] / stats['questions'], 3) if stats['questions'] else 0.0
+        return stats
+
+    def get_stats(self):
+        """Statistik runtime untuk monitoring"""
+        return {
+            'memory_cache': self.drugs_cache.get_stats(),
+            'fast_path': self._fast_path_summary(),
+            'interaction_index': self.interaction_index.get_stats(),
+            'context': self.context_builder.get_stats(),
+            'retrieval_concurrency': self.retrieval_concurrency,
+            'translation': self.translator.get_stats(),
+            'translation_memory': self.translation_memory.get_stats(),
+            'negative_cache': self.negative_cache.get_stats(),
+            'single_flight': self.single_flight.get_stats(),
+            'popularity': self.popularity.get_stats(),
+            'snapshot': self.snapshot_report,
+            'prewarm': self.prewarmer.get_stats(),
+            'persistent_cache': self.persistent_cache.get_stats(),
+            'openfda': self.fda_api.get_health(),
+            'label_store': self.label_store.get_stats() if self.label_store else None
         }
-    
-    def detect_drug_from_query(self, query: str):
-        """Detect drug name from user query dengan mapping ke nama FDA"""
-        query_lower = query.lower()
-        detected_drugs = []
-        
-        for drug_name, aliases in self.drug_dictionary.items():
-            for alias in aliases:
-                if alias in query_lower:
-                    fda_name = self.fda_name_mapping.get(drug_name, drug_name)
-                    detected_drugs.append({
-                        'drug_name': drug_name,
-                        'fda_name': fda_name,
-                        'alias_found': alias,
-                        'confidence': 'high' if alias == drug_name else 'medium'
-                    })
-                    break
-        
-        return detected_drugs
-    
-    def get_all_available_drugs(self):
-        """Get list of all available drugs (nama yang dikenali user)"""
-        return list(self.drug_dictionary.keys())
-    
-    def get_fda_name(self, drug_name: str):
-        """Get FDA name untuk drug tertentu"""
-        return self.fda_name_mapping.get(drug_name, drug_name)
 
 # ===========================================
 # EVALUASI MODEL
@@ -950,6 +1404,8 @@ class FocusedRAGEvaluator:
     
     def calculate_mrr(self):
         """Hitung MRR untuk evaluasi komponen RETRIEVAL RAG"""
+        import numpy as np
+        
         reciprocal_ranks = []
         
         for test in self.test_set:
@@ -971,6 +1427,8 @@ class FocusedRAGEvaluator:
     
     def calculate_faithfulness(self):
         """Hitung Faithfulness untuk evaluasi komponen GENERATION RAG"""
+        import numpy as np
+        
         faithful_scores = []
         
         for test in self.test_set:
@@ -1082,10 +1540,234 @@ class FocusedRAGEvaluator:
 # ===========================================
 # MAIN SISTEM
 # ===========================================
+@st.cache_resource
+def load_rag_assistant():
+    # Satu instance per proses agar koneksi cache tidak dibuka ulang setiap rerun
+    return SimpleRAGPharmaAssistant()
+
+# ===========================================
+# CHAT UI
+# ===========================================
+CHAT_WINDOW_MESSAGES = int(os.environ.get("CHATOBAT_CHAT_WINDOW", 20))
+# get_stats() menjalankan COUNT(*) di SQLite; default tanpa polling per sesi
+STATUS_REFRESH_SECONDS = float(os.environ.get("CHATOBAT_STATUS_REFRESH", 0))
+
+WELCOME_HTML = """
+<div class="welcome-message">
+    <h3>👋 Selamat Datang di Asisten Obat FDA</h3>
+    <p>Dapatkan informasi obat <strong>langsung dari database resmi FDA</strong></p>
+    <p><strong>💡 Contoh pertanyaan tentang dosis:</strong></p>
+    <p>• "Apa dosis paracetamol untuk dewasa?"</p>
+    <p>• "Berapa dosis amoxicillin untuk anak?"</p>
+    <p>• "Dosis maksimal ibuprofen per hari?"</p>
+</div>
+"""
+
+def _drug_card_html(drug):
+    """Kartu informasi obat dengan highlight dosis"""
+    card_content = f"""
+    <div class="drug-card">
+        <h4>💊 {safe_get(drug, 'nama', 'N/A')}</h4>
+        <p><strong>Golongan:</strong> {safe_get(drug, 'golongan')}</p>
+        <p><strong>Merek Dagang:</strong> {safe_get(drug, 'merek_dagang')}</p>
+    """
+    
+    if safe_get(drug, 'dosis_dewasa') != "Tidak tersedia":
+        card_content += f"""
+        <div class="dosage-highlight">
+            <strong>📋 Dosis Dewasa:</strong> {drug['dosis_dewasa']}
+        </div>
+        """
+    
+    if safe_get(drug, 'dosis_anak') != "Tidak tersedia":
+        card_content += f"""
+        <div class="dosage-highlight">
+            <strong>👶 Dosis Anak:</strong> {drug['dosis_anak']}
+        </div>
+        """
+    
+    if safe_get(drug, 'dosis_maksimal') != "Tidak tersedia":
+        card_content += f"""
+        <div class="dosage-highlight">
+            <strong>⚠️ Dosis Maksimal:</strong> {drug['dosis_maksimal']}
+        </div>
+        """
+    
+    if safe_get(drug, 'catatan_dosis') != "Tidak tersedia":
+        card_content += f"<p><em>📝 Catatan: {drug['catatan_dosis']}</em></p>"
+    
+    if 'catatan_fda' in drug:
+        card_content += f"<p><small>ℹ️ {drug['catatan_fda']}</small></p>"
+    
+    return card_content + "</div>"
+
+def _message_html(message):
+    """HTML satu pesan; dibuat saat render, tidak disimpan di session state"""
+    if message["role"] == "user":
+        return f"""
+        <div class="user-message">
+            <div>{message["content"]}</div>
+            <div class="message-time">{message["timestamp"]}</div>
+        </div>
+        """
+    return f"""
+    <div class="bot-message">
+        <div>{message["content"]}</div>
+        <div class="message-time">{message["timestamp"]} • Sumber: FDA API</div>
+    </div>
+    """
+
+def _missing_drug_card_html(name):
+    """Pengganti kartu obat yang record-nya sudah dibuang dari cache"""
+    return f"""
+    <div class="drug-card">
+        <h4>💊 {name or 'N/A'}</h4>
+        <p><em>Data obat ini sudah tidak tersimpan. Tanyakan lagi untuk memuat ulang dari FDA.</em></p>
+    </div>
+    """
+
+def _sources_html(assistant, message):
+    """Kartu obat sumber jawaban, dari record terkini di cache (hanya pesan di jendela chat)"""
+    source_ids = message.get("source_ids", [])
+    names = message.get("source_names") or [None] * len(source_ids)
+    for record_id, name in zip(source_ids, names):
+        drug = assistant.get_record(record_id)
+        yield _drug_card_html(drug) if drug else _missing_drug_card_html(name or record_id)
+
+def _render_message(assistant, message):
+    st.markdown(_message_html(message), unsafe_allow_html=True)
+    if message["role"] != "user" and message.get("source_ids"):
+        with st.expander("📚 Informasi Obat dari FDA"):
+            for card_content in _sources_html(assistant, message):
+                st.markdown(card_content, unsafe_allow_html=True)
+
+def _show_older_messages():
+    st.session_state.chat_window += CHAT_WINDOW_MESSAGES
+
+def _clear_chat():
+    st.session_state.messages = []
+    st.session_state.conversation_history = []
+    st.session_state.conversation_context.clear()
+    st.session_state.chat_window = CHAT_WINDOW_MESSAGES
+
+@st.fragment
+def chat_panel(assistant):
+    """Panel chat: hanya fragmen ini yang dijalankan ulang saat bertanya atau menghapus chat
+
+    Hanya CHAT_WINDOW_MESSAGES pesan terakhir yang dirender; pesan lama dimuat
+    lewat tombol. Biaya render satu giliran bergantung pada ukuran jendela,
+    bukan panjang riwayat, dan pesan hanya menyimpan teks serta id record.
+    """
+    if 'chat_window' not in st.session_state:
+        st.session_state.chat_window = CHAT_WINDOW_MESSAGES
+    
+    messages = st.session_state.messages
+    if not messages:
+        st.markdown(WELCOME_HTML, unsafe_allow_html=True)
+    else:
+        hidden = max(0, len(messages) - st.session_state.chat_window)
+        if hidden:
+            st.button(f"⬆️ Tampilkan pesan sebelumnya ({hidden})", on_click=_show_older_messages)
+        
+        for message in messages[hidden:]:
+            _render_message(assistant, message)
+
+    # Slot untuk giliran yang sedang berjalan, di atas form input
+    live_turn = st.container()
+
+    # Input area
+    with st.form("chat_form", clear_on_submit=True):
+        user_input = st.text_input(
+            "Tulis pertanyaan Anda tentang obat:",
+            placeholder="Contoh: Apa dosis paracetamol? Berapa mg amoxicillin untuk dewasa?",
+            key="user_input"
+        )
+        
+        col_btn1, col_btn2 = st.columns([3, 1])
+        
+        with col_btn1:
+            submit_btn = st.form_submit_button(
+                "🚀 Tanya", 
+                use_container_width=True
+            )
+        
+        with col_btn2:
+            st.form_submit_button(
+                "🗑️ Hapus Chat", 
+                use_container_width=True,
+                on_click=_clear_chat
+            )
+
+    if submit_btn and user_input:
+        user_message = {
+            "role": "user", 
+            "content": user_input,
+            "timestamp": datetime.now().strftime("%H:%M")
+        }
+        messages.append(user_message)
+        
+        with live_turn:
+            _render_message(assistant, user_message)
+            bot_slot = st.empty()
+
+        def render_partial_answer(partial_answer):
+            bot_slot.markdown(f"""
+            <div class="bot-message">
+                <div>{partial_answer} ▌</div>
+            </div>
+            """, unsafe_allow_html=True)
+
+        with st.spinner("🔍 Mengakses FDA API..."):
+            answer, sources = assistant.ask_question(
+                user_input, on_token=render_partial_answer,
+                context=st.session_state.conversation_context
+            )
+        
+        st.session_state.conversation_history.append({
+            'timestamp': datetime.now(),
+            'question': user_input,
+            'answer': answer,
+            'sources': [safe_get(drug, 'nama', 'N/A') for drug in sources],
+            'source': 'FDA API'
+        })
+        
+        bot_message = {
+            "role": "bot", 
+            "content": answer,
+            # Pesan hanya menyimpan id record, bukan salinan data obat
+            "source_ids": [drug.record_id for drug in sources],
+            # Nama saja, untuk kartu pengganti jika record sudah dibuang dari cache
+            "source_names": [safe_get(drug, 'nama', 'N/A') for drug in sources],
+            "timestamp": datetime.now().strftime("%H:%M")
+        }
+        messages.append(bot_message)
+        
+        # Giliran baru digambar di tempat tanpa st.rerun(); rerun berikutnya
+        # menampilkannya sebagai bagian dari riwayat
+        bot_slot.empty()
+        with live_turn:
+            _render_message(assistant, bot_message)
+
+@st.fragment(run_every=STATUS_REFRESH_SECONDS or None)
+def system_status(assistant):
+    """Status sistem di sidebar sebagai fragmen sendiri
+
+    Diperbarui saat rerun penuh; jika STATUS_REFRESH_SECONDS > 0 juga
+    berkala tanpa rerun, sehingga statistik ikut berubah setelah giliran
+    chat di fragmen chat_panel.
+    """
+    prewarm = assistant.prewarmer.get_stats()
+    if prewarm['state'] == 'running':
+        st.caption(f"♨️ Menyiapkan obat populer: {prewarm['done']}/{prewarm['total']}")
+
+    with st.expander("🩺 Status Sistem"):
+        st.json({**assistant.get_stats(), 'startup': STARTUP_TRACKER.get_stats()})
+
 def main():
     # Initialize assistant dengan versi yang diperbaiki
-    assistant = SimpleRAGPharmaAssistant()
-    
+    assistant = load_rag_assistant()
+    startup_run.mark('assistant')
+
     # Initialize session state
     if 'messages' not in st.session_state:
         st.session_state.messages = []
@@ -1093,6 +1775,9 @@ def main():
     if 'conversation_history' not in st.session_state:
         st.session_state.conversation_history = []
     
+    if 'conversation_context' not in st.session_state:
+        st.session_state.conversation_context = ConversationContext()
+    
     if 'evaluation_results' not in st.session_state:
         st.session_state.evaluation_results = None
     
@@ -1225,7 +1910,10 @@ def main():
         "Pilih Halaman:",
         ["🏠 Chatbot Obat", "📊 Evaluasi RAG"]
     )
-    
+
+    # Slot sidebar diisi setelah startup_run.finish() agar status memuat run ini
+    status_slot = st.sidebar.container()
+
     # HALAMAN CHATBOT
     if page == "🏠 Chatbot Obat":
         st.title("💊 Sistem Tanya Jawab Obat dengan RAG")
@@ -1240,133 +1928,8 @@ def main():
 
         st.markdown("### 💬 Percakapan")
 
-        if not st.session_state.messages:
-            st.markdown("""
-            <div class="welcome-message">
-                <h3>👋 Selamat Datang di Asisten Obat FDA</h3>
-                <p>Dapatkan informasi obat <strong>langsung dari database resmi FDA</strong></p>
-                <p><strong>💡 Contoh pertanyaan tentang dosis:</strong></p>
-                <p>• "Apa dosis paracetamol untuk dewasa?"</p>
-                <p>• "Berapa dosis amoxicillin untuk anak?"</p>
-                <p>• "Dosis maksimal ibuprofen per hari?"</p>
-            </div>
-            """, unsafe_allow_html=True)
-        else:
-            st.markdown('<div class="chat-container">', unsafe_allow_html=True)
-            
-            for i, message in enumerate(st.session_state.messages):
-                if message["role"] == "user":
-                    st.markdown(f"""
-                    <div class="user-message">
-                        <div>{message["content"]}</div>
-                        <div class="message-time">{message["timestamp"]}</div>
-                    </div>
-                    """, unsafe_allow_html=True)
-                else:
-                    st.markdown(f"""
-                    <div class="bot-message">
-                        <div>{message["content"]}</div>
-                        <div class="message-time">{message["timestamp"]} • Sumber: FDA API</div>
-                    </div>
-                    """, unsafe_allow_html=True)
-                    
-                    if "sources" in message and message["sources"]:
-                        with st.expander("📚 Informasi Obat dari FDA"):
-                            for drug in message["sources"]:
-                                # Highlight informasi dosis jika ada - DENGAN safe_get
-                                card_content = f"""
-                                <div class="drug-card">
-                                    <h4>💊 {safe_get(drug, 'nama', 'N/A')}</h4>
-                                    <p><strong>Golongan:</strong> {safe_get(drug, 'golongan')}</p>
-                                    <p><strong>Merek Dagang:</strong> {safe_get(drug, 'merek_dagang')}</p>
-                                """
-                                
-                                # Tampilkan informasi dosis dengan highlight - DENGAN safe_get
-                                if safe_get(drug, 'dosis_dewasa') != "Tidak tersedia":
-                                    card_content += f"""
-                                    <div class="dosage-highlight">
-                                        <strong>📋 Dosis Dewasa:</strong> {drug['dosis_dewasa']}
-                                    </div>
-                                    """
-                                
-                                if safe_get(drug, 'dosis_anak') != "Tidak tersedia":
-                                    card_content += f"""
-                                    <div class="dosage-highlight">
-                                        <strong>👶 Dosis Anak:</strong> {drug['dosis_anak']}
-                                    </div>
-                                    """
-                                
-                                if safe_get(drug, 'dosis_maksimal') != "Tidak tersedia":
-                                    card_content += f"""
-                                    <div class="dosage-highlight">
-                                        <strong>⚠️ Dosis Maksimal:</strong> {drug['dosis_maksimal']}
-                                    </div>
-                                    """
-                                
-                                if safe_get(drug, 'catatan_dosis') != "Tidak tersedia":
-                                    card_content += f"<p><em>📝 Catatan: {drug['catatan_dosis']}</em></p>"
-                                
-                                if 'catatan_fda' in drug:
-                                    card_content += f"<p><small>ℹ️ {drug['catatan_fda']}</small></p>"
-                                
-                                card_content += "</div>"
-                                st.markdown(card_content, unsafe_allow_html=True)
-            
-            st.markdown('</div>', unsafe_allow_html=True)
-
-        # Input area
-        with st.form("chat_form", clear_on_submit=True):
-            user_input = st.text_input(
-                "Tulis pertanyaan Anda tentang obat:",
-                placeholder="Contoh: Apa dosis paracetamol? Berapa mg amoxicillin untuk dewasa?",
-                key="user_input"
-            )
-            
-            col_btn1, col_btn2 = st.columns([3, 1])
-            
-            with col_btn1:
-                submit_btn = st.form_submit_button(
-                    "🚀 Tanya", 
-                    use_container_width=True
-                )
-            
-            with col_btn2:
-                clear_btn = st.form_submit_button(
-                    "🗑️ Hapus Chat", 
-                    use_container_width=True
-                )
-
-        if submit_btn and user_input:
-            st.session_state.messages.append({
-                "role": "user", 
-                "content": user_input,
-                "timestamp": datetime.now().strftime("%H:%M")
-            })
-            
-            with st.spinner("🔍 Mengakses FDA API..."):
-                answer, sources = assistant.ask_question(user_input)
-                
-                st.session_state.conversation_history.append({
-                    'timestamp': datetime.now(),
-                    'question': user_input,
-                    'answer': answer,
-                    'sources': [safe_get(drug, 'nama', 'N/A') for drug in sources],
-                    'source': 'FDA API'
-                })
-                
-                st.session_state.messages.append({
-                    "role": "bot", 
-                    "content": answer,
-                    "sources": sources,
-                    "timestamp": datetime.now().strftime("%H:%M")
-                })
-            
-            st.rerun()
-
-        if clear_btn:
-            st.session_state.messages = []
-            st.session_state.conversation_history = []
-            st.rerun()
+        chat_panel(assistant)
+        startup_run.finish()
 
         st.warning("""
         **⚠️ Peringatan Medis:** Informasi ini berasal dari database FDA AS dan untuk edukasi saja. 
@@ -1397,6 +1960,7 @@ def main():
 
             </div>
             """, unsafe_allow_html=True)
+        startup_run.finish()
         
         # Tombol evaluasi
         col1, col2, col3 = st.columns([2, 1, 1])
@@ -1569,5 +2133,11 @@ def main():
         unsafe_allow_html=True
     )
 
+    with status_slot:
+        system_status(assistant)
+
+    # Pre-warm baru dimulai setelah render pertama agar tidak bersaing dengan cold start
+    assistant.prewarmer.start()
+
 if __name__ == "__main__":
     main()
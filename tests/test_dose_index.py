@@ -0,0 +1,90 @@
+import math
+
+from dose_index import DoseIndex, calculate_from_record, parse_dose, parse_weight
+
+PARACETAMOL = {
+    'dosis_dewasa': '500-1000 mg setiap 4-6 jam',
+    'dosis_anak': '10-15 mg/kgBB setiap 4-6 jam',
+    'dosis_maksimal': 'Maksimal 4000 mg per hari'
+}
+
+
+def test_parse_weight():
+    assert parse_weight("dosis paracetamol anak 20 kg") == 20.0
+    assert parse_weight("berat 12,5 kg") == 12.5
+    assert parse_weight("berat 20 kilogram") == 20.0
+
+
+def test_parse_weight_ignores_dose_units():
+    assert parse_weight("10 mg/kgBB") is None
+    assert parse_weight("15 kgbb") is None
+    assert parse_weight("dosis 500 mg") is None
+    assert parse_weight("anak 0 kg") is None
+
+
+def test_parse_dose_per_kg_range():
+    dose = parse_dose("10-15 mg/kgBB setiap 4-6 jam")
+    assert (dose['amount_min'], dose['amount_max'], dose['unit']) == (10.0, 15.0, 'mg')
+    assert dose['per_kg'] and not dose['per_day']
+    assert (dose['interval_min'], dose['interval_max']) == (4.0, 6.0)
+    assert math.isnan(dose['daily_max'])
+
+
+def test_parse_dose_per_day_divided():
+    dose = parse_dose("20-40 mg/kgBB/hari dibagi 3 dosis")
+    assert dose['per_kg'] and dose['per_day']
+    assert dose['interval_min'] == dose['interval_max'] == 8.0
+
+
+def test_parse_dose_first_alternative_and_decimal_comma():
+    dose = parse_dose("250-500 mg setiap 8 jam atau 875 mg setiap 12 jam")
+    assert (dose['amount_min'], dose['amount_max'], dose['interval_min']) == (250.0, 500.0, 8.0)
+    assert parse_dose("2,5 ml setiap 6 jam")['amount_min'] == 2.5
+    assert parse_dose("500 mg 3x sehari")['interval_min'] == 8.0
+
+
+def test_parse_dose_daily_max_only():
+    dose = parse_dose("Maksimal 4000 mg per hari")
+    assert dose['daily_max'] == 4000.0
+    assert math.isnan(dose['amount_min'])
+
+
+def test_parse_dose_unparseable():
+    assert parse_dose("Tidak dianjurkan untuk anak") is None
+    assert parse_dose("") is None
+    assert parse_dose(None) is None
+
+
+def test_calculate_child_per_kg():
+    calc = calculate_from_record('paracetamol', PARACETAMOL, 20)
+    assert calc['population'] == 'anak'
+    assert (calc['per_dose_min'], calc['per_dose_max']) == (200.0, 300.0)
+    assert (calc['per_day_min'], calc['per_day_max']) == (800.0, 1800.0)
+    assert not calc['capped']
+    assert calc['source_text'] == PARACETAMOL['dosis_anak']
+
+
+def test_calculate_caps_child_dose_at_adult_daily_max():
+    calc = calculate_from_record('paracetamol', PARACETAMOL, 100, 'anak')
+    assert calc['per_day_max'] == 4000.0
+    assert calc['capped']
+
+
+def test_calculate_adult_capped_by_daily_max():
+    calc = calculate_from_record('paracetamol', PARACETAMOL, 70)
+    assert calc['population'] == 'dewasa'
+    assert (calc['per_dose_min'], calc['per_dose_max']) == (500.0, 1000.0)
+    assert calc['per_day_max'] == 4000.0
+    assert calc['capped']
+
+
+def test_calculate_unparseable_returns_none():
+    record = {'dosis_dewasa': 'Sesuai anjuran dokter', 'dosis_anak': 'Tidak dianjurkan untuk anak'}
+    assert calculate_from_record('obat', record, 20) is None
+    assert calculate_from_record('obat', record, 70) is None
+
+
+def test_index_has_no_population_fallback():
+    index = DoseIndex.from_drug_records({'obat': {'dosis_dewasa': '500 mg 3x sehari'}})
+    assert index.calculate('obat', 70) is not None
+    assert index.calculate('obat', 20) is None
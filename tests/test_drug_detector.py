@@ -0,0 +1,67 @@
+import pytest
+
+from drug_detector import EnhancedDrugDetector, FuzzyAliasIndex
+
+COMMON_WORDS = [
+    'makan', 'minum', 'diminum', 'sakit', 'kepala', 'demam', 'batuk', 'dosis', 'berapa',
+    'obat', 'untuk', 'anak', 'perut', 'tablet', 'sirup', 'malam', 'pagi', 'setelah',
+    'sebelum', 'bersama', 'asma', 'flu'
+]
+
+
+@pytest.fixture(scope='module')
+def detector():
+    return EnhancedDrugDetector()
+
+
+@pytest.fixture
+def fuzzy():
+    return FuzzyAliasIndex({
+        'aspirin': 'aspirin', 'ibuprofen': 'ibuprofen', 'omeprazole': 'omeprazole',
+        'amlodipine': 'amlodipine', 'asam': 'asam mefenamat'
+    })
+
+
+def aliases(matches):
+    return [(match['alias'], match['distance']) for match in matches]
+
+
+def test_indonesian_spelling_normalizes_to_exact(fuzzy):
+    assert aliases(fuzzy.lookup('omeprazol')) == [('omeprazole', 0)]
+    assert FuzzyAliasIndex.normalize('parasetamol') == FuzzyAliasIndex.normalize('paracetamol')
+    assert FuzzyAliasIndex.normalize('amoksisilin') == FuzzyAliasIndex.normalize('amoxicillin')
+
+
+def test_short_aliases_are_not_indexed(fuzzy):
+    assert 'asam' not in fuzzy.alias_to_drug
+    assert fuzzy.lookup('asam') == []
+
+
+def test_medium_words_allow_one_edit(fuzzy):
+    assert aliases(fuzzy.lookup('aspirn')) == [('aspirin', 1)]
+    assert aliases(fuzzy.lookup('ibuprofn')) == [('ibuprofen', 1)]
+    assert fuzzy.lookup('asprn') == []
+    assert fuzzy.lookup('ibuprfn') == []
+
+
+def test_long_words_allow_two_edits(fuzzy):
+    assert aliases(fuzzy.lookup('amlodupen')) == [('amlodipine', 2)]
+    assert fuzzy.lookup('amldupen') == []
+
+
+@pytest.mark.parametrize('word', COMMON_WORDS)
+def test_common_words_have_no_fuzzy_match(detector, word):
+    assert detector.fuzzy_index.lookup(word) == []
+
+
+def test_general_question_detects_no_drug(detector):
+    assert detector.detect_drug_from_query("obat sakit kepala apa yang aman diminum setelah makan?") == []
+    assert detector.detect_drug_from_query("saya demam dan batuk, minum obat apa?") == []
+
+
+def test_exact_and_fuzzy_detection(detector):
+    exact = detector.detect_drug_from_query("minum vitamin c dan ibuprofen")
+    assert [(d['drug_name'], d['confidence']) for d in exact] == [('vitamin c', 'high'), ('ibuprofen', 'high')]
+
+    typo = detector.detect_drug_from_query("interaksi ibuprofem dengan aspirn")
+    assert [(d['drug_name'], d['confidence']) for d in typo] == [('ibuprofen', 'low'), ('aspirin', 'low')]
@@ -0,0 +1,34 @@
+import io
+import json
+
+import pytest
+
+from fda_data import _iter_results_array
+
+RECORDS = [
+    {"set_id": "a", "openfda": {"generic_name": ["IBUPROFEN"]}, "numbers": [1, 2]},
+    {"set_id": "b", "drug_interactions": ["Teks dengan ] , { di dalam string"]}
+]
+
+# meta juga punya key "results" (objek), dan harus dilewati
+DUMP = json.dumps({
+    "meta": {"disclaimer": "Do not rely on openFDA", "results": {"skip": 0, "limit": 2, "total": 2}},
+    "results": RECORDS
+})
+
+
+@pytest.mark.parametrize('chunk_size', [1, 3, 7, 64, len(DUMP) + 1])
+def test_results_array_across_chunk_boundaries(chunk_size):
+    assert list(_iter_results_array(io.StringIO(DUMP), chunk_size)) == RECORDS
+
+
+def test_empty_or_missing_results_array():
+    assert list(_iter_results_array(io.StringIO('{"meta": {"results": {}}, "results": []}'), 2)) == []
+    assert list(_iter_results_array(io.StringIO('{"meta": {"results": {}}}'), 2)) == []
+
+
+def test_truncated_record_raises():
+    records = _iter_results_array(io.StringIO('{"results": [{"set_id": "a"}, {"set_id"'), 4)
+    assert next(records) == {"set_id": "a"}
+    with pytest.raises(json.JSONDecodeError):
+        next(records)
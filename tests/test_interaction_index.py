@@ -0,0 +1,85 @@
+from interaction_index import (
+    InteractionIndex, asks_about_pair, format_interactions, is_direct_answer, looks_indonesian
+)
+
+ALIASES = {'ibuprofen': ['ibuprofen', 'advil'], 'aspirin': ['aspirin', 'asetosal'], 'paracetamol': ['paracetamol']}
+
+IBUPROFEN_ID = "Ibuprofen dapat meningkatkan risiko perdarahan jika digunakan bersama aspirin."
+IBUPROFEN_EN = "Aspirin may increase the risk of bleeding when taken with ibuprofen."
+
+
+def make_index():
+    return InteractionIndex(ALIASES)
+
+
+def test_find_drugs_resolves_aliases_in_order():
+    index = make_index()
+    assert index.find_drugs("boleh minum advil dengan asetosal dan aspirin?") == ['ibuprofen', 'aspirin']
+
+
+def test_add_text_extracts_pair_in_both_orders():
+    index = make_index()
+    assert index.add_text('ibuprofen', IBUPROFEN_ID) == 1
+    assert index.lookup('aspirin', 'ibuprofen') == [IBUPROFEN_ID]
+    assert index.lookup('ibuprofen', 'paracetamol') == []
+
+
+def test_check_returns_only_pairs_with_interactions():
+    index = make_index()
+    index.add_text('ibuprofen', IBUPROFEN_ID)
+    results = index.check(['ibuprofen', 'aspirin', 'paracetamol'])
+    assert [result['drugs'] for result in results] == [('ibuprofen', 'aspirin')]
+    assert is_direct_answer(results)
+    assert "**Ibuprofen + Aspirin**" in format_interactions(results)
+
+
+def test_class_sentence_applies_to_members():
+    index = make_index()
+    index.add_text('ibuprofen', "Meningkatkan risiko perdarahan dengan antikoagulan")
+    assert index.lookup('ibuprofen', 'warfarin') == ["Meningkatkan risiko perdarahan dengan antikoagulan"]
+
+
+def test_changed_text_replaces_old_sentences():
+    index = make_index()
+    index.add_text('ibuprofen', IBUPROFEN_ID)
+    assert index.add_text('ibuprofen', IBUPROFEN_ID) == 0
+    index.add_text('ibuprofen', "Hindari penggunaan bersama alkohol.")
+    assert index.lookup('ibuprofen', 'aspirin') == []
+    assert index.lookup('ibuprofen', 'alkohol') == ["Hindari penggunaan bersama alkohol."]
+
+
+def test_reference_text_is_not_a_direct_answer():
+    index = make_index()
+    index.add_text('ibuprofen', IBUPROFEN_EN, reference=True)
+    index.load_pairs([('paracetamol', 'alkohol', "Alcohol may increase the risk of liver damage.")])
+
+    results = index.check(['ibuprofen', 'aspirin', 'paracetamol', 'alkohol'])
+    assert len(results) == 2
+    assert all(not result['sentences'] and result['reference'] for result in results)
+    assert not is_direct_answer(results)
+    assert IBUPROFEN_EN not in format_interactions(results)
+    assert IBUPROFEN_EN in format_interactions(results, include_reference=True)
+
+
+def test_translated_text_replaces_reference():
+    index = make_index()
+    index.add_text('ibuprofen', IBUPROFEN_EN, reference=True)
+    index.add_text('ibuprofen', IBUPROFEN_ID)
+    result = index.check(['ibuprofen', 'aspirin'])[0]
+    assert result['sentences'] == [IBUPROFEN_ID]
+    assert result['reference'] == []
+
+
+def test_looks_indonesian():
+    assert looks_indonesian(IBUPROFEN_ID)
+    assert not looks_indonesian(IBUPROFEN_EN)
+    assert not looks_indonesian(None)
+
+
+def test_asks_about_pair():
+    index = make_index()
+    question = "boleh minum ibuprofen dengan aspirin?"
+    assert asks_about_pair(question, index.find_drugs(question))
+    assert asks_about_pair("minum aspirin bersama advil aman?", ['aspirin', 'ibuprofen'])
+    assert not asks_about_pair("boleh minum ibuprofen?", ['ibuprofen'])
+    assert not asks_about_pair("dosis ibuprofen dan aspirin", ['ibuprofen', 'aspirin'])